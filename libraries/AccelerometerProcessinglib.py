@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Library to help process batches of accelerometer samples (like the ones AccelerometerSensor.stream() gives) with NumPy: filtering, gravity removal, tilt, RMS, and spectra. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import math
+import numpy as np
+
+
+class FirstOrderFilter:
+    """Runs y[n] = decay * y[n-1] + u[n] down each column of a batch without a Python loop per sample.
+    The filter remembers where it left off, so each batch only costs as much as the batch itself"""
+
+    # Largest factor the running sum gets scaled by before it's renormalized, to keep the floating point error small
+    MAX_GROWTH = 1e6
+
+    def __init__(self, decayParam, channelsParam=3):
+        self.decay = decayParam
+        self.previous = np.zeros(channelsParam) # y[-1] for each column
+        self.isPrimed = False
+
+        # Within a chunk, y[k] = decay^(k+1) * (y[-1] + cumsum(u[j] / decay^(j+1))), which only needs NumPy's cumsum
+        # Chunks are kept short enough that decay^-(chunk) stays under MAX_GROWTH
+        if(decayParam <= 0.0):
+            self.chunkSize = 0
+        else:
+            self.chunkSize = max(1, int(math.log(self.MAX_GROWTH) / -math.log(decayParam))) if decayParam < 1.0 else 4096
+            self.powers = (decayParam ** np.arange(1, self.chunkSize + 1))[:, None]
+
+    # Starts the filter off at valueParam (instead of 0) so it doesn't have to ramp up from nothing
+    def prime(self, valueParam):
+        self.previous[:] = valueParam
+        self.isPrimed = True
+
+    # Filters a batch of u values (one row per sample), writing into outParam if given. Returns the filtered batch
+    def run(self, inputParam, outParam=None):
+        if(outParam is None):
+            outParam = np.empty(inputParam.shape)
+        if(self.chunkSize == 0):
+            outParam[:] = inputParam
+        else:
+            for start in range(0, len(inputParam), self.chunkSize):
+                end = min(start + self.chunkSize, len(inputParam))
+                powers = self.powers[:end - start]
+                chunk = outParam[start:end]
+                np.divide(inputParam[start:end], powers, out=chunk)
+                np.cumsum(chunk, axis=0, out=chunk)
+                chunk += self.previous
+                chunk *= powers
+                self.previous[:] = chunk[-1]
+        return outParam
+
+
+class LowPassFilter:
+    """Single pole low-pass filter (exponential smoothing) with a cutoff frequency in Hz"""
+
+    def __init__(self, cutoffParam, sampleRateParam, channelsParam=3):
+        self.alpha = 1.0 - math.exp(-2.0 * math.pi * cutoffParam / sampleRateParam)
+        self.filter = FirstOrderFilter(1.0 - self.alpha, channelsParam)
+
+    # Filters a batch of samples (one row per sample)
+    def process(self, samplesParam, outParam=None):
+        if(len(samplesParam) == 0):
+            return samplesParam.copy()
+        if(not self.filter.isPrimed):
+            self.filter.prime(samplesParam[0])
+        outParam = np.multiply(samplesParam, self.alpha, out=outParam)
+        return self.filter.run(outParam, outParam)
+
+
+class HighPassFilter:
+    """Single pole high-pass filter with a cutoff frequency in Hz"""
+
+    def __init__(self, cutoffParam, sampleRateParam, channelsParam=3):
+        rc = 1.0 / (2.0 * math.pi * cutoffParam)
+        self.alpha = rc / (rc + 1.0 / sampleRateParam)
+        self.filter = FirstOrderFilter(self.alpha, channelsParam)
+        self.lastInput = None
+
+    # Filters a batch of samples (one row per sample)
+    def process(self, samplesParam, outParam=None):
+        if(len(samplesParam) == 0):
+            return samplesParam.copy()
+        if(self.lastInput is None):
+            self.lastInput = samplesParam[0].copy()
+        # y[n] = alpha * (y[n-1] + x[n] - x[n-1])
+        if(outParam is None):
+            outParam = np.empty(samplesParam.shape)
+        outParam[0] = samplesParam[0] - self.lastInput
+        np.subtract(samplesParam[1:], samplesParam[:-1], out=outParam[1:])
+        outParam *= self.alpha
+        self.lastInput[:] = samplesParam[-1]
+        return self.filter.run(outParam, outParam)
+
+
+class GravityRemover:
+    """Tracks gravity with a slow low-pass filter and subtracts it, leaving just the acceleration from movement and vibration"""
+
+    def __init__(self, sampleRateParam, cutoffParam=0.5):
+        self.lowPass = LowPassFilter(cutoffParam, sampleRateParam)
+        self.gravity = np.zeros(3) # Latest gravity estimate
+
+    # Returns the batch with gravity removed
+    def process(self, samplesParam):
+        gravity = self.lowPass.process(samplesParam)
+        if(len(gravity) > 0):
+            self.gravity[:] = gravity[-1]
+        return np.subtract(samplesParam, gravity, out=gravity)
+
+
+# Returns (pitch, roll) arrays in degrees for a batch of (x, y, z) samples (or a single sample)
+# Only meaningful when the sensor is mostly just feeling gravity, so low-pass the samples first if it's shaking
+def tilt(samplesParam):
+    samples = np.asarray(samplesParam)
+    x, y, z = samples[..., 0], samples[..., 1], samples[..., 2]
+    pitch = np.degrees(np.arctan2(-x, np.hypot(y, z)))
+    roll = np.degrees(np.arctan2(y, z))
+    return pitch, roll
+
+# Returns the root mean square of each axis over a batch
+def rms(samplesParam):
+    return np.sqrt(np.mean(np.square(samplesParam), axis=0))
+
+
+class Spectrum:
+    """Hann windowed FFT spectra over windows of windowSizeParam samples. Samples can be fed in any batch size, and a spectrum comes out every hopParam samples"""
+
+    def __init__(self, windowSizeParam, sampleRateParam, hopParam=None, channelsParam=3):
+        self.windowSize = windowSizeParam
+        self.hop = windowSizeParam if hopParam is None else hopParam
+        self.window = np.hanning(windowSizeParam)[:, None]
+        self.windowScale = 2.0 / self.window.sum() # So a sine wave's peak shows up as its amplitude
+        self.frequencies = np.fft.rfftfreq(windowSizeParam, 1.0 / sampleRateParam)
+        self.buffer = np.zeros((windowSizeParam, channelsParam))
+        self.filled = 0
+
+    # Returns the magnitude spectrum of one window of samples (one row per frequency in self.frequencies, one column per axis)
+    def compute(self, samplesParam):
+        detrended = samplesParam - samplesParam.mean(axis=0)
+        return np.abs(np.fft.rfft(detrended * self.window, axis=0)) * self.windowScale
+
+    # Adds a batch of samples and returns a list of the spectra for every window that finished (often empty)
+    def update(self, samplesParam):
+        spectra = []
+        position = 0
+        while(position < len(samplesParam)):
+            count = min(self.windowSize - self.filled, len(samplesParam) - position)
+            self.buffer[self.filled:self.filled + count] = samplesParam[position:position + count]
+            self.filled += count
+            position += count
+            if(self.filled == self.windowSize):
+                spectra.append(self.compute(self.buffer))
+                # Keep the overlap for the next window
+                keep = self.windowSize - self.hop
+                if(keep > 0):
+                    self.buffer[:keep] = self.buffer[self.hop:]
+                self.filled = max(0, keep)
+        return spectra
+
+    # Returns the frequency (in Hz) of the biggest peak for each axis of a spectrum, ignoring DC
+    def peakFrequencies(self, spectrumParam):
+        return self.frequencies[1:][np.argmax(spectrumParam[1:], axis=0)]
+
+
+class AccelerometerProcessor:
+    """Puts the pieces together for a stream of batches: gravity removal, smoothed tilt, vibration RMS, and spectra"""
+
+    def __init__(self, sampleRateParam=800, tiltCutoffParam=5.0, windowSizeParam=256):
+        self.sampleRate = sampleRateParam
+        self.gravityRemover = GravityRemover(sampleRateParam)
+        self.tiltFilter = LowPassFilter(tiltCutoffParam, sampleRateParam)
+        self.spectrum = Spectrum(windowSizeParam, sampleRateParam)
+
+        # Latest results
+        self.pitch = 0.0
+        self.roll = 0.0
+        self.vibrationRMS = np.zeros(3)
+        self.latestSpectrum = None
+
+    # Processes one batch of samples (like from AccelerometerSensor.stream()) and returns the batch with gravity removed
+    def process(self, samplesParam):
+        if(len(samplesParam) == 0):
+            return samplesParam.copy()
+        smoothed = self.tiltFilter.process(samplesParam)
+        pitch, roll = tilt(smoothed[-1])
+        self.pitch, self.roll = float(pitch), float(roll)
+
+        linear = self.gravityRemover.process(samplesParam)
+        self.vibrationRMS = rms(linear)
+        spectra = self.spectrum.update(linear)
+        if(len(spectra) > 0):
+            self.latestSpectrum = spectra[-1]
+        return linear
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    # A fake 800Hz stream: tilted 10 degrees, with a 60Hz vibration on the x axis
+    sampleRate = 800
+    t = np.arange(8000) / sampleRate
+    angle = math.radians(10)
+    samples = np.column_stack([
+        -9.80665 * math.sin(angle) + 0.5 * np.sin(2 * np.pi * 60 * t),
+        np.zeros(len(t)),
+        9.80665 * math.cos(angle) * np.ones(len(t)),
+    ])
+
+    processor = AccelerometerProcessor(sampleRate)
+    for start in range(0, len(samples), 64): # Batches of 64, like AccelerometerSensor.stream(64) gives
+        processor.process(samples[start:start + 64])
+
+    print('Pitch: {0:0.2f} degrees, Roll: {1:0.2f} degrees'.format(processor.pitch, processor.roll))
+    print('Vibration RMS: x={0:0.3f} y={1:0.3f} z={2:0.3f} m/s^2'.format(*processor.vibrationRMS))
+    print('Peak frequency on x: {0:0.1f}Hz'.format(processor.spectrum.peakFrequencies(processor.latestSpectrum)[0]))
@@ -7,12 +7,62 @@
    @email wpl12014@mymail.pomona.edu
    @version 0.0.1
 """
-import board
-import busio
 import time
-import adafruit_mma8451
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from .Schedulerlib import getBusLock
+    from .ShadowRegisterlib import getShadowRegisters
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    from Schedulerlib import getBusLock
+    from ShadowRegisterlib import getShadowRegisters
+np = Backendlib.lazyImport('numpy') # Only needed for streaming
 
+# MMA8451 registers used for streaming
+MMA8451_REG_F_STATUS = 0x00 # Same address as STATUS; holds the FIFO sample count when the FIFO is on
+MMA8451_REG_OUT_X_MSB = 0x01
+MMA8451_REG_F_SETUP = 0x09
+MMA8451_REG_WHO_AM_I = 0x0D
+MMA8451_REG_XYZ_DATA_CFG = 0x0E # Range in the low two bits
+MMA8451_REG_CTRL_REG1 = 0x2A # Active in bit 0 and data rate in bits 3-5
+MMA8451_ACTIVE = 0x01
+MMA8451_DATARATE_MASK = 0x38
+MMA8451_RANGE_MASK = 0x03
+MMA8451_FIFO_SIZE = 32 # Samples
+MMA8451_DEVICE_ID = 0x1A # What WHO_AM_I reads once the sensor is up
+# Range, data rate, and orientation values (the same ones adafruit_mma8451 uses)
+MMA8451_RANGE_2G = 0
+MMA8451_RANGE_4G = 1
+MMA8451_RANGE_8G = 2
+MMA8451_DATARATE_800HZ = 0
+MMA8451_DATARATE_400HZ = 1
+MMA8451_DATARATE_200HZ = 2
+MMA8451_DATARATE_100HZ = 3
+MMA8451_DATARATE_50HZ = 4
+MMA8451_DATARATE_12_5HZ = 5
+MMA8451_DATARATE_6_25HZ = 6
+MMA8451_DATARATE_1_56HZ = 7
+MMA8451_PL_PUF = 0
+MMA8451_PL_PUB = 1
+MMA8451_PL_PDF = 2
+MMA8451_PL_PDB = 3
+MMA8451_PL_LRF = 4
+MMA8451_PL_LRB = 5
+MMA8451_PL_LLF = 6
+MMA8451_PL_LLB = 7
+MMA8451_COUNTS_PER_G = {2: 4096, 4: 2048, 8: 1024} # 14 bit counts per g for each range
+MMA8451_RANGE_CODES = {2: MMA8451_RANGE_2G, 4: MMA8451_RANGE_4G, 8: MMA8451_RANGE_8G} # Range code for each range in +-G
+MMA8451_DATARATE_CODES = {800: MMA8451_DATARATE_800HZ, 400: MMA8451_DATARATE_400HZ, 200: MMA8451_DATARATE_200HZ, 100: MMA8451_DATARATE_100HZ, 50: MMA8451_DATARATE_50HZ,
+                          12.5: MMA8451_DATARATE_12_5HZ, 6.25: MMA8451_DATARATE_6_25HZ, 1.56: MMA8451_DATARATE_1_56HZ} # Data rate code for each rate in Hz
 
+# Settings to switch between with applyProfile: every sample at full rate for streaming, or a trickle of samples that lets the sensor sleep most of the time
+ACCELEROMETER_PROFILES = {
+    'highRate': {'accelerationRange': 4, 'dataRate': 800},
+    'lowPower': {'accelerationRange': 2, 'dataRate': 12.5},
+}
+STANDARD_GRAVITY = 9.80665 # m/s^2
 
 
 class AccelerometerSensor:
@@ -21,10 +71,51 @@ class AccelerometerSensor:
     # Initializes class with the i2c communication connection using the board's SDA line on board pin 3 (GPIO pin 2) and SCL line on board pin 5 (GPIO pin 3)
     # Automatically assume address is 0x1C, but can change if necessary
     # TODO: fix i2c addressing
-    def __init__(self, i2c, addressParam=0x1d):
+    # (the backend's i2c connection if i2c is None)
+    # sensorParam can be used to pass in an already made driver (like Simulatorlib's SimulatedMMA8451)
+    # backendParam is the Backendlib backend that makes the i2c connection and driver if they aren't given (Backendlib.getBackend() if it's None)
+    # readyTimeoutParam is how long (in seconds) to wait for the sensor to start answering before making the driver anyway
+    def __init__(self, i2c=None, addressParam=0x1d, sensorParam=None, backendParam=None, readyTimeoutParam=2.0):
+        backend = Backendlib.getBackend(backendParam)
+        self.i2c = backend.getI2C() if i2c is None else i2c
+        self.address = addressParam
+        self.clock = backend.clock
+        self.busLock = getBusLock(self.i2c)
+        self.statusBuffer = bytearray(1)
+        # The configuration registers, so settings that don't change aren't written again. Forgotten here in case the driver is about to reset the sensor
+        self.shadow = getShadowRegisters(self.i2c, addressParam)
+        self.shadow.invalidate()
+        if(sensorParam is None):
+            self.waitUntilReady(readyTimeoutParam) # Instead of sleeping 2 seconds just in case
+            self.sensor = backend.createAccelerometer(self.i2c, addressParam)
+        else:
+            self.sensor = sensorParam
+
+        # The driver starts the sensor at +-4G and 800Hz
+        self.accelerationRange = 4
+        self.dataRate = 800
+
+        # Streaming state (see startStreaming)
+        self.isStreaming = False
+        self.fifoBuffer = bytearray(MMA8451_FIFO_SIZE * 6) # Room for a whole FIFO of x/y/z samples
+        self.sampleOffsets = None
+        self.sampleOffsetsRate = None
+        self.overflows = 0
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
-        time.sleep(2) # ...Apparently the sleep is necessary...not for anything else, though...
-        self.sensor = adafruit_mma8451.MMA8451(i2c, addressParam)
+    # Polls the sensor's WHO_AM_I register until it reads back the MMA8451's ID (the sensor doesn't answer at all while it's starting up)
+    # Returns True once it does, or False if it didn't within timeoutParam seconds
+    def waitUntilReady(self, timeoutParam=2.0, pollIntervalParam=0.001):
+        endTime = self.clock.monotonic() + timeoutParam
+        while(True):
+            try:
+                if(self._readRegister(MMA8451_REG_WHO_AM_I) == MMA8451_DEVICE_ID):
+                    return True
+            except OSError:
+                pass # Not answering yet
+            if(self.clock.monotonic() >= endTime):
+                return False
+            self.clock.sleep(pollIntervalParam)
 
     # Checks and returns the sensor's acceleration reading as a tuple of (x,y,z) values
     def getAcceleration(self):
@@ -38,48 +129,157 @@ class AccelerometerSensor:
     # Must be a value of 2, 4, or 8
     # Will return the same value if it worked, and None if it didn't
     def setAccelerationRange(self, rangeParam):
-        if(rangeParam == 2):
-            self.sensor.range = adafruit_mma8451.RANGE_2G
-            return rangeParam
-        elif(rangeParam == 4):
-            self.sensor.range = adafruit_mma8451.RANGE_4G
-            return rangeParam
-        elif(rangeParam == 8):
-            self.sensor.range = adafruit_mma8451.RANGE_8G
-            return rangeParam
-        else:
+        if(self.applyProfile({'accelerationRange': rangeParam}) is None):
             return None
+        return rangeParam
 
     # Sets the rate at which the sensor measures acceleration data (in Hz)
     # Must be a value of 1.56, 6.25, 12.5, 50, 100, 200, 400, or 800
     # Will return the same value if it worked, and None if it didn't
     def setDataRate(self, dataRateParam):
-        if(dataRateParam == 1.56):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_1_56HZ
-            return dataRateParam
-        elif(dataRateParam == 6.25):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_6_25HZ
-            return dataRateParam
-        elif(dataRateParam == 12.5):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_12_5HZ
-            return dataRateParam
-        elif(dataRateParam == 50):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_50HZ
-            return dataRateParam
-        elif(dataRateParam == 100):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_100HZ
-            return dataRateParam
-        elif(dataRateParam == 200):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_200HZ
-            return dataRateParam
-        elif(dataRateParam == 400):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_400HZ
-            return dataRateParam
-        elif(dataRateParam == 800):
-            self.sensor.data_rate = adafruit_mma8451.DATARATE_800HZ
-            return dataRateParam
-        else:
+        if(self.applyProfile({'dataRate': dataRateParam}) is None):
             return None
+        return dataRateParam
+
+    # Sets several settings at once: a dictionary with 'accelerationRange' and/or 'dataRate' (values like setAccelerationRange and setDataRate take), or the name of one in ACCELEROMETER_PROFILES
+    # Both can only be changed in standby, so everything that changed goes out in one standby, write, active sequence, and nothing is written if nothing changed
+    # Will return the profile if it worked, and None if it didn't (then nothing is changed)
+    def applyProfile(self, profileParam):
+        if(isinstance(profileParam, str)):
+            profileParam = ACCELEROMETER_PROFILES.get(profileParam)
+            if(profileParam is None):
+                return None
+        accelerationRange = profileParam.get('accelerationRange', self.accelerationRange)
+        dataRate = profileParam.get('dataRate', self.dataRate)
+        rangeCode = MMA8451_RANGE_CODES.get(accelerationRange)
+        dataRateCode = MMA8451_DATARATE_CODES.get(dataRate)
+        if(rangeCode is None or dataRateCode is None):
+            return None
+
+        shadow = self.shadow
+        with self.busLock, shadow.lock:
+            control = shadow.modified(MMA8451_REG_CTRL_REG1, MMA8451_DATARATE_MASK, dataRateCode << 3, self._readRegister)
+            dataConfig = shadow.modified(MMA8451_REG_XYZ_DATA_CFG, MMA8451_RANGE_MASK, rangeCode, self._readRegister)
+            if(control != shadow.read(MMA8451_REG_CTRL_REG1, self._readRegister) or dataConfig != shadow.read(MMA8451_REG_XYZ_DATA_CFG, self._readRegister)):
+                shadow.write(MMA8451_REG_CTRL_REG1, control & ~MMA8451_ACTIVE, self._writeRegister) # Skipped if it's already in standby
+                shadow.write(MMA8451_REG_XYZ_DATA_CFG, dataConfig, self._writeRegister)
+                shadow.write(MMA8451_REG_CTRL_REG1, control, self._writeRegister)
+        self.accelerationRange = accelerationRange
+        self.dataRate = dataRate
+        return profileParam
+
+    # Turns on the sensor's FIFO and sets up a ring buffer of bufferSizeParam samples for stream()
+    # While streaming, getAcceleration() takes samples out of the FIFO, so don't mix the two
+    def startStreaming(self, bufferSizeParam=8192):
+        self.samples = np.zeros((bufferSizeParam, 3)) # x, y, z in m/s^2
+        self.timestamps = np.zeros(bufferSizeParam, dtype=np.int64) # self.clock.monotonic_ns() of each sample
+        self.bufferSize = bufferSizeParam
+        self.samplesWritten = 0 # Total samples ever written, so the write position is samplesWritten % bufferSize
+        self.overflows = 0
+
+        # The FIFO can only be set up in standby mode
+        with self.busLock, self.shadow.lock:
+            control = self.shadow.read(MMA8451_REG_CTRL_REG1, self._readRegister)
+            self.shadow.write(MMA8451_REG_CTRL_REG1, control & ~MMA8451_ACTIVE, self._writeRegister)
+            self.shadow.write(MMA8451_REG_F_SETUP, 0x40, self._writeRegister) # Circular mode: keep the newest 32 samples
+            self.shadow.write(MMA8451_REG_CTRL_REG1, control | MMA8451_ACTIVE, self._writeRegister)
+        self.isStreaming = True
+
+    # Turns the FIFO back off. Any stream() generators stop after their current batch
+    def stopStreaming(self):
+        if(not self.isStreaming):
+            return
+        self.isStreaming = False
+        with self.busLock, self.shadow.lock:
+            control = self.shadow.read(MMA8451_REG_CTRL_REG1, self._readRegister)
+            self.shadow.write(MMA8451_REG_CTRL_REG1, control & ~MMA8451_ACTIVE, self._writeRegister)
+            self.shadow.write(MMA8451_REG_F_SETUP, 0x00, self._writeRegister)
+            self.shadow.write(MMA8451_REG_CTRL_REG1, control | MMA8451_ACTIVE, self._writeRegister)
+
+    # Empties the sensor's FIFO into the ring buffer with one burst read. Returns how many samples were read
+    # If the FIFO filled up before it was read, older samples were lost and overflows goes up by one
+    def readFifo(self):
+        with self.busLock:
+            status = self._readRegister(MMA8451_REG_F_STATUS)
+            count = status & 0x3F
+            if(count == 0):
+                return 0
+            self._readRegisters(MMA8451_REG_OUT_X_MSB, self.fifoBuffer, count * 6)
+        now = self.clock.monotonic_ns()
+        if(status & 0x80):
+            self.overflows += 1
+
+        # Scale from the raw left justified 14 bit counts straight to m/s^2 for the current range
+        scale = STANDARD_GRAVITY / (MMA8451_COUNTS_PER_G[self.accelerationRange] * 4)
+        # The newest sample was just taken, and the rest are one sample period apart before it
+        if(self.sampleOffsetsRate != self.dataRate):
+            self.sampleOffsets = np.arange(-(MMA8451_FIFO_SIZE - 1), 1, dtype=np.int64) * int(1e9 / self.dataRate)
+            self.sampleOffsetsRate = self.dataRate
+        offsets = self.sampleOffsets[MMA8451_FIFO_SIZE - count:]
+
+        # Decode all the samples at once: big endian 16 bit values, scaled straight into the ring buffer
+        raw = np.frombuffer(self.fifoBuffer, dtype='>i2', count=count * 3).reshape(count, 3)
+        start = self.samplesWritten % self.bufferSize
+        firstPart = min(count, self.bufferSize - start)
+        np.multiply(raw[:firstPart], scale, out=self.samples[start:start + firstPart])
+        np.add(offsets[:firstPart], now, out=self.timestamps[start:start + firstPart])
+        if(firstPart < count): # Wrapped around the end of the ring buffer
+            np.multiply(raw[firstPart:], scale, out=self.samples[:count - firstPart])
+            np.add(offsets[firstPart:], now, out=self.timestamps[:count - firstPart])
+        self.samplesWritten += count
+        return count
+
+    # Generator that streams batches of batchSizeParam samples as (timestamps, samples) NumPy arrays
+    # timestamps are self.clock.monotonic_ns() values (the backend's clock) and samples has one (x, y, z) row per sample in m/s^2
+    # The arrays are views into the ring buffer, so copy them if you need them after the ring buffer comes back around
+    # The ring buffer size needs to be a multiple of batchSizeParam so batches never wrap around its end
+    # Raises a ValueError on the first next() if batchSizeParam isn't positive or doesn't divide the size of a ring buffer that's already streaming
+    def stream(self, batchSizeParam=64, bufferSizeParam=8192):
+        if(batchSizeParam < 1):
+            raise ValueError('batch size must be at least 1, not {0}'.format(batchSizeParam))
+        if(not self.isStreaming):
+            self.startStreaming(bufferSizeParam - bufferSizeParam % batchSizeParam)
+        if(self.bufferSize % batchSizeParam != 0):
+            raise ValueError('batch size {0} does not divide the ring buffer size {1}'.format(batchSizeParam, self.bufferSize))
+        pollInterval = min(0.02, (MMA8451_FIFO_SIZE // 2) / self.dataRate) # Read when the FIFO is about half full
+        samplesRead = self.samplesWritten + (-self.samplesWritten) % batchSizeParam # Start on a batch boundary
+        while(self.isStreaming):
+            self.readFifo()
+            # If we fell so far behind that the next batch is about to be written over, skip ahead to the oldest batch that's safe
+            oldestSafe = self.samplesWritten - (self.bufferSize - MMA8451_FIFO_SIZE)
+            if(samplesRead < oldestSafe):
+                samplesRead = oldestSafe + (-oldestSafe) % batchSizeParam
+            if(self.samplesWritten - samplesRead >= batchSizeParam):
+                start = samplesRead % self.bufferSize
+                samplesRead += batchSizeParam
+                yield self.timestamps[start:start + batchSizeParam], self.samples[start:start + batchSizeParam]
+            else:
+                self.clock.sleep(pollInterval)
+
+    # Adds reading the acceleration rateParam times a second to a Schedulerlib.SensorScheduler
+    def register(self, schedulerParam, rateParam, nameParam='acceleration'):
+        return schedulerParam.addTask(nameParam, self.getAcceleration, rateParam, self.i2c)
+
+    def _readRegister(self, registerParam):
+        self._readRegisters(registerParam, self.statusBuffer)
+        return self.statusBuffer[0]
+
+    # Reads countParam bytes (or len(bufferParam) if it's None) starting at registerParam into bufferParam in one i2c transaction
+    def _readRegisters(self, registerParam, bufferParam, countParam=None):
+        while(not self.i2c.try_lock()):
+            pass
+        try:
+            self.i2c.writeto_then_readfrom(self.address, bytes((registerParam,)), bufferParam, in_end=countParam)
+        finally:
+            self.i2c.unlock()
+
+    def _writeRegister(self, registerParam, valueParam):
+        while(not self.i2c.try_lock()):
+            pass
+        try:
+            self.i2c.writeto(self.address, bytes((registerParam, valueParam & 0xFF)))
+        finally:
+            self.i2c.unlock()
 
 
 
@@ -91,9 +291,16 @@ class AccelerometerSensor:
 
 if __name__ == "__main__":
 
-    i2c = busio.I2C(board.SCL, board.SDA) # Initializes the i2c connection on the Raspberry Pi
+    streamData = False
+
+    i2c = Backendlib.getBackend().getI2C() # Initializes the i2c connection on the Raspberry Pi
     test = AccelerometerSensor(i2c) # Initializes the color sensor with the i2c connection
 
+    if(streamData): # Stream every sample at 800Hz instead
+        test.setDataRate(800)
+        for timestamps, samples in test.stream(400): # Batches of 400 samples (half a second)
+            print('{0} samples, mean z={1:0.3f}m/s^2, {2} FIFO overflows'.format(len(samples), samples[:, 2].mean(), test.overflows))
+
     while(True): # Get measurements every second
         x, y, z = test.getAcceleration() # Gets x, y, and z acceleration from the sensor
         print('Acceleration: x={0:0.3f}m/s^2 y={1:0.3f}m/s^2 z={2:0.3f}m/s^2'.format(x, y, z))
@@ -109,21 +316,21 @@ if __name__ == "__main__":
         #  - PL_LLF: Landscape, left, front
         #  - PL_LLB: Landscape, left, back
         print('Orientation: ', end='')
-        if orientation == adafruit_mma8451.PL_PUF:
+        if orientation == MMA8451_PL_PUF:
             print('Portrait, up, front')
-        elif orientation == adafruit_mma8451.PL_PUB:
+        elif orientation == MMA8451_PL_PUB:
             print('Portrait, up, back')
-        elif orientation == adafruit_mma8451.PL_PDF:
+        elif orientation == MMA8451_PL_PDF:
             print('Portrait, down, front')
-        elif orientation == adafruit_mma8451.PL_PDB:
+        elif orientation == MMA8451_PL_PDB:
             print('Portrait, down, back')
-        elif orientation == adafruit_mma8451.PL_LRF:
+        elif orientation == MMA8451_PL_LRF:
             print('Landscape, right, front')
-        elif orientation == adafruit_mma8451.PL_LRB:
+        elif orientation == MMA8451_PL_LRB:
             print('Landscape, right, back')
-        elif orientation == adafruit_mma8451.PL_LLF:
+        elif orientation == MMA8451_PL_LLF:
             print('Landscape, left, front')
-        elif orientation == adafruit_mma8451.PL_LLB:
+        elif orientation == MMA8451_PL_LLB:
             print('Landscape, left, back')
 
 
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""asyncio versions of the sensors, the display and the wheels, for running them from an event loop (await sensor.read(), async for sample in sensor.stream(rate), await oled.show(), await drive.forward(50)).
+   Anything that blocks (i2c transactions, PWM writes, constructors that wait for hardware) runs on one small shared thread pool, and only one call per i2c bus is handed to it at a time,
+   so dozens of streams can share the loop without piling threads up behind a bus lock. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+try: # Imported as part of the libraries package
+    from . import DistanceSensorlib
+    from .Metricslib import LatencyHistogram
+except ImportError: # Run from inside the libraries folder
+    import DistanceSensorlib
+    from Metricslib import LatencyHistogram
+
+DEFAULT_WORKERS = 4 # Threads in the shared pool. Calls on one i2c bus go one at a time anyway, so more than a few only helps with several buses
+
+executor = None
+executorLock = threading.Lock()
+
+# Returns the thread pool blocking calls run on, making it the first time
+def getExecutor():
+    global executor
+    with executorLock:
+        if(executor is None):
+            executor = ThreadPoolExecutor(DEFAULT_WORKERS, thread_name_prefix='robotIO')
+        return executor
+
+# Sets the thread pool blocking calls run on (like a bigger one for several buses). Call it before anything runs on it
+def setExecutor(executorParam):
+    global executor
+    with executorLock:
+        executor = executorParam
+    return executorParam
+
+# Runs functionParam(*args, **kwargs) on the thread pool and returns what it returns
+# If the awaiting task is cancelled the call still finishes on its thread (a bus transaction can't be stopped halfway), but its result is thrown away
+async def runBlocking(functionParam, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(getExecutor(), functools.partial(functionParam, *args, **kwargs))
+
+asyncBusLocks = weakref.WeakKeyDictionary() # event loop -> {bus lock from Schedulerlib.getBusLock -> asyncio.Lock for that bus}, both dropped along with what they're for
+
+# Returns the running loop's asyncio.Lock that goes with a device's bus lock (None if busLockParam is None), so the loop waits its turn for a bus instead of a pool thread
+# asyncio locks belong to one loop, so each loop gets its own
+def getAsyncBusLock(busLockParam):
+    if(busLockParam is None):
+        return None
+    locks = asyncBusLocks.get(asyncio.get_running_loop())
+    if(locks is None):
+        locks = weakref.WeakKeyDictionary()
+        asyncBusLocks[asyncio.get_running_loop()] = locks
+    lock = locks.get(busLockParam)
+    if(lock is None):
+        lock = asyncio.Lock()
+        locks[busLockParam] = lock
+    return lock
+
+
+class AsyncStream:
+    """Reads a sensor at a fixed rate as an async iterator (async for sample in sensor.stream(rate)), timed on the event loop's clock.
+    Like SensorScheduler, deadlines that have already gone by are counted as missed and skipped instead of read back to back.
+    Keeps how late each sample was (from its deadline to when it was read) so getStats shows the per-sample latency"""
+
+    # readParam is an async function that returns one sample, and countParam how many samples to give (forever if it's None)
+    def __init__(self, readParam, rateParam, countParam=None):
+        self.read = readParam
+        self.rate = rateParam
+        self.period = 1.0 / rateParam
+        self.count = countParam
+        self.nextDeadline = None
+        self.isClosed = False
+
+        # Statistics (times are in seconds)
+        self.samples = 0
+        self.missedDeadlines = 0
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+        self.latencies = LatencyHistogram() # Every sample's latency in nanoseconds, for percentiles. Stays the same size however long the stream runs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if(self.isClosed or (self.count is not None and self.samples >= self.count)):
+            raise StopAsyncIteration
+        loop = asyncio.get_running_loop()
+        if(self.nextDeadline is None):
+            self.nextDeadline = loop.time()
+        deadline = self.nextDeadline
+        waitTime = deadline - loop.time()
+        if(waitTime > 0):
+            await asyncio.sleep(waitTime)
+        sample = await self.read()
+
+        now = loop.time()
+        latency = now - deadline
+        self.samples += 1
+        self.latencyTotal += latency
+        if(latency > self.latencyMax):
+            self.latencyMax = latency
+        self.latencies.record(max(0, int(latency * 1e9)))
+
+        nextDeadline = deadline + self.period
+        if(nextDeadline < now):
+            missed = int((now - nextDeadline) / self.period) + 1
+            self.missedDeadlines += missed
+            nextDeadline += missed * self.period
+        self.nextDeadline = nextDeadline
+        return sample
+
+    # Ends the stream after the sample it's on
+    def close(self):
+        self.isClosed = True
+
+    # Returns the statistics as a dictionary (times are in microseconds)
+    def getStats(self):
+        samples = max(1, self.samples)
+        p50, p99 = self.latencies.getPercentiles([50, 99])
+        return {
+            'rate': self.rate,
+            'samples': self.samples,
+            'missedDeadlines': self.missedDeadlines,
+            'meanLatency': self.latencyTotal / samples * 1e6,
+            'maxLatency': self.latencyMax * 1e6,
+            'p50Latency': p50 / 1000 if p50 is not None else 0.0,
+            'p99Latency': p99 / 1000 if p99 is not None else 0.0,
+        }
+
+    def resetStats(self):
+        self.samples = 0
+        self.missedDeadlines = 0
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+        self.latencies.reset()
+
+
+class AsyncSensor:
+    """Any sensor read as a coroutine. Blocking reads run on the shared thread pool, one per bus at a time; reads that don't block (like a GPIO pin) run right on the loop"""
+
+    # readFunctionParam is called with no arguments to get a sample
+    # busLockParam is the Schedulerlib bus lock the read uses (None if it doesn't use a bus), and blockingParam is False for reads cheap enough to run on the loop
+    def __init__(self, readFunctionParam, busLockParam=None, blockingParam=True):
+        self.readFunction = readFunctionParam
+        self.busLock = busLockParam
+        self.isBlocking = blockingParam
+
+    # Returns one sample
+    async def read(self):
+        if(not self.isBlocking):
+            return self.readFunction()
+        return await self._runOnBus(self.readFunction)
+
+    # Returns an AsyncStream of rateParam samples a second (countParam of them, or forever if it's None)
+    def stream(self, rateParam, countParam=None):
+        return AsyncStream(self.read, rateParam, countParam)
+
+    # Runs a blocking function of the device on the pool, holding the bus like a read does
+    async def _runOnBus(self, functionParam, *args):
+        busLock = getAsyncBusLock(self.busLock)
+        if(busLock is None):
+            return await runBlocking(functionParam, *args)
+        async with busLock:
+            return await runBlocking(functionParam, *args)
+
+
+class AsyncColorSensor(AsyncSensor):
+    """ColorSensorlib.ColorSensor on the event loop. read() gives a ColorSample"""
+
+    def __init__(self, sensorParam):
+        AsyncSensor.__init__(self, sensorParam.sample, sensorParam.busLock)
+        self.sensor = sensorParam
+
+    async def getRGB(self):
+        return (await self.read()).rgb
+
+    async def getColorTemperature(self):
+        return (await self.read()).temperature
+
+    async def getLux(self):
+        return (await self.read()).lux
+
+
+class AsyncAccelerometer(AsyncSensor):
+    """AccelerometerSensorlib.AccelerometerSensor on the event loop. read() gives the (x, y, z) acceleration"""
+
+    def __init__(self, sensorParam):
+        AsyncSensor.__init__(self, sensorParam.getAcceleration, sensorParam.busLock)
+        self.sensor = sensorParam
+
+    async def getOrientation(self):
+        return await self._runOnBus(self.sensor.getOrientation)
+
+
+class AsyncDistanceSensor(AsyncSensor):
+    """DistanceSensorlib.DistanceSensor on the event loop. read() gives a RangeReading, using the edge-driven requestDistance, so waiting for the echo doesn't hold a thread.
+    Pings are still kept MIN_PING_INTERVAL apart (the loop sleeps out the rest)"""
+
+    def __init__(self, sensorParam, measure='cm', timeoutParam=0.04):
+        AsyncSensor.__init__(self, None, blockingParam=False)
+        self.sensor = sensorParam
+        self.measure = measure
+        self.timeout = timeoutParam
+
+    # Will return None if the measure isn't 'cm' or 'in', or if a reading is already in flight
+    # If the awaiting task is cancelled the ping still finishes (or times out) on its own, and its reading is thrown away
+    async def read(self):
+        sensor = self.sensor
+        if(sensor.lastPingTime is not None):
+            waitTime = sensor.lastPingTime + DistanceSensorlib.MIN_PING_INTERVAL - sensor.clock.monotonic()
+            if(waitTime > 0):
+                await asyncio.sleep(waitTime)
+        future = sensor.requestDistance(self.measure, timeoutParam=self.timeout)
+        if(future is None):
+            return None
+        try:
+            await asyncio.wrap_future(future)
+        except TimeoutError: # waitForReading turns it into the right status
+            pass
+        return sensor.waitForReading(future, self.measure)
+
+
+class AsyncLineSensor(AsyncSensor):
+    """LineSensorlib.LineSensor (read() gives readLine()) or LineSensorArray (read() gives getPosition()) on the event loop. Reading pins doesn't block, so it's done right on the loop"""
+
+    def __init__(self, sensorParam):
+        AsyncSensor.__init__(self, sensorParam.getPosition if hasattr(sensorParam, 'getPosition') else sensorParam.readLine, blockingParam=False)
+        self.sensor = sensorParam
+
+
+class AsyncOLED:
+    """OLEDlib.OLED on the event loop. Drawing only changes memory, so the draw functions are the OLED's own (drawText, drawLine, ...);
+    show() sends the changes on the thread pool. Wait for show() before drawing again, since the frame is read while it's being sent"""
+
+    def __init__(self, oledParam):
+        self.oled = oledParam
+
+    # Sends what changed since the last show (everything if fullParam is True)
+    async def show(self, fullParam=False):
+        async with getAsyncBusLock(self.oled.busLock):
+            return await runBlocking(self.oled.showDisplay, fullParam)
+
+    # Everything else (drawing, clearing, stats) is the OLED's
+    def __getattr__(self, nameParam):
+        return getattr(self.oled, nameParam)
+
+
+class AsyncDrivingController:
+    """Servolib.DrivingController on the event loop. PWM writes run on the thread pool, and with a duration the drive functions drive that long and then stop,
+    stopping the wheels right away if the task is cancelled partway"""
+
+    def __init__(self, controllerParam):
+        self.controller = controllerParam
+
+    # Sleeps out whatever is left of the servos' settle time, on the controller's clock (a VirtualClock just moves forward instead of the loop waiting)
+    async def waitUntilReady(self):
+        clock = self.controller.clock
+        waitTime = self.controller.readyTime - clock.monotonic()
+        if(waitTime > 0):
+            if(hasattr(clock, 'advance')):
+                clock.sleep(waitTime)
+            else:
+                await asyncio.sleep(waitTime)
+
+    async def setWheelSpeeds(self, speedParamCW, speedParamCCW, durationParam=None):
+        await runBlocking(self.controller.setWheelSpeeds, speedParamCW, speedParamCCW)
+        if(durationParam is None):
+            return
+        try:
+            await asyncio.sleep(durationParam)
+        finally: # Cancelled or not, the wheels don't keep going
+            await asyncio.shield(self.stop())
+
+    async def forward(self, speedParamCW, speedParamCCW=None, durationParam=None):
+        speedParamCCW = speedParamCW if speedParamCCW is None else speedParamCCW
+        await self.setWheelSpeeds(speedParamCW, speedParamCCW, durationParam)
+
+    async def backward(self, speedParamCW, speedParamCCW=None, durationParam=None):
+        speedParamCCW = speedParamCW if speedParamCCW is None else speedParamCCW
+        await self.setWheelSpeeds(-speedParamCW, -speedParamCCW, durationParam)
+
+    async def turnLeft(self, speedParamCW, speedParamCCW=None, durationParam=None):
+        speedParamCCW = speedParamCW if speedParamCCW is None else speedParamCCW
+        await self.setWheelSpeeds(speedParamCW, -speedParamCCW, durationParam)
+
+    async def turnRight(self, speedParamCW, speedParamCCW=None, durationParam=None):
+        speedParamCCW = speedParamCW if speedParamCCW is None else speedParamCCW
+        await self.setWheelSpeeds(-speedParamCW, speedParamCCW, durationParam)
+
+    async def stop(self):
+        await runBlocking(self.controller.stop)
+
+    async def close(self):
+        await runBlocking(self.controller.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.close()
+        return False
+
+
+# Which async class goes with each library class
+WRAPPERS = {
+    'ColorSensor': AsyncColorSensor,
+    'AccelerometerSensor': AsyncAccelerometer,
+    'DistanceSensor': AsyncDistanceSensor,
+    'LineSensor': AsyncLineSensor,
+    'LineSensorArray': AsyncLineSensor,
+    'OLED': AsyncOLED,
+    'DrivingController': AsyncDrivingController,
+}
+
+# Returns the async version of a sensor, display or DrivingController that's already made
+# Will return None if there isn't one for that class
+def wrap(deviceParam):
+    wrapper = WRAPPERS.get(type(deviceParam).__name__)
+    if(wrapper is None):
+        return None
+    return wrapper(deviceParam)
+
+# Makes classParam(*args, **kwargs) on the thread pool (constructors can wait on the hardware) and returns its async version, like: color = await Asynclib.create(ColorSensor)
+# Will return None if there isn't an async version of that class
+async def create(classParam, *args, **kwargs):
+    if(classParam.__name__ not in WRAPPERS):
+        return None
+    return wrap(await runBlocking(classParam, *args, **kwargs))
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    from ColorSensorlib import ColorSensor
+    from DistanceSensorlib import DistanceSensor
+    from OLEDlib import OLED
+    from Servolib import DrivingController
+
+    Backendlib.setBackend(Backendlib.SimulatedBackend())
+
+    async def main():
+        color = await create(ColorSensor)
+        distance = await create(DistanceSensor, 17, 27)
+        oled = await create(OLED)
+        drive = await create(DrivingController, 18, 13)
+
+        async def showColors():
+            async for sample in color.stream(10, 20): # 10 times a second for 2 seconds
+                oled.drawLine(0, 'RGB {0}'.format(sample.rgb))
+                await oled.show()
+
+        async def watchDistance():
+            async for reading in distance.stream(5, 10):
+                print(reading)
+
+        await drive.waitUntilReady()
+        await asyncio.gather(showColors(), watchDistance(), drive.forward(50, durationParam=2.0)) # All at once on one loop
+        await drive.close()
+
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Backends that give the other libraries their hardware: the real Raspberry Pi (HardwareBackend), or simulated hardware (SimulatedBackend) so everything can be run and benchmarked on any computer.
+   Set the ROBOT_BACKEND environment variable to "simulated" (or call setBackend) to run everything on the simulator, or to "replay" to run it on recorded logs (ReplayBackend). Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import importlib
+import os
+import threading
+import time
+
+
+class LazyModule:
+    """Stands in for a module and only imports it the first time something in it is used, so importing the libraries stays fast.
+    After that everything in the module is copied over, so using it costs the same as using the module itself"""
+
+    def __init__(self, nameParam):
+        self.__dict__['lazyModuleName'] = nameParam
+
+    def __getattr__(self, nameParam):
+        module = importlib.import_module(self.__dict__['lazyModuleName'])
+        self.__dict__.update(module.__dict__)
+        return getattr(module, nameParam)
+
+# Returns a LazyModule for a module (like 'numpy' or 'PIL.Image') that gets imported the first time it's used
+def lazyImport(nameParam):
+    return LazyModule(nameParam)
+
+# Imports one of the other libraries by name, whether they're being used as the libraries package or run from inside the folder
+def importLibrary(nameParam):
+    if(__package__):
+        return importlib.import_module('.' + nameParam, __package__)
+    return importlib.import_module(nameParam)
+
+
+class HardwareBackend:
+    """The real hardware on the Raspberry Pi. The hardware libraries only get imported when something asks for them, so this module can be imported anywhere"""
+
+    name = 'hardware'
+
+    def __init__(self):
+        self.clock = time
+        self.lock = threading.Lock()
+        self.gpioModule = None
+        self.i2c = None
+        self.pwm = None
+
+    # The RPi.GPIO module
+    @property
+    def gpio(self):
+        if(self.gpioModule is None):
+            import RPi.GPIO
+            self.gpioModule = RPi.GPIO
+        return self.gpioModule
+
+    # Returns the i2c connection on the board's SDA line on board pin 3 (GPIO pin 2) and SCL line on board pin 5 (GPIO pin 3), made the first time it's asked for
+    def getI2C(self):
+        with self.lock:
+            if(self.i2c is None):
+                import board
+                import busio
+                self.i2c = busio.I2C(board.SCL, board.SDA)
+            return self.i2c
+
+    # Returns the PWM backend from PWMlib the servos share (RPi.GPIO's software PWM)
+    def getPWM(self):
+        with self.lock:
+            if(self.pwm is None):
+                self.pwm = importLibrary('PWMlib').SoftwarePWMBackend(self.gpio)
+            return self.pwm
+
+    def createColorSensor(self, i2cParam):
+        import adafruit_tcs34725
+        return adafruit_tcs34725.TCS34725(i2cParam)
+
+    def createAccelerometer(self, i2cParam, addressParam=0x1d):
+        import adafruit_mma8451
+        return adafruit_mma8451.MMA8451(i2cParam, addressParam)
+
+    def createDisplay(self, widthParam, heightParam, i2cParam, addressParam=0x3c):
+        import adafruit_ssd1306
+        return adafruit_ssd1306.SSD1306_I2C(widthParam, heightParam, i2cParam, addr=addressParam)
+
+
+class SimulatedBackend:
+    """Simulated hardware from Simulatorlib. Sensor values can be scripted through the simulated devices (see getDevice), i2c transactions can take as long as they would
+    on the real bus, and with virtualClockParam the i2c devices and the distance sensor echoes run on a VirtualClock, so runs come out the same every time and never really wait on the modeled times"""
+
+    name = 'simulated'
+
+    # i2cFrequencyParam is the bus clock in Hz to model i2c transaction times with (None to not model them)
+    # setupLatencyParam is how long (in seconds) GPIO setup()/cleanup() take, and pwmLatencyParam how long each PWM write takes
+    # startupDelayParam is how long (in seconds) the simulated i2c devices ignore the bus after they're made, like real ones do while they power up
+    def __init__(self, i2cFrequencyParam=None, virtualClockParam=False, setupLatencyParam=0.0, pwmLatencyParam=0.0, startupDelayParam=0.0):
+        self.simulator = importLibrary('Simulatorlib')
+        self.clock = self.simulator.VirtualClock() if virtualClockParam else time
+        self.gpio = self.simulator.SimulatedGPIO(setupLatencyParam, self.clock)
+        self.i2c = self.simulator.SimulatedI2C(i2cFrequencyParam, self.clock)
+        self.pwm = importLibrary('PWMlib').SimulatedPWMBackend(pwmLatencyParam)
+        # The robot's i2c devices are on the bus from the start, like they are once it's powered on
+        self.simulator.SimulatedTCS34725(self.i2c, 0x29, startupDelayParam)
+        self.simulator.SimulatedMMA8451(self.i2c, 0x1d, startupDelayParam)
+        self.simulator.SimulatedSSD1306(128, 64, self.i2c, 0x3c, startupDelayParam)
+
+    def getI2C(self):
+        return self.i2c
+
+    def getPWM(self):
+        return self.pwm
+
+    # Returns the simulated device at an i2c address (to set what it reads), or None if there isn't one
+    def getDevice(self, addressParam):
+        return self.i2c.devices.get(addressParam)
+
+    # The create functions return the simulated device already on the bus at that address, or put a new one there if there isn't one
+    def createColorSensor(self, i2cParam, addressParam=0x29):
+        device = i2cParam.devices.get(addressParam)
+        if(not isinstance(device, self.simulator.SimulatedTCS34725)):
+            device = self.simulator.SimulatedTCS34725(i2cParam, addressParam)
+        return device
+
+    def createAccelerometer(self, i2cParam, addressParam=0x1d):
+        device = i2cParam.devices.get(addressParam)
+        if(not isinstance(device, self.simulator.SimulatedMMA8451)):
+            device = self.simulator.SimulatedMMA8451(i2cParam, addressParam)
+        return device
+
+    def createDisplay(self, widthParam, heightParam, i2cParam, addressParam=0x3c):
+        device = i2cParam.devices.get(addressParam)
+        if(not isinstance(device, self.simulator.SimulatedSSD1306) or device.width != widthParam or device.height != heightParam):
+            device = self.simulator.SimulatedSSD1306(widthParam, heightParam, i2cParam, addressParam)
+        return device
+
+class ReplayBackend(SimulatedBackend):
+    """A SimulatedBackend whose sensors read back a folder of SampleLogger logs (see Replaylib), so a control program can be run again on what the robot saw.
+    By default it runs on a VirtualClock and the logs play as fast as the program reads them, which comes out the same every run;
+    with realTimeParam they play at the speed they were recorded"""
+
+    name = 'replay'
+
+    # pinsParam is Replaylib.LogReplayer's: log name -> the pins its sensor is on
+    def __init__(self, directoryParam, pinsParam=None, realTimeParam=False, i2cFrequencyParam=None):
+        SimulatedBackend.__init__(self, i2cFrequencyParam, virtualClockParam=not realTimeParam)
+        self.replayer = importLibrary('Replaylib').LogReplayer(self, directoryParam, pinsParam)
+        self.replayer.start()
+
+    # Stops the playback (only real time playback has anything to stop)
+    def close(self):
+        self.replayer.close()
+
+currentBackend = None
+currentBackendLock = threading.Lock()
+
+# Returns backendParam if it's given, otherwise the backend everything shares
+# That's a SimulatedBackend if the ROBOT_BACKEND environment variable is "simulated", a ReplayBackend of the ROBOT_REPLAY_DIR folder (robotLogs if it isn't set) if it's "replay",
+# and a HardwareBackend otherwise, unless setBackend was called
+def getBackend(backendParam=None):
+    global currentBackend
+    if(backendParam is not None):
+        return backendParam
+    with currentBackendLock:
+        if(currentBackend is None):
+            if(os.environ.get('ROBOT_BACKEND', 'hardware').lower() in ('simulated', 'simulator', 'sim')):
+                currentBackend = SimulatedBackend()
+            elif(os.environ.get('ROBOT_BACKEND', 'hardware').lower() == 'replay'):
+                currentBackend = ReplayBackend(os.environ.get('ROBOT_REPLAY_DIR', 'robotLogs'))
+            else:
+                currentBackend = HardwareBackend()
+        return currentBackend
+
+# Sets the backend everything shares. Call it before making any sensors
+def setBackend(backendParam):
+    global currentBackend
+    with currentBackendLock:
+        currentBackend = backendParam
+    return backendParam
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib # The libraries use the imported module, not this script's copy of it
+    from ColorSensorlib import ColorSensor
+    from LineSensorlib import LineSensor
+
+    backend = Backendlib.setBackend(Backendlib.SimulatedBackend(i2cFrequencyParam=100000, virtualClockParam=True)) # Everything made after this runs on the simulator
+
+    colorSensor = ColorSensor() # No i2c connection or driver needed; the backend makes them
+    backend.getDevice(0x29).setRaw(500, 200, 100, 900) # Script what the color sensor sees
+    print(colorSensor.getRGB())
+
+    lineSensor = LineSensor(22)
+    backend.gpio.setInput(22, 1) # Pretend the line sensor sees a line
+    print(lineSensor.readLine())
+
+    print('{0} i2c transactions, {1:0.1f}us of modeled bus time'.format(backend.i2c.transactions, backend.i2c.busTime * 1e6))
@@ -0,0 +1,1048 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Microbenchmarks for the libraries, run against simulated hardware so they work on any computer. Run this file to run all of them
+   python Benchmarklib.py --suite --output results.json runs just the suite of every library class (benchmarkLibraries) and saves it, and --compare results.json
+   checks a run against saved results and exits with 1 if its modeled i2c traffic or memory got worse than REGRESSION_THRESHOLDS allow (slower times only get reported, unless --gate-timing).
+   Every run also exits with 1 if checkColorSample or checkDistanceStatuses fails
+   @version 0.0.1
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+try: # Imported as part of the libraries package
+    from . import Asynclib
+    from . import Backendlib
+    from . import Metricslib
+    from . import Workerlib
+    from .AccelerometerProcessinglib import AccelerometerProcessor
+    from .AccelerometerSensorlib import AccelerometerSensor, ACCELEROMETER_PROFILES, MMA8451_RANGE_CODES, MMA8451_DATARATE_CODES
+    from .Backendlib import SimulatedBackend, ReplayBackend, setBackend
+    from .ColorClassifierlib import ColorClassifier
+    from .ColorSensorlib import ColorSensor, TCS34725_GAIN_CODES
+    from .DistanceArraylib import DistanceArray
+    from .DistanceSensorlib import DistanceSensor, HampelFilter, MIN_PING_INTERVAL, STATUS_OK, STATUS_OUTLIER, STATUS_NO_ECHO, STATUS_NO_RESPONSE
+    from .LineFollowerlib import LineFollower
+    from .LineSensorlib import LineSensor, LineSensorArray
+    from .Metricslib import LatencyHistogram
+    from .OLEDlib import OLED
+    from .PWMlib import SimulatedPWMBackend
+    from .SampleLoggerlib import SampleLogger, openLog, RECORD_FIELDS
+    from .Servolib import ServoController, DrivingController
+    from .Simulatorlib import SimulatedGPIO, SimulatedI2C, SimulatedRobot, SimulatedSSD1306, VirtualClock
+except ImportError: # Run from inside the libraries folder
+    import Asynclib
+    import Backendlib
+    import Metricslib
+    import Workerlib
+    from AccelerometerProcessinglib import AccelerometerProcessor
+    from AccelerometerSensorlib import AccelerometerSensor, ACCELEROMETER_PROFILES, MMA8451_RANGE_CODES, MMA8451_DATARATE_CODES
+    from Backendlib import SimulatedBackend, ReplayBackend, setBackend
+    from ColorClassifierlib import ColorClassifier
+    from ColorSensorlib import ColorSensor, TCS34725_GAIN_CODES
+    from DistanceArraylib import DistanceArray
+    from DistanceSensorlib import DistanceSensor, HampelFilter, MIN_PING_INTERVAL, STATUS_OK, STATUS_OUTLIER, STATUS_NO_ECHO, STATUS_NO_RESPONSE
+    from LineFollowerlib import LineFollower
+    from LineSensorlib import LineSensor, LineSensorArray
+    from Metricslib import LatencyHistogram
+    from OLEDlib import OLED
+    from PWMlib import SimulatedPWMBackend
+    from SampleLoggerlib import SampleLogger, openLog, RECORD_FIELDS
+    from Servolib import ServoController, DrivingController
+    from Simulatorlib import SimulatedGPIO, SimulatedI2C, SimulatedRobot, SimulatedSSD1306, VirtualClock
+
+# NumPy and PIL take a while to import, so they're only imported once a benchmark uses them
+np = Backendlib.lazyImport('numpy')
+Image = Backendlib.lazyImport('PIL.Image')
+ImageDraw = Backendlib.lazyImport('PIL.ImageDraw')
+
+
+# Calls functionParam iterationsParam times and returns a dictionary of timing statistics (latencies are in nanoseconds)
+def timeCalls(functionParam, iterationsParam=100000, warmupParam=1000):
+    for i in range(warmupParam):
+        functionParam()
+
+    clock = time.perf_counter_ns
+    latencies = [0] * iterationsParam
+    startTime = clock()
+    for i in range(iterationsParam):
+        callStart = clock()
+        functionParam()
+        latencies[i] = clock() - callStart
+    totalTime = clock() - startTime
+    return summarizeLatencies(latencies, totalTime)
+
+# Timing statistics for a list of latencies in nanoseconds, like timeCalls returns. totalTimeParam is how long they took altogether (their sum if it's None)
+def summarizeLatencies(latenciesParam, totalTimeParam=None):
+    latencies = sorted(latenciesParam)
+    count = len(latencies)
+    if(totalTimeParam is None):
+        totalTimeParam = sum(latencies)
+    return {
+        'iterations': count,
+        'opsPerSecond': count / (totalTimeParam / 1e9),
+        'mean': sum(latencies) / count,
+        'p50': latencies[count // 2],
+        'p99': latencies[min(count - 1, (count * 99) // 100)],
+        'max': latencies[-1],
+    }
+
+# Prints one line of results from timeCalls
+def printResult(nameParam, resultParam):
+    print('{0:<40} {1:>12.0f} ops/s   p50 {2:>9.2f}us   p99 {3:>9.2f}us'.format(nameParam, resultParam['opsPerSecond'], resultParam['p50'] / 1000, resultParam['p99'] / 1000))
+
+# Calls functionParam iterationsParam times with tracemalloc on and returns the mean, per call, of the most memory it had allocated at once (peakBytes)
+# and of how much it still held afterwards (retainedBytes). Kept apart from timeCalls, since tracing slows every allocation down
+# tracemalloc only keeps track of bytes, not how many allocations they came from, so these stand in for allocations per call
+def measureAllocations(functionParam, iterationsParam=1000):
+    functionParam() # Things only allocated the first time (caches, buffers) don't count
+    tracemalloc.start()
+    startMemory = tracemalloc.get_traced_memory()[0]
+    peakTotal = 0
+    for i in range(iterationsParam):
+        callStart = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        functionParam()
+        peakTotal += tracemalloc.get_traced_memory()[1] - callStart
+    retained = tracemalloc.get_traced_memory()[0] - startMemory
+    tracemalloc.stop()
+    return {'peakBytes': peakTotal / iterationsParam, 'retainedBytes': retained / iterationsParam}
+
+
+# How much each result can get worse than the saved one before compareResults calls it a regression (0.25 is 25%)
+# The modeled i2c traffic and memory come out the same every run, so they're what fails a comparison. Times swing from run to run (even the best of several),
+# so by default a slower time is only reported, not counted as a failure
+REGRESSION_THRESHOLDS = {'opsPerSecond': 0.25, 'p50': 0.25, 'p99': 0.5, 'transactions': 0.01, 'busTime': 0.01, 'peakBytes': 0.1, 'retainedBytes': 0.1}
+TIMING_METRICS = ['opsPerSecond', 'p50', 'p99']
+HIGHER_IS_BETTER = ['opsPerSecond']
+BYTES_SLACK = 64 # Memory can grow by this many bytes per call whatever the threshold says, since a few bytes on a small number is a big percentage
+
+# Writes a set of results (like benchmarkLibraries returns) to a JSON file, along with the Python and platform they came from
+def saveResults(resultsParam, pathParam):
+    with open(pathParam, 'w') as resultsFile:
+        json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(), 'results': resultsParam}, resultsFile, indent=2)
+
+# Returns the results saved in a JSON file by saveResults
+def loadResults(pathParam):
+    with open(pathParam) as resultsFile:
+        return json.load(resultsFile)['results']
+
+# Returns a list of (name, metric, saved value, new value, change, isFailure) for every result in both sets that got worse by more than its REGRESSION_THRESHOLDS
+# (times toleranceParam, for noisier computers). change is how much worse as a fraction of the saved value
+# isFailure is False for the TIMING_METRICS unless gateTimingParam is True, so a noisy computer can't fail a comparison by itself
+def compareResults(savedParam, resultsParam, toleranceParam=1.0, gateTimingParam=False):
+    regressions = []
+    for name, result in resultsParam.items():
+        saved = savedParam.get(name)
+        if(saved is None):
+            continue
+        for metric, threshold in REGRESSION_THRESHOLDS.items():
+            if(saved.get(metric) is None or result.get(metric) is None):
+                continue
+            worse = saved[metric] - result[metric] if metric in HIGHER_IS_BETTER else result[metric] - saved[metric]
+            if(metric.endswith('Bytes') and worse <= BYTES_SLACK):
+                continue
+            if(worse > threshold * toleranceParam * abs(saved[metric]) and worse > 0):
+                isFailure = gateTimingParam or metric not in TIMING_METRICS
+                regressions.append((name, metric, saved[metric], result[metric], worse / saved[metric] if saved[metric] else float('inf'), isFailure))
+    return regressions
+
+
+# Per-read cost of a line sensor when every read sets up and cleans up the pin vs. when the pin is kept in a GPIOSession
+# setupLatencyParam models how long setup()/cleanup() take on the real board
+def benchmarkGPIOSession(iterationsParam=20000, setupLatencyParam=0.00005):
+    gpio = SimulatedGPIO(setupLatencyParam)
+    readPin = 22
+
+    # What every read used to do
+    def setupReadCleanup():
+        gpio.setmode(gpio.BCM)
+        gpio.setup(readPin, gpio.IN)
+        output = gpio.input(readPin)
+        gpio.cleanup()
+        return output
+
+    results = {'setup/read/cleanup per read': timeCalls(setupReadCleanup, iterationsParam, 100)}
+    with LineSensor(readPin, gpio) as sensor:
+        results['LineSensor.readLine (session)'] = timeCalls(sensor.readLine, iterationsParam)
+    return results
+
+# Reading a row of pinsParam line sensors: setting up and cleaning up every pin for each read (what LineSensor used to do), one LineSensor per pin,
+# and one LineSensorArray.read / getPosition for the whole row. setupLatencyParam models how long setup()/cleanup() take on the real board
+# Also times how long a change takes to reach an array change callback (debounce off), from the edge on the simulated pin
+def benchmarkLineSensorArray(iterationsParam=20000, pinsParam=(5, 6, 13, 19, 26, 16, 20, 21), setupLatencyParam=0.00005):
+    gpio = SimulatedGPIO(setupLatencyParam)
+    for pin in pinsParam[2:4]:
+        gpio.setInput(pin, 1)
+
+    def setupReadCleanup():
+        mask = 0
+        for bit, pin in enumerate(pinsParam):
+            gpio.setmode(gpio.BCM)
+            gpio.setup(pin, gpio.IN)
+            mask |= gpio.input(pin) << bit
+            gpio.cleanup()
+        return mask
+
+    results = {'setup/read/cleanup per pin ({0} pins)'.format(len(pinsParam)): timeCalls(setupReadCleanup, max(1, iterationsParam // 100), 10)}
+    sensors = [LineSensor(pin, gpio) for pin in pinsParam]
+    def readEach():
+        return [sensor.readLine() for sensor in sensors]
+    results['LineSensor.readLine per pin'] = timeCalls(readEach, iterationsParam)
+    for sensor in sensors:
+        sensor.close()
+
+    with LineSensorArray(pinsParam, debounceParam=0, gpioParam=gpio) as array:
+        results['LineSensorArray.read'] = timeCalls(array.read, iterationsParam)
+        results['LineSensorArray.getPosition'] = timeCalls(array.getPosition, iterationsParam)
+
+        clock = time.perf_counter_ns
+        received = []
+        array.addChangeCallback(lambda mask, changedBits: received.append(clock()))
+        level = [0]
+        def toggle():
+            level[0] ^= 1
+            startTime = clock()
+            gpio.setInput(pinsParam[0], level[0])
+            return received[-1] - startTime
+        results['edge to change callback'] = summarizeLatencies([toggle() for i in range(iterationsParam // 10)])
+    return results
+
+# Line following end to end on a SimulatedRobot: the cost of one LineFollower.step, the loop run in real time at rateParam for durationParam seconds
+# (with its overruns and timing), and how closely it follows an S shaped line over simulatedTimeParam seconds of simulated driving
+def benchmarkLineFollower(iterationsParam=20000, rateParam=500, durationParam=2.0, simulatedTimeParam=20.0):
+    linePins = [5, 6, 13, 19, 26]
+    def makeRobot():
+        backend = SimulatedBackend()
+        robot = SimulatedRobot(backend.gpio, backend.getPWM(), 18, 13, linePins)
+        controller = DrivingController(18, 13, backendParam=backend, settleTimeParam=0)
+        return robot, controller, LineSensorArray(linePins, backendParam=backend)
+
+    robot, controller, lineSensors = makeRobot()
+    follower = LineFollower(lineSensors, controller, rateParam)
+    results = {'LineFollower.step': timeCalls(follower.step, iterationsParam)}
+    tracemalloc.start()
+    startMemory = tracemalloc.get_traced_memory()[0]
+    for i in range(iterationsParam):
+        follower.step()
+    results['LineFollower.step']['bytesPerStep'] = (tracemalloc.get_traced_memory()[0] - startMemory) / iterationsParam
+    tracemalloc.stop()
+
+    robot.start()
+    follower.run(durationParam)
+    robot.close()
+    results['LineFollower.run ({0}Hz)'.format(rateParam)] = follower.getStats()
+
+    robot, controller, lineSensors = makeRobot()
+    follower = LineFollower(lineSensors, controller, rateParam)
+    lineErrors = []
+    for i in range(int(simulatedTimeParam * rateParam)):
+        robot.update(1.0 / rateParam)
+        follower.step()
+        lineErrors.append(abs(robot.getLineError()))
+    results['tracking'] = {'distance': robot.distance, 'meanLineError': sum(lineErrors) / len(lineErrors) * 1000, 'maxLineError': max(lineErrors) * 1000}
+    return results
+
+# Filtered distance readings: the cost of one HampelFilter update, and DistanceSensor.stream on a simulated HC-SR04 that sees something truthParam cm away,
+# with dropoutParam of the echoes never coming back and outlierParam of them bouncing off something else. Counts how many readings came out with each status,
+# and the mean error of the readings with a distance before and after the filter
+def benchmarkDistanceFiltering(iterationsParam=100000, readingsParam=40, truthParam=80.0, dropoutParam=0.1, outlierParam=0.1):
+    hampel = HampelFilter()
+    values = [truthParam + random.gauss(0, 1) for i in range(1000)]
+    position = [0]
+    def update():
+        position[0] = (position[0] + 1) % len(values)
+        return hampel.update(values[position[0]])
+    results = {'HampelFilter.update': timeCalls(update, iterationsParam)}
+
+    gpio = SimulatedGPIO()
+    def pulse():
+        chance = random.random()
+        if(chance < dropoutParam):
+            return None
+        if(chance < dropoutParam + outlierParam):
+            return (0.0005, random.uniform(5, 300) * 0.000058)
+        return (0.0005, random.gauss(truthParam, 1) * 0.000058)
+    gpio.scriptEcho(17, 27, pulse)
+    with DistanceSensor(17, 27, gpio) as sensor:
+        startTime = time.perf_counter()
+        readings = list(sensor.stream('cm', readingsParam))
+        elapsed = time.perf_counter() - startTime
+    statuses = {}
+    for reading in readings:
+        statuses[reading.status] = statuses.get(reading.status, 0) + 1
+    valid = [reading for reading in readings if reading.isValid]
+    results['DistanceSensor.stream'] = {
+        'rate': len(readings) / elapsed,
+        'statuses': statuses,
+        'rawError': sum(abs(reading.raw - truthParam) for reading in valid) / max(1, len(valid)),
+        'filteredError': sum(abs(reading.distance - truthParam) for reading in valid) / max(1, len(valid)),
+    }
+    return results
+
+# A ColorSensor on a fresh simulated TCS34725 has to power the sensor up itself, since sample() reads the data registers without the driver
+# (they read as zeros until it does). Returns (expected raw counts, raw counts) if the sample came out wrong, and None if it was right
+def checkColorSample():
+    backend = SimulatedBackend(virtualClockParam=True)
+    colorSensor = ColorSensor(backendParam=backend)
+    driver = colorSensor.sensor
+    expected = (driver.red, driver.green, driver.blue, driver.clear)
+    raw = colorSensor.sample().raw
+    return None if raw == expected else (expected, raw)
+
+# Scripted echoes on a VirtualClock, so the statuses come out the same on every run: steady readings, then a spike the HampelFilter has to flag as an outlier,
+# an echo that ends out of range (noEcho), and one that never starts (noResponse). Returns (reading number, expected status, status) for every reading that came out wrong
+def checkDistanceStatuses(truthParam=80.0):
+    script = [((0.0005, truthParam * 0.000058), STATUS_OK)] * 6 + [((0.0005, 300 * 0.000058), STATUS_OUTLIER), ((0.0005, 0.03), STATUS_NO_ECHO), (None, STATUS_NO_RESPONSE)]
+    gpio = SimulatedGPIO(clockParam=VirtualClock())
+    gpio.scriptEcho(17, 27, [pulse for pulse, status in script])
+    with DistanceSensor(17, 27, gpio) as sensor:
+        readings = list(sensor.stream('cm', len(script)))
+    statuses = [reading.status for reading in readings] + [None] * (len(script) - len(readings))
+    return [(index, expected, status) for index, ((pulse, expected), status) in enumerate(zip(script, statuses)) if status != expected]
+
+# Four HC-SR04s side by side on a simulated robot, each seeing something truthParam cm away. A sensor whose neighbor pinged less than crosstalkParam seconds
+# before it hears the neighbor's echo instead of its own. Compares pinging all four at once, one at a time, and DistanceArray's interleaved slots
+# (both of those waiting crosstalkParam between slots), by readings per second across all four and how many of the pings heard a neighbor
+def benchmarkDistanceArray(durationParam=2.0, truthParam=80.0, crosstalkParam=0.02):
+    pins = [(17, 27), (5, 6), (23, 24), (16, 20)]
+    results = {}
+    for name, conflicts, guardTime in [('all at once', [], 0), ('one at a time', [(i, j) for i in range(4) for j in range(i + 1, 4)], crosstalkParam),
+                                       ('DistanceArray (interleaved)', None, crosstalkParam)]:
+        gpio = SimulatedGPIO()
+        lastPings = [-1.0] * len(pins)
+        pings = [0, 0] # Pings, and pings that heard a neighbor
+        def makePulse(index):
+            def pulse():
+                now = time.monotonic()
+                lastPings[index] = now
+                pings[0] += 1
+                for neighbor in (index - 1, index + 1):
+                    if(0 <= neighbor < len(pins) and now - lastPings[neighbor] < crosstalkParam):
+                        pings[1] += 1
+                        return (0.0005, random.uniform(5, 40) * 0.000058) # The neighbor's echo
+                return (0.0005, random.gauss(truthParam, 1) * 0.000058)
+            return pulse
+        for index, (trigPin, echoPin) in enumerate(pins):
+            gpio.scriptEcho(trigPin, echoPin, makePulse(index))
+        sensors = [DistanceSensor(trigPin, echoPin, gpio) for trigPin, echoPin in pins]
+
+        array = DistanceArray(sensors, conflicts, guardTimeParam=guardTime, filterParam=False)
+        readings = []
+        array.subscribe(lambda sensorName, reading: readings.append(reading))
+        startTime = time.perf_counter()
+        array.run(durationParam)
+        elapsed = time.perf_counter() - startTime
+        for sensor in sensors:
+            sensor.close()
+        results[name] = {'slots': len(array.slots), 'rate': len(readings) / elapsed, 'crosstalk': pings[1] / max(1, pings[0])}
+    results['hardware limit'] = {'slots': 1, 'rate': len(pins) / MIN_PING_INTERVAL, 'crosstalk': 0.0}
+    return results
+
+# Logging to memory mapped ring files in a temporary folder: one record at a time (a wheel speed change), 64 accelerometer samples at once, and mapping a whole log back
+# Then a second of the robot's logging all at once (800Hz of acceleration in batches, plus line, color, distance, and wheel records) to show how much of a second it takes,
+# and the longest the flusher thread took to write everything out
+def benchmarkSampleLogger(iterationsParam=100000, capacityParam=65536):
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        with SampleLogger(directory, capacityParam, 0.1) as logger:
+            wheels = logger.getLog('wheels')
+            values = (50.0, -25.0)
+            results['SampleLog.append'] = timeCalls(lambda: wheels.append(values), iterationsParam)
+            acceleration = logger.getLog('acceleration')
+            timestamps = np.arange(64, dtype=np.int64)
+            samples = np.ones((64, 3))
+            results['SampleLog.appendBatch (64 samples)'] = timeCalls(lambda: acceleration.appendBatch(timestamps, samples), iterationsParam // 10)
+            wheels.flush()
+            with openLog(wheels.path) as log:
+                results['SampleLogReader.getChunks'] = timeCalls(log.getChunks, iterationsParam // 10)
+                results['SampleLogReader.getChunks']['records'] = sum(len(chunk) for chunk in log.getChunks())
+
+            # One second of everything the robot logs
+            line = logger.getLog('line')
+            color = logger.getLog('color')
+            distance = logger.getLog('distance')
+            def oneSecond():
+                for i in range(800 // 64 + 1):
+                    acceleration.appendBatch(timestamps, samples)
+                for i in range(500):
+                    line.append((1,))
+                for i in range(200):
+                    wheels.append(values)
+                for i in range(20):
+                    color.append((10, 20, 30))
+                    distance.append((80.0, 0))
+            results['one second of logging'] = timeCalls(oneSecond, 20, 1)
+            time.sleep(0.3) # Let the flusher go around a few times
+            results['one second of logging']['flushTimeMax'] = logger.flushTimeMax
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+# Replaying durationParam seconds of synthetic logs (color at 100Hz, line at 500Hz, acceleration at 800Hz, distance at 16Hz) through a ReplayBackend as fast as it goes:
+# a control loop reads every sensor rateParam times a second of replayed time (pinging the distance sensor as often as it allows) and picks wheel speeds from what it read.
+# Runs it twice to check the reruns come out exactly the same, and reports how many times faster than real time it went
+def benchmarkReplay(durationParam=10.0, rateParam=200):
+    directory = tempfile.mkdtemp()
+    try:
+        random = np.random.default_rng(0)
+        startTime = time.monotonic_ns()
+        def timestamps(rateParam):
+            return startTime + (np.arange(int(durationParam * rateParam)) * 1e9 / rateParam).astype(np.int64)
+        with SampleLogger(directory) as logger:
+            times = timestamps(100)
+            logger.getLog('color').appendBatch(times, random.integers(0, 256, (len(times), 3)))
+            times = timestamps(500)
+            logger.getLog('line').appendBatch(times, ((np.arange(len(times)) // 250) % 2)[:, None])
+            times = timestamps(800)
+            logger.getLog('acceleration').appendBatch(times, random.normal(0.0, 0.5, (len(times), 3)) + (0.0, 0.0, 9.80665))
+            times = timestamps(16)
+            statuses = np.zeros(len(times))
+            statuses[::12] = 2 # Now and then nothing in range
+            logger.getLog('distance').appendBatch(times, np.column_stack((100 + 80 * np.sin(np.arange(len(times)) / 10), statuses)))
+
+        def replay():
+            backend = ReplayBackend(directory)
+            clock = backend.clock
+            colorSensor = ColorSensor(backendParam=backend)
+            accelerometer = AccelerometerSensor(backendParam=backend)
+            distanceSensor = DistanceSensor(17, 27, backendParam=backend)
+            lineSensor = LineSensor(22, backendParam=backend)
+            commands = []
+            distance = None
+            nextPing = 0.0
+            while(not backend.replayer.isFinished()):
+                red, green, blue = colorSensor.getRGB()
+                x, y, z = accelerometer.getAcceleration()
+                if(clock.monotonic() >= nextPing):
+                    distance = distanceSensor.ping().distance
+                    nextPing = distanceSensor.lastPingTime + MIN_PING_INTERVAL
+                speed = 0 if distance is not None and distance < 30 else 50
+                steering = 20 if lineSensor.readLine() else -20
+                commands.append((speed - steering, speed + steering, red > blue, abs(x) > 1.0))
+                clock.sleep(1.0 / rateParam)
+            distanceSensor.close()
+            lineSensor.close()
+            return backend.replayer.getDuration(), commands
+
+        wallTime = time.perf_counter()
+        duration, commands = replay()
+        wallTime = time.perf_counter() - wallTime
+        rerunDuration, rerunCommands = replay()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'ReplayBackend (as fast as possible)': {'duration': duration, 'wallTime': wallTime, 'timesRealTime': duration / wallTime, 'ticks': len(commands),
+                                                     'identical': commands == rerunCommands}}
+
+# The asyncio API on a SimulatedBackend with i2c modeled at i2cFrequencyParam: the cost of one await read() of the color sensor (on the thread pool) and the line sensor (on the loop),
+# then streamsParam streams (color, accelerometer, and line sensor streams in turn) at rateParam each on one event loop for durationParam seconds,
+# with how late their samples were and how many deadlines they missed
+def benchmarkAsync(iterationsParam=2000, streamsParam=48, rateParam=20, durationParam=2.0, i2cFrequencyParam=400000):
+    backend = SimulatedBackend(i2cFrequencyParam)
+    colorSensor = Asynclib.wrap(ColorSensor(backendParam=backend))
+    colorSensor.sensor.integrationTime = 0 # Read the bus every time instead of reusing the last sample
+    accelerometer = Asynclib.wrap(AccelerometerSensor(backendParam=backend))
+    lineSensor = Asynclib.wrap(LineSensor(22, backendParam=backend))
+    results = {}
+
+    async def timeReads(sensorParam):
+        latencies = []
+        for i in range(iterationsParam):
+            startTime = time.perf_counter_ns()
+            await sensorParam.read()
+            latencies.append(time.perf_counter_ns() - startTime)
+        return summarizeLatencies(latencies)
+
+    async def runStreams():
+        sensors = [colorSensor, accelerometer, lineSensor]
+        streams = [sensors[i % 3].stream(rateParam, int(durationParam * rateParam)) for i in range(streamsParam)]
+        async def consume(streamParam):
+            async for sample in streamParam:
+                pass
+        startTime = time.perf_counter()
+        await asyncio.gather(*[consume(stream) for stream in streams])
+        return streams, time.perf_counter() - startTime
+
+    async def main():
+        results['await AsyncColorSensor.read (pool)'] = await timeReads(colorSensor)
+        results['await AsyncLineSensor.read (loop)'] = await timeReads(lineSensor)
+        streams, wallTime = await runStreams()
+        for index, name in enumerate(['color', 'accelerometer', 'line']):
+            stats = [stream.getStats() for stream in streams[index::3]]
+            latencies = LatencyHistogram()
+            for stream in streams[index::3]:
+                latencies.merge(stream.latencies)
+            p50, p99 = latencies.getPercentiles([50, 99])
+            results['{0} {1} streams at {2}Hz'.format(len(stats), name, rateParam)] = {
+                'samplesPerSecond': sum(stat['samples'] for stat in stats) / wallTime,
+                'missedDeadlines': sum(stat['missedDeadlines'] for stat in stats),
+                'p50Latency': p50 / 1000,
+                'p99Latency': p99 / 1000,
+            }
+    asyncio.run(main())
+    lineSensor.sensor.close()
+    return results
+
+# Reading the accelerometer rateParam times a second while the main thread is busy with pure Python work (like drawing the display), for durationParam seconds:
+# on a thread in this process writing to a SharedRing, against a Workerlib.SensorWorker in its own process writing to one in shared memory.
+# Latency is from a sample's timestamp to the main thread reading it, and work is how many chunks of the main thread's work got done
+def benchmarkWorkers(durationParam=2.0, rateParam=500):
+    def mainLoop(ringParam):
+        latencies = []
+        work = 0
+        endTime = time.monotonic() + durationParam
+        while(time.monotonic() < endTime):
+            sum(i * i for i in range(5000)) # About a millisecond of work that holds the GIL
+            work += 1
+            now = time.monotonic_ns()
+            for chunk in ringParam.readNew():
+                latencies.extend((now - chunk['timestamp']).tolist())
+        latencies.sort()
+        return {'samplesPerSecond': len(latencies) / durationParam, 'p50Latency': latencies[len(latencies) // 2] / 1000, 'p99Latency': latencies[int(len(latencies) * 0.99)] / 1000,
+                'work': work}
+
+    results = {}
+    setBackend(SimulatedBackend())
+    ring = Workerlib.SharedRing(RECORD_FIELDS['acceleration'])
+    stopEvent = threading.Event()
+    thread = threading.Thread(target=Workerlib._workerMain, args=(AccelerometerSensor, (), {}, ring.name, 'acceleration', rateParam, None, None, stopEvent), daemon=True)
+    thread.start()
+    while(ring.getLatest() is None):
+        time.sleep(0.001)
+    ring.readNew()
+    results['thread in this process'] = mainLoop(ring)
+    stopEvent.set()
+    thread.join()
+    ring.close()
+
+    with Workerlib.SensorWorker(AccelerometerSensor, rateParam=rateParam, setupParam=Workerlib.useSimulator) as worker:
+        worker.waitForSamples()
+        worker.readNew()
+        results['SensorWorker process'] = mainLoop(worker.ring)
+    return results
+
+# How much faster than real time AccelerometerProcessor keeps up with a synthetic 800Hz stream, in batches of batchSizeParam samples
+def benchmarkAccelerometerProcessing(iterationsParam=5000, batchSizeParam=64, sampleRateParam=800):
+    # 10 seconds of gravity plus noise and a 60Hz vibration, cycled through in batches
+    t = np.arange(10 * sampleRateParam) / sampleRateParam
+    samples = np.random.normal(0.0, 0.05, (len(t), 3))
+    samples[:, 0] += 0.5 * np.sin(2 * np.pi * 60 * t)
+    samples[:, 2] += 9.80665
+    batches = [samples[start:start + batchSizeParam] for start in range(0, len(samples) - batchSizeParam + 1, batchSizeParam)]
+
+    processor = AccelerometerProcessor(sampleRateParam)
+    position = [0]
+    def processBatch():
+        processor.process(batches[position[0]])
+        position[0] = (position[0] + 1) % len(batches)
+
+    result = timeCalls(processBatch, iterationsParam, 100)
+    result['timesRealTime'] = result['opsPerSecond'] * batchSizeParam / sampleRateParam
+    return {'AccelerometerProcessor.process ({0} samples)'.format(batchSizeParam): result}
+# Cost of updating one line of a status display when the whole screen is sent vs. only what changed
+def benchmarkOLEDRefresh(iterationsParam=2000):
+    results = {}
+    for name, full in [('OLED.showDisplay (full refresh)', True), ('OLED.showDisplay (partial refresh)', False)]:
+        i2c = SimulatedI2C()
+        oled = OLED(i2c, displayParam=SimulatedSSD1306(128, 64, i2c))
+        for line in [oled.line1, oled.line2, oled.line3, oled.line4, oled.line5, oled.line6]:
+            oled.drawText('Status line {0}'.format(line), oled.col1, line)
+        oled.showDisplay()
+
+        count = [0]
+        def updateLine():
+            count[0] += 1
+            oled.clearArea((0, oled.line3, oled.width, oled.line3 + 9))
+            oled.drawText('Count: {0}'.format(count[0]), oled.col1, oled.line3)
+            oled.showDisplay(full)
+
+        startBytes = i2c.bytesWritten
+        result = timeCalls(updateLine, iterationsParam, 0)
+        result['bytesPerUpdate'] = (i2c.bytesWritten - startBytes) / iterationsParam
+        results[name] = result
+    return results
+# Redrawing a full screen of text (all six lines) with the glyph cache vs. rendering it with PIL's ImageDraw.text
+def benchmarkOLEDText(iterationsParam=5000):
+    i2c = SimulatedI2C()
+    oled = OLED(i2c, displayParam=SimulatedSSD1306(128, 64, i2c))
+    texts = ['Line {0}: status 12.34'.format(line) for line in range(1, 7)]
+
+    def drawWithGlyphCache():
+        for line in range(6):
+            oled.drawLine(line + 1, texts[line])
+
+    image = Image.new('1', (oled.width, oled.height))
+    draw = ImageDraw.Draw(image)
+    def drawWithPIL():
+        draw.rectangle((0, 0, oled.width - 1, oled.height - 1), fill=0)
+        for line in range(6):
+            draw.text((oled.col1, oled.lines[line]), texts[line], font=oled.font, fill=255)
+
+    return {
+        'OLED.drawLine x6 (glyph cache)': timeCalls(drawWithGlyphCache, iterationsParam),
+        'ImageDraw.text x6 (PIL)': timeCalls(drawWithPIL, iterationsParam),
+    }
+
+
+
+
+
+
+
+# How long the main loop waits to update a line of the display when it sends the update itself vs. hands it to the background thread
+# transferLatencyParam models how long the i2c transfer of each update takes on the real board
+def benchmarkOLEDBackground(iterationsParam=500, transferLatencyParam=0.002):
+    i2c = SimulatedI2C()
+    oled = OLED(i2c, displayParam=SimulatedSSD1306(128, 64, i2c))
+    sendWindow = oled._sendWindow
+    def slowSendWindow(*args):
+        time.sleep(transferLatencyParam)
+        sendWindow(*args)
+    oled._sendWindow = slowSendWindow
+
+    count = [0]
+    def drawAndShow():
+        count[0] += 1
+        oled.drawLine(3, 'Count: {0}'.format(count[0]))
+        oled.showDisplay()
+    def submitDraw():
+        count[0] += 1
+        oled.submitDraw(lambda display, text='Count: {0}'.format(count[0]): display.drawLine(3, text))
+
+    results = {'OLED.showDisplay (blocking)': timeCalls(drawAndShow, iterationsParam, 10)}
+    oled.startBackgroundUpdates(0)
+    results['OLED.submitDraw (background)'] = timeCalls(submitDraw, iterationsParam * 20, 10)
+    oled.stopBackgroundUpdates()
+    results['OLED.submitDraw (background)'].update(oled.getDisplayStats())
+    return results
+# Cost of updating both wheels and how far apart the two wheels' duty cycles change, when each servo is set on its own vs. both in one setWheelSpeeds
+# writeLatencyParam models how long each PWM channel write takes on the real board
+def benchmarkPWMUpdates(iterationsParam=20000, writeLatencyParam=0.00002):
+    pwm = SimulatedPWMBackend(writeLatencyParam, 2 * (iterationsParam + 100)) # Long enough to keep every write of a run, warmup included
+    controller = DrivingController(18, 19, pwmParam=pwm)
+    speeds = [20, 60, 100, -40]
+    count = [0]
+
+    def separateUpdates():
+        count[0] += 1
+        speed = speeds[count[0] % len(speeds)]
+        controller.cwServo.cw(speed)
+        controller.ccwServo.ccw(speed)
+    def batchedUpdate():
+        count[0] += 1
+        controller.forward(speeds[count[0] % len(speeds)])
+
+    results = {}
+    for name, update in [('ServoController.cw + ccw (separate)', separateUpdates), ('DrivingController.forward (batched)', batchedUpdate)]:
+        pwm.clearHistory()
+        result = timeCalls(update, iterationsParam, 100)
+        # Every update adds one entry for each wheel, in order; the skew is how long the second wheel was left on its old duty cycle
+        history = list(pwm.history)
+        skews = sorted(history[i + 1][0] - history[i][0] for i in range(len(history) - 2 * iterationsParam, len(history), 2))
+        result['meanSkew'] = sum(skews) / len(skews)
+        result['maxSkew'] = skews[-1]
+        results[name] = result
+    controller.close()
+    return results
+# Every sensor and the display on a SimulatedBackend, with i2c transactions modeled at i2cFrequencyParam on a virtual clock
+# busTime is the modeled i2c time per call, which comes out the same on every computer, so it's the number to watch for regressions
+def benchmarkSensorStack(iterationsParam=2000, i2cFrequencyParam=100000):
+    backend = SimulatedBackend(i2cFrequencyParam, True)
+    colorSensor = ColorSensor(backendParam=backend)
+    accelerometer = AccelerometerSensor(backendParam=backend)
+    lineSensor = LineSensor(22, backendParam=backend)
+    oled = OLED(backendParam=backend)
+    oled.drawLine(1, 'Status display')
+    oled.showDisplay()
+
+    count = [0]
+    def updateLine():
+        count[0] += 1
+        oled.drawLine(3, 'Count: {0}'.format(count[0]))
+        oled.showDisplay()
+    def readFifo():
+        backend.clock.advance(0.01) # Read every 10ms (plus however long the last read kept the bus busy)
+        accelerometer.readFifo()
+
+    calls = [
+        ('LineSensor.readLine', lineSensor.readLine, None),
+        ('ColorSensor.getRGB', colorSensor.getRGB, None),
+        ('AccelerometerSensor.getAcceleration', accelerometer.getAcceleration, None),
+        ('AccelerometerSensor.readFifo (every 10ms)', readFifo, accelerometer.startStreaming),
+        ('OLED line update', updateLine, None),
+    ]
+    results = {}
+    for name, call, setup in calls:
+        if(setup is not None):
+            setup()
+        startBusTime = backend.i2c.busTime
+        result = timeCalls(call, iterationsParam, 0)
+        result['busTime'] = (backend.i2c.busTime - startBusTime) / iterationsParam * 1e9
+        results[name] = result
+    accelerometer.stopStreaming()
+    lineSensor.close()
+    return results
+# The suite: every library class on a SimulatedBackend, with i2c transactions modeled at i2cFrequencyParam on a virtual clock and each PWM write
+# taking pwmLatencyParam seconds. Every result has timeCalls' timing, the modeled i2c transactions and bus time (in nanoseconds) per call, and measureAllocations' memory
+# Each call is timed repeatsParam times and the fastest run is kept, which takes out most of the noise from whatever else the computer was doing
+def benchmarkLibraries(iterationsParam=2000, allocationIterationsParam=500, i2cFrequencyParam=100000, pwmLatencyParam=0.00002, repeatsParam=3):
+    backend = SimulatedBackend(i2cFrequencyParam, True, pwmLatencyParam=pwmLatencyParam)
+    clock = backend.clock
+    backend.gpio.scriptEcho(17, 27, lambda: (0.0005, 50 * 0.000058)) # Something 50cm away
+    backend.gpio.setInput(6, 1)
+    colorSensor = ColorSensor(backendParam=backend)
+    accelerometer = AccelerometerSensor(backendParam=backend)
+    distanceSensor = DistanceSensor(17, 27, backendParam=backend)
+    lineSensor = LineSensor(22, backendParam=backend)
+    lineSensors = LineSensorArray([5, 6, 13, 19, 26], backendParam=backend)
+    oled = OLED(backendParam=backend)
+    oled.drawLine(1, 'Status display')
+    oled.showDisplay()
+    servo = ServoController(12, backendParam=backend)
+    controller = DrivingController(18, 13, backendParam=backend, settleTimeParam=0)
+
+    count = [0]
+    def nextCount():
+        count[0] += 1
+        return count[0]
+    def newColorSample():
+        clock.advance(colorSensor.integrationTime / 1000) # Wait out the integration time so there's a new reading
+        return colorSensor.sample()
+    def switchColorProfile():
+        colorSensor.applyProfile('fast' if nextCount() % 2 else 'precise')
+    def switchAccelerometerProfile():
+        accelerometer.applyProfile('highRate' if nextCount() % 2 else 'lowPower')
+    def readFifo():
+        clock.advance(0.01) # Read every 10ms
+        accelerometer.readFifo()
+    def updateLine():
+        oled.drawLine(3, 'Count: {0}'.format(nextCount()))
+        oled.showDisplay()
+    def moveServo():
+        servo.cw(nextCount() % 100)
+    def drive():
+        controller.forward(nextCount() % 100)
+
+    # (name, call, setup, cleanup)
+    calls = [
+        ('ColorSensor.getRGB (cached sample)', colorSensor.getRGB, None, None),
+        ('ColorSensor.sample (new reading)', newColorSample, None, None),
+        ('ColorSensor.applyProfile (switch)', switchColorProfile, None, None),
+        ('AccelerometerSensor.getAcceleration', accelerometer.getAcceleration, None, None),
+        ('AccelerometerSensor.applyProfile (switch)', switchAccelerometerProfile, None, None),
+        ('AccelerometerSensor.readFifo (every 10ms)', readFifo, accelerometer.startStreaming, accelerometer.stopStreaming),
+        ('DistanceSensor.distance', distanceSensor.distance, None, None),
+        ('LineSensor.readLine', lineSensor.readLine, None, None),
+        ('LineSensorArray.getPosition', lineSensors.getPosition, None, None),
+        ('OLED line update', updateLine, None, None),
+        ('OLED full refresh', lambda: oled.showDisplay(True), None, None),
+        ('ServoController.cw', moveServo, None, None),
+        ('DrivingController.forward', drive, None, None),
+    ]
+    results = {}
+    for name, call, setup, cleanup in calls:
+        if(setup is not None):
+            setup()
+        for i in range(10): # Warmed up here, so the warmup's i2c traffic doesn't get counted
+            call()
+        startTransactions = backend.i2c.transactions
+        startBusTime = backend.i2c.busTime
+        result = max((timeCalls(call, iterationsParam, 0) for repeat in range(repeatsParam)), key=lambda run: run['opsPerSecond'])
+        result['transactions'] = (backend.i2c.transactions - startTransactions) / (iterationsParam * repeatsParam)
+        result['busTime'] = (backend.i2c.busTime - startBusTime) / (iterationsParam * repeatsParam) * 1e9
+        result.update(measureAllocations(call, allocationIterationsParam))
+        if(cleanup is not None):
+            cleanup()
+        results[name] = result
+
+    controller.close()
+    servo.close()
+    distanceSensor.close()
+    lineSensor.close()
+    lineSensors.close()
+    return results
+
+# Reading RGB, color temperature, and lux through the driver's properties (a full set of channel reads for each) vs. one ColorSensor.sample()
+# The sensor is read continuously, as fast as it can be, with the simulated time moving ahead pollIntervalParam seconds between reads
+def benchmarkColorSampling(iterationsParam=5000, i2cFrequencyParam=100000, pollIntervalParam=0.01):
+    backend = SimulatedBackend(i2cFrequencyParam, True)
+    colorSensor = ColorSensor(backendParam=backend)
+    colorSensor.setIntegrationTime(50)
+    driver = colorSensor.sensor
+
+    def readProperties():
+        backend.clock.advance(pollIntervalParam)
+        return driver.color_rgb_bytes, driver.color_temperature, driver.lux
+    def readSample():
+        backend.clock.advance(pollIntervalParam)
+        sample = colorSensor.sample()
+        return sample.rgb, sample.temperature, sample.lux
+
+    results = {}
+    for name, call in [('driver properties (RGB, temperature, lux)', readProperties), ('ColorSensor.sample', readSample)]:
+        startTransactions = backend.i2c.transactions
+        startBusTime = backend.i2c.busTime
+        result = timeCalls(call, iterationsParam, 0)
+        result['transactions'] = (backend.i2c.transactions - startTransactions) / iterationsParam
+        result['busTime'] = (backend.i2c.busTime - startBusTime) / iterationsParam * 1e9
+        results[name] = result
+    return results
+
+# Retuning sensors the way adaptive code does, on a SimulatedBackend with i2c modeled at i2cFrequencyParam on a virtual clock: asking for the settings they already have
+# (through the driver's properties, which always write, vs. the shadowed setters, which skip it), and switching the accelerometer between its highRate and lowPower
+# profiles one setting at a time through the driver vs. with one applyProfile
+def benchmarkShadowRegisters(iterationsParam=5000, i2cFrequencyParam=100000):
+    backend = SimulatedBackend(i2cFrequencyParam, virtualClockParam=True)
+    accelerometer = AccelerometerSensor(backendParam=backend)
+    colorSensor = ColorSensor(backendParam=backend)
+    accelerometerDriver = accelerometer.sensor
+    colorDriver = colorSensor.sensor
+    profiles = [ACCELEROMETER_PROFILES['highRate'], ACCELEROMETER_PROFILES['lowPower']]
+    position = [0]
+
+    def setSameDriver():
+        accelerometerDriver.data_rate = MMA8451_DATARATE_CODES[800]
+        colorDriver.integration_time = 50
+        colorDriver.gain = TCS34725_GAIN_CODES[4]
+    def setSameShadowed():
+        accelerometer.setDataRate(800)
+        colorSensor.setIntegrationTime(50)
+        colorSensor.setSensorGain(4)
+    def switchDriver():
+        position[0] ^= 1
+        accelerometerDriver.range = MMA8451_RANGE_CODES[profiles[position[0]]['accelerationRange']]
+        accelerometerDriver.data_rate = MMA8451_DATARATE_CODES[profiles[position[0]]['dataRate']]
+    def switchProfile():
+        position[0] ^= 1
+        accelerometer.applyProfile(profiles[position[0]])
+
+    results = {}
+    for name, call in [('same settings, driver properties', setSameDriver), ('same settings, shadowed setters', setSameShadowed),
+                       ('profile switch, driver properties', switchDriver), ('profile switch, applyProfile', switchProfile)]:
+        accelerometer.shadow.invalidate() # The driver property runs change registers behind the shadows' backs
+        colorSensor.shadow.invalidate()
+        startTransactions = backend.i2c.transactions
+        startBusTime = backend.i2c.busTime
+        result = timeCalls(call, iterationsParam, 0)
+        result['transactions'] = (backend.i2c.transactions - startTransactions) / iterationsParam
+        result['busTime'] = (backend.i2c.busTime - startBusTime) / iterationsParam * 1e9
+        results[name] = result
+    return results
+
+# What Metricslib's timers add to a call: LineSensor.readLine and AccelerometerSensor.getAcceleration with metrics off, on, and off again
+# Both are about as cheap as calls into the libraries get, so the difference is nearly all timer. overhead is the extra mean time per call in nanoseconds
+def benchmarkMetrics(iterationsParam=200000):
+    backend = SimulatedBackend(virtualClockParam=True)
+    lineSensor = LineSensor(22, backendParam=backend)
+    accelerometer = AccelerometerSensor(backendParam=backend)
+
+    results = {}
+    for name, sensor, operation in [('LineSensor.readLine', lineSensor, 'readLine'), ('AccelerometerSensor.getAcceleration', accelerometer, 'getAcceleration')]:
+        baseline = timeCalls(getattr(sensor, operation), iterationsParam)
+        Metricslib.enable()
+        timed = timeCalls(getattr(sensor, operation), iterationsParam)
+        Metricslib.disable()
+        again = timeCalls(getattr(sensor, operation), iterationsParam)
+        timed['overhead'] = timed['mean'] - min(baseline['mean'], again['mean'])
+        timed['recorded'] = Metricslib.getSnapshot()[Metricslib.getDeviceName(sensor)][operation]['count']
+        results[name + ', metrics off'] = baseline
+        results[name + ', metrics on'] = timed
+    Metricslib.reset()
+    return results
+
+# Classifying color readings: one at a time with ColorClassifier.classify, and as batches of batchSizeParam with classifyBatch (each batch counts as one op),
+# against the exact nearest-centroid search the lookup table replaces. The classifier is calibrated on noisy readings around classesParam colors
+def benchmarkColorClassification(iterationsParam=20, batchSizeParam=1000000, classesParam=6):
+    rng = np.random.default_rng(0)
+    classifier = ColorClassifier()
+    for index, color in enumerate(rng.integers(0, 256, (classesParam, 3))):
+        for reading in np.clip(color + rng.normal(0, 6, (20, 3)), 0, 255).astype(np.uint8):
+            classifier.addReference('color{0}'.format(index), reading)
+    classifier.compile()
+    batch = rng.integers(0, 256, (batchSizeParam, 3), dtype=np.uint8)
+    readings = [tuple(int(value) for value in reading) for reading in batch[:1000]]
+
+    position = [0]
+    def classifyOne():
+        position[0] = (position[0] + 1) % len(readings)
+        return classifier.classify(readings[position[0]])
+
+    results = {}
+    results['ColorClassifier.classify'] = timeCalls(classifyOne, iterationsParam * 5000, 1000)
+    results['ColorClassifier.classifyBatch'] = timeCalls(lambda: classifier.classifyBatch(batch), iterationsParam, 2)
+    results['nearest centroid (no table)'] = timeCalls(lambda: classifier.classifyNearest(batch), max(1, iterationsParam // 10), 1)
+    for name in ['ColorClassifier.classifyBatch', 'nearest centroid (no table)']:
+        results[name]['samplesPerSecond'] = results[name]['opsPerSecond'] * batchSizeParam
+    results['ColorClassifier.classifyBatch']['matchesNearest'] = float(np.mean(classifier.classifyBatch(batch) == classifier.classifyNearest(batch)))
+    return results
+
+# Cold start: how long a fresh Python process takes to import each library as part of the libraries package, and to get the whole robot set up on the simulator
+# (with the accelerometer taking startupDelayParam seconds to start answering, like the real one). Every run is a new process so nothing is imported already
+# Returns name -> {'median': seconds, 'min': seconds} over runsParam runs
+def benchmarkStartup(runsParam=5, startupDelayParam=0.05):
+    packageFolder = os.path.dirname(os.path.abspath(__file__))
+    cases = [('import libraries', 'import libraries')]
+    for module in ['Backendlib', 'ColorSensorlib', 'AccelerometerSensorlib', 'DistanceSensorlib', 'LineSensorlib', 'OLEDlib', 'Servolib', 'MotionProfilelib']:
+        cases.append(('import libraries.' + module, 'import libraries.' + module))
+    cases.append(('robot setup (simulated)', '\n'.join([
+        'from libraries import Backendlib',
+        'Backendlib.setBackend(Backendlib.SimulatedBackend(startupDelayParam={0}))'.format(startupDelayParam),
+        'from libraries import ColorSensor, AccelerometerSensor, DistanceSensor, LineSensor, OLED, DrivingController',
+        'sensors = [ColorSensor(), AccelerometerSensor(), DistanceSensor(17, 27), LineSensor(22), OLED(), DrivingController(18, 13)]',
+    ])))
+
+    results = {}
+    for name, code in cases:
+        script = 'import time\nstartTime = time.perf_counter()\n{0}\nprint(time.perf_counter() - startTime)'.format(code)
+        times = []
+        for run in range(runsParam):
+            output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(packageFolder), capture_output=True, text=True, check=True).stdout
+            times.append(float(output.split()[-1]))
+        times.sort()
+        results[name] = {'median': times[len(times) // 2], 'min': times[0]}
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks the libraries on simulated hardware')
+    parser.add_argument('--suite', action='store_true', help='only run the suite of every library class (benchmarkLibraries)')
+    parser.add_argument('--iterations', type=int, default=2000, help='calls timed for each of the suite\'s results')
+    parser.add_argument('--output', help='save the suite\'s results to this JSON file')
+    parser.add_argument('--repeats', type=int, default=3, help='times each of the suite\'s calls is timed, keeping the fastest')
+    parser.add_argument('--compare', help='compare the suite\'s results to ones saved in this JSON file, and exit with 1 if their i2c traffic or memory got worse')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='multiplies REGRESSION_THRESHOLDS, for noisier computers')
+    parser.add_argument('--gate-timing', action='store_true', help='fail the comparison on slower times too, instead of only reporting them')
+    arguments = parser.parse_args()
+
+    suiteResults = benchmarkLibraries(arguments.iterations, repeatsParam=arguments.repeats)
+    for name, result in suiteResults.items():
+        printResult(name, result)
+        print('    {0:0.2f} i2c transactions, {1:0.1f}us modeled i2c time, {2:0.0f} bytes peak and {3:0.1f} bytes kept per call'.format(result['transactions'], result['busTime'] / 1000,
+              result['peakBytes'], result['retainedBytes']))
+    if(arguments.output is not None):
+        saveResults(suiteResults, arguments.output)
+    regressions = []
+    if(arguments.compare is not None):
+        regressions = compareResults(loadResults(arguments.compare), suiteResults, arguments.tolerance, arguments.gate_timing)
+        for name, metric, saved, value, change, isFailure in regressions:
+            print('{0:<10} {1:<40} {2:<14} {3:>12.1f} -> {4:>12.1f} ({5:+0.0%})'.format('REGRESSION' if isFailure else 'slower', name, metric, saved, value, change))
+        regressions = [regression for regression in regressions if regression[5]]
+        print('{0} regressions against {1}'.format(len(regressions), arguments.compare))
+    failures = checkDistanceStatuses()
+    for index, expected, status in failures:
+        print('{0:<10} {1:<40} expected {2}, got {3}'.format('FAILED', 'DistanceSensor reading {0}'.format(index), expected, status))
+    colorFailure = checkColorSample()
+    if(colorFailure is not None):
+        failures.append(colorFailure)
+        print('{0:<10} {1:<40} expected {2}, got {3}'.format('FAILED', 'ColorSensor.sample raw counts', *colorFailure))
+
+    if(not arguments.suite):
+        for name, result in benchmarkStartup().items():
+            print('{0:<40} {1:>9.1f}ms median   {2:>9.1f}ms best'.format(name, result['median'] * 1000, result['min'] * 1000))
+
+        for name, result in benchmarkGPIOSession().items():
+            printResult(name, result)
+
+        for name, result in benchmarkLineSensorArray().items():
+            printResult(name, result)
+
+        results = benchmarkLineFollower()
+        printResult('LineFollower.step', results['LineFollower.step'])
+        print('    {0:0.1f} bytes kept per step'.format(results['LineFollower.step']['bytesPerStep']))
+        for name in results:
+            if(name.startswith('LineFollower.run')):
+                stats = results[name]
+                print('{0:<40} {1} ticks, {2} overruns, loop {3:0.1f}us mean {4:0.1f}us max, jitter {5:0.1f}us mean {6:0.1f}us max'.format(name, stats['iterations'], stats['overruns'],
+                      stats['meanLoopTime'], stats['maxLoopTime'], stats['meanJitter'], stats['maxJitter']))
+        print('{0:<40} {1:0.2f}m driven, {2:0.1f}mm mean and {3:0.1f}mm max from the line'.format('line following (simulated)', results['tracking']['distance'],
+              results['tracking']['meanLineError'], results['tracking']['maxLineError']))
+
+        results = benchmarkDistanceFiltering()
+        printResult('HampelFilter.update', results['HampelFilter.update'])
+        stream = results['DistanceSensor.stream']
+        print('{0:<40} {1:0.1f} readings/s, {2}, mean error {3:0.1f}cm raw vs {4:0.1f}cm filtered'.format('DistanceSensor.stream', stream['rate'],
+              ', '.join('{0} {1}'.format(count, status) for status, count in sorted(stream['statuses'].items())), stream['rawError'], stream['filteredError']))
+
+        for name, result in benchmarkDistanceArray().items():
+            print('{0:<40} {1:>6.1f} readings/s in {2} slot(s), {3:0.0%} crosstalk'.format(name, result['rate'], result['slots'], result['crosstalk']))
+
+        for name, result in benchmarkSampleLogger().items():
+            printResult(name, result)
+            if('records' in result):
+                print('    {0} records mapped without copying'.format(result['records']))
+            if('flushTimeMax' in result):
+                print('    {0:0.2%} of each second spent logging, longest flush {1:0.2f}ms (on the flusher thread)'.format(result['mean'] / 1e9, result['flushTimeMax'] * 1000))
+
+        for name, result in benchmarkReplay().items():
+            print('{0:<40} {1:0.1f}s of logs in {2:0.2f}s ({3:0.0f}x real time), {4} ticks, reruns {5}'.format(name, result['duration'], result['wallTime'], result['timesRealTime'],
+                  result['ticks'], 'identical' if result['identical'] else 'DIFFERENT'))
+
+        for name, result in benchmarkAsync().items():
+            if('opsPerSecond' in result):
+                printResult(name, result)
+            else:
+                print('{0:<40} {1:>8.0f} samples/s, {2} missed, latency p50 {3:0.0f}us p99 {4:0.0f}us'.format(name, result['samplesPerSecond'], result['missedDeadlines'],
+                      result['p50Latency'], result['p99Latency']))
+
+        for name, result in benchmarkWorkers().items():
+            print('{0:<40} {1:>8.0f} samples/s, latency p50 {2:0.0f}us p99 {3:0.0f}us, {4} chunks of main thread work'.format(name, result['samplesPerSecond'],
+                  result['p50Latency'], result['p99Latency'], result['work']))
+
+        for name, result in benchmarkAccelerometerProcessing().items():
+            printResult(name, result)
+            print('    {0:0.0f}x faster than real time'.format(result['timesRealTime']))
+
+        for name, result in benchmarkPWMUpdates().items():
+            printResult(name, result)
+            print('    wheels changed {0:0.2f}us apart on average, {1:0.2f}us at most'.format(result['meanSkew'] / 1000, result['maxSkew'] / 1000))
+
+        for name, result in benchmarkColorSampling().items():
+            printResult(name, result)
+            print('    {0:0.2f} i2c transactions and {1:0.1f}us of modeled i2c time per call'.format(result['transactions'], result['busTime'] / 1000))
+
+        for name, result in benchmarkShadowRegisters().items():
+            printResult(name, result)
+            print('    {0:0.2f} i2c transactions and {1:0.1f}us of modeled i2c time per call'.format(result['transactions'], result['busTime'] / 1000))
+
+        for name, result in benchmarkMetrics().items():
+            printResult(name, result)
+            if('overhead' in result):
+                print('    {0:0.0f}ns of timing per call, {1} calls recorded'.format(result['overhead'], result['recorded']))
+
+        for name, result in benchmarkColorClassification().items():
+            printResult(name, result)
+            if('samplesPerSecond' in result):
+                print('    {0:0.1f} million samples/s'.format(result['samplesPerSecond'] / 1e6))
+            if('matchesNearest' in result):
+                print('    {0:0.4%} the same as the exact nearest centroid'.format(result['matchesNearest']))
+
+        for name, result in benchmarkSensorStack().items():
+            printResult(name, result)
+            print('    {0:0.1f}us of modeled i2c time per call'.format(result['busTime'] / 1000))
+
+        for name, result in benchmarkOLEDRefresh().items():
+            printResult(name, result)
+            print('    {0:0.1f} bytes sent per update'.format(result['bytesPerUpdate']))
+
+        for name, result in benchmarkOLEDText().items():
+            printResult(name, result)
+
+        for name, result in benchmarkOLEDBackground().items():
+            printResult(name, result)
+            if('framesSent' in result):
+                print('    {0} draws sent in {1} updates, {2:0.2f}ms mean transfer'.format(result['drawsSubmitted'], result['framesSent'], result['meanTransferTime']))
+
+    sys.exit(1 if regressions or failures else 0)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Library to help sort things by color with ColorSensor: calibrate with reference samples of each color, then classify readings (one at a time or whole batches) with a precomputed lookup table. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import numpy as np
+
+# Special values in the lookup table, besides class numbers
+AMBIGUOUS = 254 # Too close to call between two classes at the table's resolution, so it's worked out exactly instead
+UNKNOWN = 255 # Not close enough to any class
+
+# sRGB (D65) to CIE XYZ, and the D65 white point
+SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+# Converts RGB bytes (an (r, g, b) or an array with one row per color) to CIELAB, where distances match how different colors look
+def rgbToLab(rgbParam):
+    rgb = np.asarray(rgbParam, dtype=np.float64) / 255
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ SRGB_TO_XYZ.T / D65_WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+class ColorClassifier:
+    """Classifies RGB readings by the nearest class centroid in CIELAB. compile() works that out ahead of time for every cell of a quantized RGB cube,
+    so classifying is just a table lookup (with an exact nearest-centroid check only for cells right on the border between two classes)"""
+
+    # bitsParam is how many bits of each channel the lookup table uses (5 makes a 32x32x32 table)
+    def __init__(self, bitsParam=5):
+        self.bits = bitsParam
+        self.shift = 8 - bitsParam
+        self.references = {} # class name -> list of RGB readings
+        self.classes = [] # Class names, in class number order (set by compile)
+        self.centroids = None # CIELAB centroid of each class
+        self.maxDistance = None
+        self.lut = None # bits x bits x bits table of class numbers
+        self.table = None # The same table as bytes, for fast lookups of one reading
+
+    # Adds a reference reading (RGB bytes) for a class
+    def addReference(self, nameParam, rgbParam):
+        self.references.setdefault(nameParam, []).append(tuple(rgbParam))
+
+    # Records samplesParam readings from a ColorSensor as references for a class. Put something of that color in front of the sensor first
+    def calibrate(self, colorSensorParam, nameParam, samplesParam=20):
+        for i in range(samplesParam):
+            self.addReference(nameParam, colorSensorParam.sample().rgb)
+            colorSensorParam.clock.sleep(colorSensorParam.integrationTime / 1000) # Wait for the next reading
+        return len(self.references[nameParam])
+
+    # Builds the lookup table from the references. Call it again after adding references
+    # maxDistanceParam is how far (in CIELAB units, where about 2.3 is just noticeable) a reading can be from its nearest class before it's UNKNOWN (None to always pick a class)
+    # Borders between classes narrower than ambiguityParam (in CIELAB units) get checked exactly instead of going by the table
+    # Will return None if there aren't any references yet
+    def compile(self, maxDistanceParam=None, ambiguityParam=2.0):
+        if(len(self.references) == 0):
+            return None
+        self.classes = sorted(self.references)
+        self.centroids = np.array([rgbToLab(self.references[name]).mean(axis=0) for name in self.classes])
+        self.maxDistance = maxDistanceParam
+
+        # The color at the center of every cell in the table
+        size = 1 << self.bits
+        centers = (np.arange(size) << self.shift) + (1 << self.shift) // 2
+        grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+        distances = np.sqrt(((rgbToLab(grid)[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2))
+
+        order = np.argsort(distances, axis=1)
+        lut = order[:, 0].astype(np.uint8)
+        nearest = np.take_along_axis(distances, order[:, :1], axis=1)[:, 0]
+        if(len(self.classes) > 1):
+            # A cell spans a few CIELAB units itself, so if the two nearest classes are almost tied the cell center can't decide for the whole cell
+            secondNearest = np.take_along_axis(distances, order[:, 1:2], axis=1)[:, 0]
+            lut[secondNearest - nearest < ambiguityParam] = AMBIGUOUS
+        if(maxDistanceParam is not None):
+            lut[nearest > maxDistanceParam] = UNKNOWN
+        self.lut = lut.reshape(size, size, size)
+        self.table = self.lut.tobytes()
+        return len(self.classes)
+
+    # Returns the class name for one RGB reading (or None if it's UNKNOWN or compile() hasn't been called)
+    def classify(self, rgbParam):
+        if(self.table is None):
+            return None
+        red, green, blue = rgbParam
+        shift = self.shift
+        code = self.table[(((red >> shift) << self.bits | (green >> shift)) << self.bits) | (blue >> shift)]
+        if(code == AMBIGUOUS):
+            code = self.classifyNearest(np.array([rgbParam]))[0]
+        return None if code == UNKNOWN else self.classes[code]
+
+    # Returns an array of class numbers (indexes into self.classes, or UNKNOWN) for an array of RGB readings, one row per reading
+    # Will return None if compile() hasn't been called
+    def classifyBatch(self, rgbParam):
+        if(self.lut is None):
+            return None
+        rgb = np.asarray(rgbParam, dtype=np.uint8)
+        cells = rgb >> self.shift
+        index = (cells[:, 0].astype(np.intp) << (2 * self.bits)) | (cells[:, 1].astype(np.intp) << self.bits) | cells[:, 2]
+        codes = self.lut.ravel()[index]
+        ambiguous = codes == AMBIGUOUS
+        if(ambiguous.any()):
+            codes[ambiguous] = self.classifyNearest(rgb[ambiguous])
+        return codes
+
+    # Classifies an array of RGB readings exactly by the nearest centroid in CIELAB, without the table (slower, but no quantization)
+    def classifyNearest(self, rgbParam):
+        distances = np.sqrt(((rgbToLab(rgbParam)[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2))
+        codes = np.argmin(distances, axis=1).astype(np.uint8)
+        if(self.maxDistance is not None):
+            codes[distances.min(axis=1) > self.maxDistance] = UNKNOWN
+        return codes
+
+    # Returns the class name for a class number from classifyBatch (None for UNKNOWN)
+    def getClassName(self, codeParam):
+        return None if codeParam == UNKNOWN else self.classes[codeParam]
+
+    # Saves the references and the compiled table, so calibration only has to be done once
+    # The references go in as one row per reading with its class name alongside, so a loaded classifier can take more references and be compiled again
+    def save(self, pathParam):
+        referenceNames = [name for name in sorted(self.references) for rgb in self.references[name]]
+        referenceReadings = [rgb for name in sorted(self.references) for rgb in self.references[name]]
+        np.savez(pathParam, bits=self.bits, classes=np.array(self.classes), centroids=self.centroids, lut=self.lut,
+                 maxDistance=np.nan if self.maxDistance is None else self.maxDistance,
+                 referenceNames=np.array(referenceNames, dtype=str), referenceReadings=np.array(referenceReadings).reshape(-1, 3))
+
+    # Loads a classifier saved with save()
+    @staticmethod
+    def load(pathParam):
+        data = np.load(pathParam)
+        classifier = ColorClassifier(int(data['bits']))
+        classifier.classes = [str(name) for name in data['classes']]
+        classifier.centroids = data['centroids']
+        classifier.maxDistance = None if np.isnan(data['maxDistance']) else float(data['maxDistance'])
+        classifier.lut = data['lut']
+        classifier.table = classifier.lut.tobytes()
+        if('referenceReadings' in data.files): # Files saved before the references were kept don't have them
+            for name, rgb in zip(data['referenceNames'], data['referenceReadings']):
+                classifier.addReference(str(name), rgb.tolist())
+        return classifier
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    from ColorSensorlib import ColorSensor
+
+    sensor = ColorSensor()
+    classifier = ColorClassifier()
+
+    for color in ['red', 'green', 'blue', 'yellow', 'empty']: # Calibrate with one of each in front of the sensor
+        input('Put something {0} in front of the sensor and press enter'.format(color))
+        classifier.calibrate(sensor, color)
+    classifier.compile(maxDistanceParam=25) # Anything further than 25 from every color is None
+    classifier.save('colors.npz')
+
+    while(True):
+        print(classifier.classify(sensor.getRGB()))
+        sensor.clock.sleep(0.5)
@@ -7,10 +7,76 @@
    @email wpl12014@mymail.pomona.edu
    @version 0.0.1
 """
-import board
-import busio
+import struct
 import time
-import adafruit_tcs34725
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from .Schedulerlib import getBusLock
+    from .ShadowRegisterlib import getShadowRegisters
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    from Schedulerlib import getBusLock
+    from ShadowRegisterlib import getShadowRegisters
+
+# TCS34725 registers used for block reads
+TCS34725_ADDRESS = 0x29
+TCS34725_COMMAND_BIT = 0x80 # Every register address goes out with this set
+TCS34725_COMMAND_AUTO_INCREMENT = 0xA0 # Command bit plus auto-increment, so one read goes through all the data registers
+TCS34725_REG_ENABLE = 0x00 # Power and the color ADCs
+TCS34725_ENABLE_PON = 0x01 # Powers on the oscillator
+TCS34725_ENABLE_AEN = 0x02 # Turns on the color ADCs, so the data registers fill up
+TCS34725_POWER_ON_TIME = 0.003 # Seconds the oscillator needs after PON before AEN (2.4ms in the datasheet)
+TCS34725_REG_ATIME = 0x01 # Integration time: 256 minus the number of 2.4ms cycles
+TCS34725_REG_CONTROL = 0x0F # Gain
+TCS34725_REG_CDATAL = 0x14 # Clear, red, green, then blue, 16 bits each, low byte first
+TCS34725_CYCLE_TIME = 2.4 # ms per integration cycle
+TCS34725_GAIN_CODES = {1: 0x00, 4: 0x01, 16: 0x02, 60: 0x03} # CONTROL register value for each gain
+
+# Settings to switch between with applyProfile: short integrations with more gain to keep up with fast changes, or long ones for accurate color and lux
+COLOR_PROFILES = {
+    'fast': {'integrationTime': 24, 'gain': 16},
+    'precise': {'integrationTime': 154, 'gain': 4},
+}
+
+# Constants for the lux and color temperature math (from AMS's DN40 application note, same as adafruit_tcs34725)
+DN40_DEVICE_FACTOR = 310.0
+DN40_R_COEFFICIENT = 0.136
+DN40_G_COEFFICIENT = 1.0
+DN40_B_COEFFICIENT = -0.444
+DN40_CT_COEFFICIENT = 3810
+DN40_CT_OFFSET = 1391
+
+
+class ColorSample:
+    """One raw reading of all four channels, and the RGB color, color temperature, and lux worked out from it"""
+
+    def __init__(self, rawParam, integrationTimeParam, gainParam, glassAttenuationParam, timestampParam):
+        self.raw = rawParam # (red, green, blue, clear) counts
+        self.timestamp = timestampParam # Clock's monotonic() seconds when it was read
+        red, green, blue, clear = rawParam
+
+        # RGB bytes: each channel normalized to clear, with a gamma of 2.5
+        if(clear == 0):
+            self.rgb = (0, 0, 0)
+        else:
+            self.rgb = tuple(min(255, int(pow(int(channel / clear * 256) / 255, 2.5) * 255)) for channel in (red, green, blue))
+
+        # Lux and color temperature (None if the sensor is saturated, since they'd be wrong)
+        cycles = int(round(integrationTimeParam / TCS34725_CYCLE_TIME))
+        saturation = 65535 if cycles > 63 else 1024 * cycles
+        if(integrationTimeParam < 150):
+            saturation -= saturation / 4 # Ripple saturation
+        if(clear >= saturation):
+            self.lux = None
+            self.temperature = None
+        else:
+            ir = (red + green + blue - clear) / 2 if red + green + blue > clear else 0.0
+            red2, green2, blue2 = red - ir, green - ir, blue - ir
+            countsPerLux = (integrationTimeParam * gainParam) / (glassAttenuationParam * DN40_DEVICE_FACTOR)
+            self.lux = (DN40_R_COEFFICIENT * red2 + DN40_G_COEFFICIENT * green2 + DN40_B_COEFFICIENT * blue2) / countsPerLux
+            self.temperature = DN40_CT_COEFFICIENT * blue2 / red2 + DN40_CT_OFFSET if red2 != 0 else None
 
 
 
@@ -18,41 +84,132 @@ class ColorSensor:
     """A class to measure color using the TCS34725 RGB Color Sensor. Code lovingly stolen/adapted from https://learn.adafruit.com/adafruit-color-sensors/python-circuitpython"""
 
     # Initializes class with the i2c communication connection using the board's SDA line on board pin 3 (GPIO pin 2) and SCL line on board pin 5 (GPIO pin 3)
-    def __init__(self, i2c):
-        self.sensor = adafruit_tcs34725.TCS34725(i2c)
+    # (the backend's i2c connection if i2c is None)
+    # sensorParam can be used to pass in an already made driver (like Simulatorlib's SimulatedTCS34725)
+    # backendParam is the Backendlib backend that makes the i2c connection and driver if they aren't given (Backendlib.getBackend() if it's None)
+    def __init__(self, i2c=None, sensorParam=None, backendParam=None):
+        backend = Backendlib.getBackend(backendParam)
+        self.i2c = backend.getI2C() if i2c is None else i2c
+        self.sensor = backend.createColorSensor(self.i2c) if sensorParam is None else sensorParam
+        self.address = TCS34725_ADDRESS
+        self.clock = backend.clock
+        self.busLock = getBusLock(self.i2c)
+
+        # Settings the math needs, kept here so working out a sample doesn't have to ask the sensor for them
+        self.integrationTime = getattr(self.sensor, 'integration_time', TCS34725_CYCLE_TIME)
+        self.gain = getattr(self.sensor, 'gain', 1)
+        self.glassAttenuation = getattr(self.sensor, 'glass_attenuation', 1.0)
+
+        # Latest sample, reused until the sensor has finished another integration cycle
+        self.lastSample = None
+        self.commandBuffer = bytes((TCS34725_COMMAND_AUTO_INCREMENT | TCS34725_REG_CDATAL,))
+        self.channelBuffer = bytearray(8)
+        self.registerBuffer = bytearray(1)
+
+        # The configuration registers, so settings that don't change aren't written again. Forgotten here in case the driver just reset the sensor
+        self.shadow = getShadowRegisters(self.i2c, self.address)
+        self.shadow.invalidate()
+
+        # sample() reads the data registers itself instead of going through the driver, so the sensor has to be left powered up and integrating
+        with self.busLock:
+            self.shadow.write(TCS34725_REG_ENABLE, TCS34725_ENABLE_PON, self._writeRegister)
+            self.clock.sleep(TCS34725_POWER_ON_TIME)
+            self.shadow.write(TCS34725_REG_ENABLE, TCS34725_ENABLE_PON | TCS34725_ENABLE_AEN, self._writeRegister)
+        Metricslib.register(self) # Timed while Metricslib is enabled
+
+    # Returns a ColorSample (raw, rgb, temperature, lux, timestamp) from one block read of all four channels
+    # The sensor only has new data once per integration time, so until then this returns the last sample without reading again
+    def sample(self):
+        now = self.clock.monotonic()
+        if(self.lastSample is not None and now - self.lastSample.timestamp < self.integrationTime / 1000):
+            return self.lastSample
+        with self.busLock:
+            while(not self.i2c.try_lock()):
+                pass
+            try:
+                self.i2c.writeto_then_readfrom(self.address, self.commandBuffer, self.channelBuffer)
+            finally:
+                self.i2c.unlock()
+        clear, red, green, blue = struct.unpack('<4H', self.channelBuffer)
+        self.lastSample = ColorSample((red, green, blue, clear), self.integrationTime, self.gain, self.glassAttenuation, now)
+        return self.lastSample
 
     # Checks and returns the sensor's RGB color it's currently reading
     def getRGB(self):
-        return self.sensor.color_rgb_bytes
+        return self.sample().rgb
 
     # Checks and returns the sensor's color tempurature reading
     def getColorTemperature(self):
-        return self.sensor.color_temperature
+        return self.sample().temperature
 
     # Checks and returns the sensor's lux reading (apparently often not that accurate)
     def getLux(self):
-        return self.sensor.lux
+        return self.sample().lux
 
     # Sets the sensor's integration time in ms
     # Must be a value between 2.4 and 614.4
     # Will return the same value if it worked, and None if it didn't
     def setIntegrationTime(self, integrationTimeParam):
-        if(integrationTimeParam > 2.4 and integrationTimeParam < 614.4):
-            self.sensor.integration_time = integrationTimeParam
-            return integrationTimeParam
-        else:
+        if(self.applyProfile({'integrationTime': integrationTimeParam}) is None):
             return None
+        return integrationTimeParam
 
     # Sets the sensor gain value
     # Must be a value of 1, 4, 16, or 60
     # Will return the same value if it worked, and None if it didn't
     def setSensorGain(self, sensorGainParam):
-        if(sensorGainParam == 1 or sensorGainParam == 4 or sensorGainParam == 16 or sensorGainParam == 60):
-            self.sensor.gain = sensorGainParam
-            return sensorGainParam
-        else:
+        if(self.applyProfile({'gain': sensorGainParam}) is None):
+            return None
+        return sensorGainParam
+
+    # Sets several settings at once: a dictionary with 'integrationTime' and/or 'gain' (values like setIntegrationTime and setSensorGain take), or the name of one in COLOR_PROFILES
+    # Only the registers that change get written (nothing at all if the sensor already has these settings), all while holding the bus once
+    # Will return the profile if it worked, and None if it didn't (then nothing is changed)
+    def applyProfile(self, profileParam):
+        if(isinstance(profileParam, str)):
+            profileParam = COLOR_PROFILES.get(profileParam)
+            if(profileParam is None):
+                return None
+        integrationTime = profileParam.get('integrationTime')
+        gainCode = TCS34725_GAIN_CODES.get(profileParam.get('gain', self.gain))
+        if(gainCode is None or (integrationTime is not None and not 2.4 < integrationTime < 614.4)):
             return None
 
+        changed = False
+        with self.busLock:
+            if(integrationTime is not None):
+                atime = int(256 - integrationTime / TCS34725_CYCLE_TIME)
+                if(self.shadow.write(TCS34725_REG_ATIME, atime, self._writeRegister)):
+                    changed = True
+                self.integrationTime = TCS34725_CYCLE_TIME * (256 - atime) # What the sensor actually ends up using
+            if(self.shadow.write(TCS34725_REG_CONTROL, gainCode, self._writeRegister)):
+                changed = True
+            self.gain = profileParam.get('gain', self.gain)
+        if(changed):
+            self.lastSample = None # Taken with the old settings
+        return profileParam
+
+    # Adds reading the RGB color rateParam times a second to a Schedulerlib.SensorScheduler
+    def register(self, schedulerParam, rateParam, nameParam='color'):
+        return schedulerParam.addTask(nameParam, self.getRGB, rateParam, self.i2c)
+
+    def _readRegister(self, registerParam):
+        while(not self.i2c.try_lock()):
+            pass
+        try:
+            self.i2c.writeto_then_readfrom(self.address, bytes((TCS34725_COMMAND_BIT | registerParam,)), self.registerBuffer)
+        finally:
+            self.i2c.unlock()
+        return self.registerBuffer[0]
+
+    def _writeRegister(self, registerParam, valueParam):
+        while(not self.i2c.try_lock()):
+            pass
+        try:
+            self.i2c.writeto(self.address, bytes((TCS34725_COMMAND_BIT | registerParam, valueParam & 0xFF)))
+        finally:
+            self.i2c.unlock()
+
 
 
 
@@ -63,14 +220,15 @@ class ColorSensor:
 
 if __name__ == "__main__":
 
-    i2c = busio.I2C(board.SCL, board.SDA) # Initializes the i2c connection on the Raspberry Pi
+    i2c = Backendlib.getBackend().getI2C() # Initializes the i2c connection on the Raspberry Pi
     test = ColorSensor(i2c) # Initializes the color sensor with the i2c connection
 
     while(True): # Get measurements every second
 
-        R, G, B = test.getRGB()
-        print('Color: ({0}, {1}, {2})'.format(R, G, B)) # Reads RGB from the sensor
-        print('Temperature: {0}K'.format(test.getColorTemperature())) # Reads Color Temperature from the sensor
-        print('Lux: {0}'.format(test.getLux())) # Reads Lux from the sensor
+        sample = test.sample() # Reads all four channels from the sensor at once
+        R, G, B = sample.rgb
+        print('Color: ({0}, {1}, {2})'.format(R, G, B))
+        print('Temperature: {0}K'.format(sample.temperature))
+        print('Lux: {0}'.format(sample.lux))
 
         time.sleep(1.0) # Sleep for 1 second
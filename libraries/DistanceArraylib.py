@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Pings several HC-SR04 DistanceSensors on one robot without them hearing each other's echoes, while overlapping the ones that can't, and keeps a table of each one's latest reading. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import threading
+import time
+try: # Imported as part of the libraries package
+    from . import DistanceSensorlib
+except ImportError: # Run from inside the libraries folder
+    import DistanceSensorlib
+
+
+class DistanceArray:
+    """Owns several DistanceSensors and pings them in slots: sensors that would hear each other's pings (conflicts) are never in the same slot, and every sensor in a slot pings at once.
+    The slots come from coloring the conflict graph, so sensors pointing different ways share slots and the whole array goes around in as few slots as possible.
+    A slot ends once all its echoes are back (or timed out) plus a short guard time, so near obstacles make the array go faster"""
+
+    # sensorsParam is a dictionary of name -> DistanceSensor, or a list of DistanceSensors (named 0, 1, ...) in order around the robot
+    # conflictsParam is a list of (name, name) pairs of sensors that hear each other. If it's None, each sensor conflicts with the ones next to it in the list
+    # guardTimeParam is how long (in seconds) to wait after a slot for stray echoes to die down before the next one
+    # filterParam runs each sensor's readings through its own DistanceSensorlib.HampelFilter
+    def __init__(self, sensorsParam, conflictsParam=None, measure='cm', timeoutParam=0.04, guardTimeParam=0.005, filterParam=True):
+        if(isinstance(sensorsParam, dict)):
+            self.sensors = dict(sensorsParam)
+        else:
+            self.sensors = dict(enumerate(sensorsParam))
+        names = list(self.sensors)
+        if(conflictsParam is None):
+            conflictsParam = [(names[i], names[i + 1]) for i in range(len(names) - 1)]
+        self.conflicts = {name: set() for name in names}
+        for first, second in conflictsParam:
+            self.conflicts[first].add(second)
+            self.conflicts[second].add(first)
+        self.slots = self._colorSlots()
+        self.clock = getattr(self.sensors[names[0]], 'clock', time) if names else time # The sensors' clock (they're all on the same GPIO, so they share it)
+        self.measure = measure
+        self.timeout = timeoutParam
+        self.guardTime = guardTimeParam
+        self.filters = {name: DistanceSensorlib.HampelFilter() for name in names} if filterParam else None
+
+        self.latest = {name: None for name in names} # name -> latest RangeReading
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.cycles = 0
+        self.readings = 0
+        self.isRunning = False
+        self.thread = None
+
+    # Returns the latest RangeReading from a sensor (None if there isn't one yet)
+    def getLatest(self, nameParam):
+        return self.latest.get(nameParam)
+
+    # Returns a dictionary of name -> latest RangeReading for every sensor
+    def getTable(self):
+        with self.lock:
+            return dict(self.latest)
+
+    # callbackParam gets called with (name, reading) for every reading, from the thread doing the pinging
+    def subscribe(self, callbackParam):
+        self.subscribers.append(callbackParam)
+        return callbackParam
+
+    # Pings one slot's sensors together and waits for all of their echoes
+    def runSlot(self, slotParam):
+        # Every sensor needs its own MIN_PING_INTERVAL between pings, so wait for the slowest one, then fire them all
+        waitTime = 0
+        now = self.clock.monotonic()
+        for name in slotParam:
+            lastPingTime = self.sensors[name].lastPingTime
+            if(lastPingTime is not None):
+                waitTime = max(waitTime, lastPingTime + DistanceSensorlib.MIN_PING_INTERVAL - now)
+        if(waitTime > 0):
+            self.clock.sleep(waitTime)
+
+        futures = [(name, self.sensors[name].requestDistance(self.measure, timeoutParam=self.timeout)) for name in slotParam]
+        for name, future in futures:
+            if(future is None): # Something else has a reading in flight on this sensor
+                continue
+            reading = self.sensors[name].waitForReading(future, self.measure)
+            if(self.filters is not None):
+                reading = self.filters[name].filterReading(reading)
+            with self.lock:
+                self.latest[name] = reading
+                self.readings += 1
+            for subscriber in self.subscribers:
+                subscriber(name, reading)
+        if(self.guardTime > 0):
+            self.clock.sleep(self.guardTime)
+
+    # Pings every sensor once, slot by slot
+    def runCycle(self):
+        for slot in self.slots:
+            self.runSlot(slot)
+        self.cycles += 1
+
+    # Keeps pinging in this thread for durationParam seconds (or until close() is called if it's None)
+    def run(self, durationParam=None):
+        self.isRunning = True
+        endTime = None if durationParam is None else self.clock.monotonic() + durationParam
+        while(self.isRunning and (endTime is None or self.clock.monotonic() < endTime)):
+            self.runCycle()
+        self.isRunning = False
+
+    # Keeps pinging on a background thread (until close() is called)
+    def start(self):
+        if(self.thread is not None):
+            return
+        self.isRunning = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Stops pinging (the sensors stay open)
+    def close(self):
+        self.isRunning = False
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    # Greedy graph coloring: sensors with the most conflicts pick first, each taking the first slot none of its conflicts are in
+    # Returns the slots as lists of names
+    def _colorSlots(self):
+        slots = []
+        for name in sorted(self.conflicts, key=lambda name: -len(self.conflicts[name])):
+            for slot in slots:
+                if(not any(other in self.conflicts[name] for other in slot)):
+                    slot.append(name)
+                    break
+            else:
+                slots.append([name])
+        return slots
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    from DistanceSensorlib import DistanceSensor
+
+    # Four sensors across the front, left to right. Sensors next to each other hear each other, so left/middleRight ping together and then middleLeft/right
+    sensors = {'left': DistanceSensor(17, 27), 'middleLeft': DistanceSensor(5, 6), 'middleRight': DistanceSensor(23, 24), 'right': DistanceSensor(16, 20)}
+    array = DistanceArray(sensors)
+    print(array.slots)
+
+    array.start()
+    while(True):
+        print({name: reading.distance if reading is not None else None for name, reading in array.getTable().items()})
+        time.sleep(0.5)
@@ -7,55 +7,371 @@
    @email wpl12014@mymail.pomona.edu
    @version 0.0.1
 """
-import RPi.GPIO as gpio
+import bisect
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from . import GPIOSessionlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    import GPIOSessionlib
+
+# What happened with a reading (RangeReading.status)
+STATUS_OK = 'ok'
+STATUS_OUTLIER = 'outlier' # The sensor's reading was too far from the ones around it, so the distance is the rolling median instead (see HampelFilter)
+STATUS_NO_ECHO = 'noEcho' # The echo came back too late or never ended: nothing in range
+STATUS_NO_RESPONSE = 'noResponse' # The echo never started: the sensor isn't answering (check the wiring)
+
+MAX_RANGE_CM = 400 # The HC-SR04 can't measure further than this
+MIN_PING_INTERVAL = 0.06 # Seconds between pings, so the last ping's echoes have died down (the HC-SR04 datasheet asks for 60ms)
+
+class NoEchoError(TimeoutError):
+    """The echo started but didn't end in time"""
+
+class NoResponseError(TimeoutError):
+    """The echo never started"""
+
+class RangeReading:
+    """One reading from a DistanceSensor: the distance (None if there isn't one) and what happened (one of the STATUS_ values)"""
+
+    def __init__(self, distanceParam, statusParam, timestampParam, rawParam=None):
+        self.distance = distanceParam
+        self.status = statusParam
+        self.timestamp = timestampParam # The sensor's clock.monotonic() when the ping went out
+        self.raw = distanceParam if rawParam is None else rawParam # What the sensor measured, before any filtering
+
+    # True if there's a distance to use
+    @property
+    def isValid(self):
+        return self.status == STATUS_OK or self.status == STATUS_OUTLIER
+
+    def __repr__(self):
+        return 'RangeReading({0!r}, {1!r})'.format(self.distance, self.status)
+
+# Returns the median of a list that's already sorted
+def median(sortedParam):
+    middle = len(sortedParam) // 2
+    if(len(sortedParam) % 2 == 1):
+        return sortedParam[middle]
+    return (sortedParam[middle - 1] + sortedParam[middle]) / 2
+
+class HampelFilter:
+    """Rolling median over the last few readings that rejects outliers: a reading further than thresholdParam scaled median absolute deviations from the median is replaced by the median.
+    The window is kept sorted as readings come and go, so each update is a couple of bisects instead of sorting the window again,
+    and the median absolute deviation is found by walking out from the median through the sorted window instead of sorting the deviations"""
+
+    # minDeviationParam keeps the allowed deviation from going to 0 when the window's readings are all the same
+    def __init__(self, windowParam=7, thresholdParam=3.0, minDeviationParam=1.0):
+        self.windowSize = windowParam
+        self.threshold = thresholdParam
+        self.minDeviation = minDeviationParam
+        self.window = deque() # Readings in the order they came
+        self.sortedWindow = [] # The same readings, sorted
+
+    # Adds a reading and returns (filtered reading, True if it was an outlier)
+    # Outliers still go in the window, so a real jump in distance is trusted once it's lasted for half the window
+    def update(self, valueParam):
+        isOutlier = False
+        filtered = valueParam
+        if(len(self.sortedWindow) >= 3):
+            middle = median(self.sortedWindow)
+            deviation = 1.4826 * self._medianDeviation(middle) # Scaled to match the standard deviation for normal noise
+            if(abs(valueParam - middle) > self.threshold * max(deviation, self.minDeviation)):
+                isOutlier = True
+                filtered = middle
+
+        self.window.append(valueParam)
+        bisect.insort(self.sortedWindow, valueParam)
+        if(len(self.window) > self.windowSize):
+            del self.sortedWindow[bisect.bisect_left(self.sortedWindow, self.window.popleft())]
+        return filtered, isOutlier
+
+    # Runs a RangeReading through the filter. Returns it as it is, or a STATUS_OUTLIER reading with the median as its distance if it's an outlier
+    # Readings without a distance don't go in the window
+    def filterReading(self, readingParam):
+        if(not readingParam.isValid):
+            return readingParam
+        distance, isOutlier = self.update(readingParam.distance)
+        if(isOutlier):
+            return RangeReading(distance, STATUS_OUTLIER, readingParam.timestamp, readingParam.raw)
+        return readingParam
+
+    # Returns the median of the window (None if it's empty)
+    def getMedian(self):
+        if(len(self.sortedWindow) == 0):
+            return None
+        return median(self.sortedWindow)
+
+    def reset(self):
+        self.window.clear()
+        self.sortedWindow = []
+
+    # Returns the median of how far the window's readings are from middleParam (the window's median)
+    # Readings further out on either side of the median are further from it, so stepping outwards to whichever side is closer
+    # gives the deviations in order, and only the first half of them need to be visited
+    def _medianDeviation(self, middleParam):
+        values = self.sortedWindow
+        count = len(values)
+        right = bisect.bisect_left(values, middleParam)
+        left = right - 1
+        previous = deviation = 0
+        for i in range(count // 2 + 1):
+            previous = deviation
+            if(right >= count or (left >= 0 and middleParam - values[left] <= values[right] - middleParam)):
+                deviation = middleParam - values[left]
+                left -= 1
+            else:
+                deviation = values[right] - middleParam
+                right += 1
+        if(count % 2 == 1):
+            return deviation
+        return (previous + deviation) / 2
 
 class DistanceSensor:
     """A class to measure distance using the HC-SR04 Ultrasonic range Sensor. Code lovingly stolen/adapted from https://pythonprogramming.net/raspberry-pi-hc-sr04-programming"""
 
     # Initializes the classs with a trigger pin and echo pin for the Distance Sensor
-    def __init__(self, trigPin, echoPin):
+    # gpioParam can be used to swap RPi.GPIO out for another backend (like Simulatorlib's SimulatedGPIO)
+    # backendParam is the Backendlib backend to get the GPIO from if gpioParam isn't given (Backendlib.getBackend() if it's None)
+    # The pins are set up once here and kept until close() is called
+    def __init__(self, trigPin, echoPin, gpioParam=None, backendParam=None):
         # Pin number XX (like GPIOXX)
         self.trigPin = trigPin # Pin used to trigger reading the distance
         self.echoPin = echoPin # Pin used to read when distance signal comes back
+        if(gpioParam is None):
+            gpioParam = Backendlib.getBackend(backendParam).gpio
+        self.session = GPIOSessionlib.getSession(gpioParam)
+        self.gpio = self.session.gpio
+        self.clock = getattr(gpioParam, 'clock', time) # Simulated GPIO can run on a VirtualClock, and the echo gets timed on the same clock
+        # Sets up the trigPin as an output pin and the echoPin as an input pin (raises a ValueError if either is already set up the other way)
+        self.trigHandle, self.echoHandle = self.session.acquirePins([(self.trigPin, self.gpio.OUT), (self.echoPin, self.gpio.IN)], initialParam=self.gpio.LOW)
 
+        # State for edge-driven readings (see startEdgeDetection)
+        self.isEdgeDetectionStarted = False
+        self.edgeLock = threading.Lock()
+        self.pendingFuture = None # Future for the reading currently in flight
+        self.pendingMeasure = None
+        self.pendingTimer = None # Timer that gives up on the reading if the echo never comes back
+        self.riseTime = None # clock.perf_counter_ns() timestamp of the echo's rising edge
+        self.lastPingTime = None # clock.monotonic() of the last ping
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
+
+    # Pings once and returns the distance
+    # Will return None if there's no echo (see ping() to tell why) or if the measure isn't 'cm' or 'in'
     def distance(self, measure='cm'):
+        reading = self.ping(measure)
+        if(reading is None):
+            return None
+        return reading.distance
+
+    # Pings once (waiting out MIN_PING_INTERVAL since the last ping first) and returns a RangeReading
+    # Nothing in range gives STATUS_NO_ECHO and a sensor that doesn't answer STATUS_NO_RESPONSE, instead of a distance
+    # Will return None if the measure isn't 'cm' or 'in', or if a reading from requestDistance() is still in flight
+    def ping(self, measure='cm', timeoutParam=0.04):
+        if(self.lastPingTime is not None):
+            waitTime = self.lastPingTime + MIN_PING_INTERVAL - self.clock.monotonic()
+            if(waitTime > 0):
+                self.clock.sleep(waitTime)
+        future = self.requestDistance(measure, timeoutParam=timeoutParam)
+        if(future is None):
+            return None
+        return self.waitForReading(future, measure)
+
+    # Waits for a Future from requestDistance() and turns it into a RangeReading (timestamped with the last ping)
+    def waitForReading(self, futureParam, measure='cm'):
         try:
-            gpio.setmode(gpio.BCM) # Sets up the board to use the GPIOXX pin numbering scheme
-            gpio.setup(self.trigPin, gpio.OUT) # Sets up the trigPin as an output pin
-            gpio.setup(self.echoPin, gpio.IN) # Sets up the echoPin as an input pin
+            distance = futureParam.result()
+        except NoEchoError:
+            return RangeReading(None, STATUS_NO_ECHO, self.lastPingTime)
+        except TimeoutError:
+            return RangeReading(None, STATUS_NO_RESPONSE, self.lastPingTime)
+        maxRange = MAX_RANGE_CM if measure == 'cm' else MAX_RANGE_CM / 2.54
+        if(distance > maxRange):
+            return RangeReading(None, STATUS_NO_ECHO, self.lastPingTime, distance)
+        return RangeReading(distance, STATUS_OK, self.lastPingTime)
 
-            gpio.output(self.trigPin, False) # Turn the output pin off
-            while gpio.input(self.echoPin) == 0: # Checks the input pin for the distance signal to return and measures the time
-                nosig = time.time()
+    # Pings samplesParam times and returns a RangeReading of the median of the distances that came back
+    # If none did, the reading has the status most of the pings had
+    # Will return None if the measure isn't 'cm' or 'in'
+    def getFilteredDistance(self, samplesParam=5, measure='cm'):
+        distances = []
+        failures = {}
+        firstTime = None
+        for i in range(samplesParam):
+            reading = self.ping(measure)
+            if(reading is None):
+                return None
+            if(firstTime is None):
+                firstTime = reading.timestamp
+            if(reading.isValid):
+                distances.append(reading.distance)
+            else:
+                failures[reading.status] = failures.get(reading.status, 0) + 1
+        if(len(distances) == 0):
+            return RangeReading(None, max(failures, key=failures.get), firstTime)
+        distances.sort()
+        return RangeReading(median(distances), STATUS_OK, firstTime)
 
-            while gpio.input(self.echoPin) == 1:
-                sig = time.time()
+    # Generator of readings as fast as the sensor allows (one every MIN_PING_INTERVAL), run through a HampelFilter
+    # Outliers come out with STATUS_OUTLIER and the rolling median as their distance, and pings with no echo come out as they are (and don't go in the filter)
+    # countParam is how many readings to give (forever if it's None), and filterParam is the HampelFilter to use (a new one with the defaults if it's None)
+    def stream(self, measure='cm', countParam=None, filterParam=None):
+        if(filterParam is None):
+            filterParam = HampelFilter()
+        count = 0
+        while(countParam is None or count < countParam):
+            reading = self.ping(measure)
+            if(reading is None):
+                return
+            yield filterParam.filterReading(reading)
+            count += 1
 
-            tl = sig - nosig
+    # Adds pinging rateParam times a second to a Schedulerlib.SensorScheduler
+    # Uses the edge-driven requestDistance(), so the scheduler isn't stuck waiting for the echo
+    # Keep the rate under ~16Hz so one ping's echo is back (or timed out) before the next one
+    def register(self, schedulerParam, rateParam, nameParam='distance', measure='cm'):
+        return schedulerParam.addTask(nameParam, lambda: self.requestDistance(measure), rateParam)
 
-            # Converts time measurements to distace
-            if measure == 'cm':
-                distance = tl / 0.000058
-            elif measure == 'in':
-                distance = tl / 0.000148
-            else:
-                print('improper choice of measurement: in or cm')
-                distance = None
+    # Releases the pins (and stops edge detection). The sensor can't be used after this
+    def close(self):
+        self.stopEdgeDetection()
+        self.trigHandle.release()
+        self.echoHandle.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    # Adds the edge callbacks for edge-driven readings with requestDistance()
+    # Instead of spinning on the echo pin, the rising and falling edges of the echo are timestamped as they happen
+    def startEdgeDetection(self):
+        if(self.isEdgeDetectionStarted):
+            return
+        self.gpio.add_event_detect(self.echoPin, self.gpio.BOTH, callback=self._echoEdge)
+        self.isEdgeDetectionStarted = True
+
+    # Removes the edge callbacks (the pins stay set up)
+    def stopEdgeDetection(self):
+        if(not self.isEdgeDetectionStarted):
+            return
+        self.gpio.remove_event_detect(self.echoPin)
+        self.isEdgeDetectionStarted = False
+        self._finishReading(None, TimeoutError('edge detection stopped'))
 
-            gpio.cleanup() # Cleans up inputs and outputs on pins
-            return distance
-        except:
-            distance = 100 # If you get a distance of 100, something's wrong
-            gpio.cleanup()
-            return distance
+    # Fires a ping and returns right away with a Future that gets the distance when the echo comes back
+    # callbackParam (if given) is called with the Future once it's done
+    # If no echo comes back within timeoutParam seconds the Future gets a TimeoutError instead (NoResponseError if the echo never started, NoEchoError if it never ended)
+    # The HC-SR04 gives up after ~38ms when nothing is in range, so the default timeout is a little longer than that
+    # Will return None if the measure isn't 'cm' or 'in', or if a reading is already in flight
+    def requestDistance(self, measure='cm', callbackParam=None, timeoutParam=0.04):
+        if(measure != 'cm' and measure != 'in'):
+            return None
+        if(not self.isEdgeDetectionStarted):
+            self.startEdgeDetection()
+
+        future = Future()
+        future.set_running_or_notify_cancel() # The ping can't be called back once it's out, so the Future can't be cancelled (asyncio.wrap_future would try)
+        with self.edgeLock:
+            if(self.pendingFuture is not None):
+                return None
+            self.pendingFuture = future
+            self.pendingMeasure = measure
+            self.riseTime = None
+            self.lastPingTime = self.clock.monotonic()
+            timer = threading.Timer(timeoutParam, self._timeOut, [future, timeoutParam])
+            timer.daemon = True
+            self.pendingTimer = timer
+        if(callbackParam is not None):
+            future.add_done_callback(callbackParam)
+
+        # Trigger pulse needs to be at least 10us long
+        self.gpio.output(self.trigPin, True)
+        pulseEnd = time.perf_counter_ns() + 10000
+        while(time.perf_counter_ns() < pulseEnd):
+            pass
+        self.gpio.output(self.trigPin, False)
+        if(not future.done()): # On a VirtualClock the whole echo has already played out
+            timer.start()
+        return future
+
+    # Called on both edges of the echo pin. The first edge after a ping is the rising edge and the second is the falling edge,
+    # so the level doesn't need to be read back (it may already have changed again by the time the callback runs)
+    def _echoEdge(self, channel):
+        edgeTime = self.clock.perf_counter_ns()
+        with self.edgeLock:
+            if(self.pendingFuture is None):
+                return
+            if(self.riseTime is None):
+                self.riseTime = edgeTime
+                return
+            pulseLength = (edgeTime - self.riseTime) / 1e9
+            distance = self._convertPulse(pulseLength, self.pendingMeasure)
+        self._finishReading(distance, None)
+
+    # Called by the timeout timer: fails the reading with the error that says how far it got
+    def _timeOut(self, futureParam, timeoutParam):
+        with self.edgeLock:
+            isStarted = self.riseTime is not None
+        if(isStarted):
+            exception = NoEchoError("echo didn't end within {0}s".format(timeoutParam))
+        else:
+            exception = NoResponseError('no echo within {0}s'.format(timeoutParam))
+        self._finishReading(None, exception, futureParam)
+
+    # Hands the result (or exception) of the reading in flight to its Future
+    # futureParam makes sure a late timeout can't finish a newer reading
+    def _finishReading(self, distanceParam, exceptionParam, futureParam=None):
+        with self.edgeLock:
+            future = self.pendingFuture
+            if(future is None or (futureParam is not None and futureParam is not future)):
+                return
+            self.pendingFuture = None
+            self.riseTime = None
+            if(self.pendingTimer is not None):
+                self.pendingTimer.cancel()
+                self.pendingTimer = None
+        if(exceptionParam is None):
+            future.set_result(distanceParam)
+        else:
+            future.set_exception(exceptionParam)
+
+    # Converts the length of an echo pulse in seconds to a distance
+    # Will return None if the measure isn't 'cm' or 'in'
+    def _convertPulse(self, pulseLengthParam, measure):
+        if measure == 'cm':
+            return pulseLengthParam / 0.000058
+        elif measure == 'in':
+            return pulseLengthParam / 0.000148
+        return None
 
 
 if __name__ == "__main__":
+    useEdgeDetection = False
+    useStream = False
+
     test = DistanceSensor(17, 27) # Initialize the class with trigPin as GPIO17, and echoPin as GPIO27
 
+    if(useStream):
+        for reading in test.stream('cm'): # Filtered readings as fast as the sensor can go
+            print(reading.distance if reading.isValid else reading.status)
+
     while(True): # Get distance measurement every 2 seconds
-        print(test.distance('cm'))
+        if(useEdgeDetection):
+            reading = test.requestDistance('cm') # Fires the ping and returns right away
+            try:
+                print(reading.result()) # Waits for the echo (or the timeout)
+            except TimeoutError:
+                print('No echo')
+        else:
+            print(test.distance('cm'))
 
         time.sleep(1.0) # Sleep for 2 seconds
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shared GPIO session so sensors and servos can set up their pins once and keep them, instead of tearing down every pin on the board after each read. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import threading
+try: # Imported as part of the libraries package
+    from . import Backendlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+
+
+class PinHandle:
+    """A pin acquired from a GPIOSession. Can be used in a with block to release the pin automatically"""
+
+    def __init__(self, sessionParam, pinParam, directionParam):
+        self.session = sessionParam
+        self.pin = pinParam
+        self.direction = directionParam
+        self.gpio = sessionParam.gpio
+        self.isReleased = False
+
+    # Reads the pin's level (the pin is already set up, so this is a single gpio.input call)
+    def read(self):
+        return self.gpio.input(self.pin)
+
+    # Sets the pin's level (only for output pins)
+    def write(self, valueParam):
+        self.gpio.output(self.pin, valueParam)
+
+    # Gives the pin back to the session. Safe to call more than once
+    def release(self):
+        if(not self.isReleased):
+            self.isReleased = True
+            self.session.releasePin(self.pin)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+        return False
+
+
+class GPIOSession:
+    """Keeps track of which pins are set up and how many objects are using each one. Pins are set up the first time they're acquired and only cleaned up when the last user releases them"""
+
+    # gpioParam is the GPIO backend to use (RPi.GPIO or something that acts like it)
+    def __init__(self, gpioParam):
+        self.gpio = gpioParam
+        self.pins = {} # pin -> [direction, number of users]
+        self.lock = threading.Lock()
+        self.isModeSet = False
+
+    # Sets up a pin (if nobody has yet) and returns a PinHandle for it
+    # directionParam is gpio.IN or gpio.OUT, pullParam and initialParam are passed on to gpio.setup the first time
+    # Will return None if the pin is already set up in the other direction by someone else
+    def acquirePin(self, pinParam, directionParam, pullParam=None, initialParam=None):
+        gpio = self.gpio
+        with self.lock:
+            if(not self.isModeSet):
+                gpio.setmode(gpio.BCM) # Sets up the board to use the GPIOXX pin numbering scheme
+                self.isModeSet = True
+            if(pinParam in self.pins):
+                pinInfo = self.pins[pinParam]
+                if(pinInfo[0] != directionParam):
+                    return None
+                pinInfo[1] += 1
+            else:
+                setupOptions = {}
+                if(pullParam is not None):
+                    setupOptions['pull_up_down'] = pullParam
+                if(initialParam is not None):
+                    setupOptions['initial'] = initialParam
+                gpio.setup(pinParam, directionParam, **setupOptions)
+                self.pins[pinParam] = [directionParam, 1]
+        return PinHandle(self, pinParam, directionParam)
+
+    # Acquires several pins for one object, given a list of (pin, direction) pairs, and returns their PinHandles in the same order
+    # initialParam is passed on for output pins
+    # Raises a ValueError naming the pin if one is already set up in the other direction, after releasing the pins it already got
+    def acquirePins(self, pinsParam, initialParam=None):
+        handles = []
+        for pin, direction in pinsParam:
+            handle = self.acquirePin(pin, direction, initialParam=initialParam if direction == self.gpio.OUT else None)
+            if(handle is None):
+                for acquired in handles:
+                    acquired.release()
+                raise ValueError('GPIO{0} is already set up as an {1} by something else'.format(pin, 'output' if direction == self.gpio.IN else 'input'))
+            handles.append(handle)
+        return handles
+
+    # Lets go of one use of a pin, cleaning it up if nobody else is using it
+    def releasePin(self, pinParam):
+        with self.lock:
+            pinInfo = self.pins.get(pinParam)
+            if(pinInfo is None):
+                return
+            pinInfo[1] -= 1
+            if(pinInfo[1] <= 0):
+                del self.pins[pinParam]
+                self.gpio.cleanup(pinParam)
+
+    # Returns how many users a pin currently has (0 if it isn't set up)
+    def getUseCount(self, pinParam):
+        pinInfo = self.pins.get(pinParam)
+        return 0 if pinInfo is None else pinInfo[1]
+
+    # Cleans up every pin, no matter who is using it. Meant for the very end of a program
+    def close(self):
+        with self.lock:
+            if(self.isModeSet):
+                self.gpio.cleanup()
+            self.pins = {}
+            self.isModeSet = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+sessions = {} # id(gpio backend) -> GPIOSession
+sessionsLock = threading.Lock()
+
+# Returns the GPIOSession shared by everything using the same GPIO backend (the GPIO of Backendlib's backend if gpioParam is None)
+def getSession(gpioParam=None):
+    if(gpioParam is None):
+        gpioParam = Backendlib.getBackend().gpio
+    with sessionsLock:
+        session = sessions.get(id(gpioParam))
+        if(session is None or session.gpio is not gpioParam):
+            session = GPIOSession(gpioParam)
+            sessions[id(gpioParam)] = session
+        return session
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    session = getSession() # Shared session for RPi.GPIO
+    gpio = session.gpio
+
+    with session.acquirePin(22, gpio.IN) as linePin: # Set up GPIO22 once...
+        for i in range(10):
+            print(linePin.read()) # ...and every read after that is just gpio.input
+
+    session.close() # Clean up everything at the very end
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Closed loop line following: reads a LineSensorArray (or a single LineSensor) at a fixed rate and steers a DrivingController with a PID controller. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import threading
+import time
+
+
+class PIDController:
+    """A PID controller with a limited output and an integral that stops growing once it alone would hit the limit (so it doesn't wind up while the output is maxed out)"""
+
+    # outputLimitParam limits the output to -outputLimitParam to outputLimitParam (None for no limit)
+    # derivativeFilterParam is the time constant (in seconds) of a low pass filter on the derivative. Errors that jump in steps (like a line sensor array's position) make
+    # one tick spikes in the derivative that get bigger the faster the loop runs, and the filter spreads them out so the derivative term acts the same at any rate
+    def __init__(self, kpParam, kiParam=0.0, kdParam=0.0, outputLimitParam=None, derivativeFilterParam=0.0):
+        self.kp = kpParam
+        self.ki = kiParam
+        self.kd = kdParam
+        self.outputLimit = outputLimitParam
+        self.derivativeFilter = derivativeFilterParam
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.lastError = None
+
+    # Returns the output for an error dtParam seconds after the last one
+    def update(self, errorParam, dtParam):
+        self.integral += errorParam * dtParam
+        if(self.ki != 0 and self.outputLimit is not None):
+            integralLimit = self.outputLimit / abs(self.ki)
+            if(self.integral > integralLimit):
+                self.integral = integralLimit
+            elif(self.integral < -integralLimit):
+                self.integral = -integralLimit
+
+        # No derivative on the first update, so starting up (or finding the line again) doesn't kick
+        if(self.lastError is not None and dtParam > 0):
+            derivative = (errorParam - self.lastError) / dtParam
+            self.derivative += (derivative - self.derivative) * dtParam / (self.derivativeFilter + dtParam)
+        self.lastError = errorParam
+
+        output = self.kp * errorParam + self.ki * self.integral + self.kd * self.derivative
+        if(self.outputLimit is not None):
+            if(output > self.outputLimit):
+                output = self.outputLimit
+            elif(output < -self.outputLimit):
+                output = -self.outputLimit
+        return output
+
+    # Forgets the integral and the last error
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.lastError = None
+
+
+class LineFollower:
+    """Follows a line: every tick it reads where the line is, and the PID controller's output slows one wheel and speeds up the other to steer back onto it.
+    If the line is lost it turns in place towards the side the line was last seen on until it finds it again.
+    The loop runs on a fixed rate timer (see run and start) and keeps timing statistics, including overruns (ticks that took longer than the period)"""
+
+    # lineSensorParam is a LineSensorArray (its position, -1 to 1 from left to right, is steered towards 0)
+    # or a single LineSensor, which follows the left edge of the line by turning right while it sees the line and left while it doesn't
+    # rateParam is how many times a second the loop runs, baseSpeedParam how fast (-100 to 100) to drive when the robot is on the line, and searchSpeedParam how fast to turn while it's lost
+    # derivativeFilterParam is the PID controller's derivative filter time constant (see PIDController)
+    # clockParam is the clock to time the loop with (the time module, or Simulatorlib's VirtualClock to run a simulation faster than real time)
+    def __init__(self, lineSensorParam, drivingControllerParam, rateParam=200, baseSpeedParam=40, kpParam=40.0, kiParam=0.0, kdParam=2.0, searchSpeedParam=30, derivativeFilterParam=0.05, clockParam=time):
+        self.lineSensor = lineSensorParam
+        self.controller = drivingControllerParam
+        self.period = 1.0 / rateParam
+        self.periodNs = int(1e9 / rateParam)
+        self.baseSpeed = baseSpeedParam
+        self.searchSpeed = searchSpeedParam
+        self.pid = PIDController(kpParam, kiParam, kdParam, baseSpeedParam + 100, derivativeFilterParam)
+        self.clock = clockParam
+        if(hasattr(lineSensorParam, 'getPosition')):
+            self.readPosition = lineSensorParam.getPosition
+        else:
+            readLine = lineSensorParam.readLine
+            self.readPosition = lambda: 1.0 if readLine() else -1.0
+        self.lastPosition = 0.0 # Where the line was last seen
+        self.isLost = False
+        self.isRunning = False
+        self.thread = None
+        self.resetStats()
+
+    # Runs one tick of the loop: reads the line and sets the wheel speeds. dtParam is the time since the last tick (one period if it's None)
+    # Nothing in here builds lists or dictionaries, so running it hundreds of times a second doesn't churn memory
+    def step(self, dtParam=None):
+        position = self.readPosition()
+        if(position is None):
+            if(not self.isLost):
+                self.isLost = True
+                self.pid.reset()
+            speedCW = -self.searchSpeed if self.lastPosition > 0 else self.searchSpeed
+            speedCCW = -speedCW
+        else:
+            self.isLost = False
+            self.lastPosition = position
+            steering = self.pid.update(position, self.period if dtParam is None else dtParam)
+            # The line being to the right (positive) means turning right, so the right (CW) wheel slows down and the left (CCW) one speeds up
+            speedCW = self._limit(self.baseSpeed - steering)
+            speedCCW = self._limit(self.baseSpeed + steering)
+        if(speedCW != self.controller.speedCW or speedCCW != self.controller.speedCCW):
+            self.controller.setWheelSpeeds(speedCW, speedCCW)
+
+    # Runs the loop at the fixed rate in this thread for durationParam seconds (or until close() is called if it's None), then stops the wheels
+    def run(self, durationParam=None):
+        clock = self.clock
+        periodNs = self.periodNs
+        self.isRunning = True
+        startTime = clock.monotonic_ns()
+        endTime = None if durationParam is None else startTime + int(durationParam * 1e9)
+        deadline = startTime
+        lastTime = None
+        try:
+            while(self.isRunning and (endTime is None or deadline < endTime)):
+                now = clock.monotonic_ns()
+                jitter = now - deadline
+                self.step(self.period if lastTime is None else (now - lastTime) / 1e9)
+                lastTime = now
+                loopTime = clock.monotonic_ns() - now
+
+                self.iterations += 1
+                self.jitterTotal += jitter
+                if(jitter > self.jitterMax):
+                    self.jitterMax = jitter
+                self.loopTimeTotal += loopTime
+                if(loopTime > self.loopTimeMax):
+                    self.loopTimeMax = loopTime
+
+                # Fixed rate: aim for the next tick. If it's already gone by, that's an overrun, and the missed ticks are skipped instead of run back to back
+                deadline += periodNs
+                waitTime = deadline - clock.monotonic_ns()
+                if(waitTime > 0):
+                    clock.sleep(waitTime / 1e9)
+                else:
+                    self.overruns += 1
+                    deadline += (-waitTime // periodNs + 1) * periodNs
+                    clock.sleep((deadline - clock.monotonic_ns()) / 1e9)
+        finally:
+            self.isRunning = False
+            self.controller.stop()
+
+    # Runs the loop on a background thread (until close() is called)
+    def start(self):
+        if(self.thread is not None):
+            return
+        self.isRunning = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Stops the loop (and the wheels)
+    def close(self):
+        self.isRunning = False
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    # Returns the loop's timing statistics as a dictionary (times are in microseconds)
+    def getStats(self):
+        iterations = max(1, self.iterations)
+        return {
+            'rate': 1.0 / self.period,
+            'iterations': self.iterations,
+            'overruns': self.overruns,
+            'meanJitter': self.jitterTotal / iterations / 1000,
+            'maxJitter': self.jitterMax / 1000,
+            'meanLoopTime': self.loopTimeTotal / iterations / 1000,
+            'maxLoopTime': self.loopTimeMax / 1000,
+        }
+
+    def resetStats(self):
+        self.iterations = 0
+        self.overruns = 0
+        self.jitterTotal = 0
+        self.jitterMax = 0
+        self.loopTimeTotal = 0
+        self.loopTimeMax = 0
+
+    def _limit(self, speedParam):
+        if(speedParam > 100):
+            return 100
+        if(speedParam < -100):
+            return -100
+        return speedParam
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    from LineSensorlib import LineSensorArray
+    from Servolib import DrivingController
+
+    simulate = True
+    linePins = [5, 6, 13, 19, 26] # Five sensors across the front, left to right
+
+    if(simulate):
+        from Simulatorlib import SimulatedRobot
+        backend = Backendlib.setBackend(Backendlib.SimulatedBackend())
+        robot = SimulatedRobot(backend.gpio, backend.getPWM(), 18, 13, linePins) # A robot on an S shaped line
+        robot.start()
+
+    drivingController = DrivingController(18, 13)
+    lineSensors = LineSensorArray(linePins)
+    if(drivingController.getIsSetupCorrectly()):
+        drivingController.waitUntilReady()
+        follower = LineFollower(lineSensors, drivingController, 200)
+        follower.run(10.0) # Follow the line for 10 seconds
+        print(follower.getStats())
+        if(simulate):
+            print('Drove {0:0.2f}m, ended {1:0.1f}mm from the line'.format(robot.distance, robot.getLineError() * 1000))
+    else:
+        print("Both motors not set up correctly")
+    lineSensors.close()
+    drivingController.close()
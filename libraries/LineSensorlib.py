@@ -7,24 +7,220 @@
    @email wpl12014@mymail.pomona.edu
    @version 0.0.1
 """
-import RPi.GPIO as gpio
+import threading
 import time
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from . import GPIOSessionlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    import GPIOSessionlib
 
 class LineSensor:
     """A class to measure lines using the MH Sensor Series"""
 
     # Initializes the class with the pin used to read from the Line Sensor
-    def __init__(self, readPin):
+    # gpioParam can be used to swap RPi.GPIO out for another backend (like Simulatorlib's SimulatedGPIO)
+    # backendParam is the Backendlib backend to get the GPIO from if gpioParam isn't given (Backendlib.getBackend() if it's None)
+    # The pin is set up once here and kept until close() is called
+    def __init__(self, readPin, gpioParam=None, backendParam=None):
         self.readPin = readPin # Pin number XX (like GPIOXX)
+        if(gpioParam is None):
+            gpioParam = Backendlib.getBackend(backendParam).gpio
+        self.session = GPIOSessionlib.getSession(gpioParam)
+        self.gpio = self.session.gpio
+        self.readHandle = self.session.acquirePins([(self.readPin, self.gpio.IN)])[0] # Sets up the readPin as an input pin (raises a ValueError if it's already an output)
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
     def readLine(self):
-        gpio.setmode(gpio.BCM) # Sets up the board to use the GPIOXX pin numbering scheme
-        gpio.setup(self.readPin, gpio.IN) # Sets up the readPin as an input pin
-        output = gpio.input(self.readPin) # Actually reads from the input pin
-        gpio.cleanup() # Cleans up any inputs or outputs on the pins
-        return output # Returns the state of the readPin
+        return self.gpio.input(self.readPin) # Returns the state of the readPin
+
+    # Adds reading the line rateParam times a second to a Schedulerlib.SensorScheduler
+    def register(self, schedulerParam, rateParam, nameParam='line'):
+        return schedulerParam.addTask(nameParam, self.readLine, rateParam)
+
+    # Releases the pin. The sensor can't be used after this
+    def close(self):
+        self.readHandle.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+class LineSensorArray:
+    """A row of line sensors read together: every read gives a bitmask (bit i is the sensor on readPins[i]) and where the line is across the row.
+    Can also call back whenever the pattern changes, from GPIO edge detection instead of polling"""
+
+    # readPins is the list of pins, in order across the robot (at most 16, see positions)
+    # weightsParam is where each sensor sits across the row, used to work out the line's position (evenly spaced from -1 to 1 if it's None)
+    # invertParam is for sensors that read LOW over the line, so the bitmask always has 1s where the line is
+    # debounceParam is how long (in seconds) the pattern has to hold still before change callbacks hear about it
+    # gpioParam and backendParam are the same as LineSensor's
+    def __init__(self, readPins, weightsParam=None, invertParam=False, debounceParam=0.002, gpioParam=None, backendParam=None):
+        self.readPins = list(readPins)
+        count = len(self.readPins)
+        if(weightsParam is None):
+            weightsParam = [0.0] if count == 1 else [-1.0 + 2.0 * i / (count - 1) for i in range(count)]
+        self.weights = list(weightsParam)
+        self.invertMask = (1 << count) - 1 if invertParam else 0
+        self.debounce = debounceParam
+        if(gpioParam is None):
+            gpioParam = Backendlib.getBackend(backendParam).gpio
+        self.session = GPIOSessionlib.getSession(gpioParam)
+        self.gpio = self.session.gpio
+        self.clock = getattr(gpioParam, 'clock', time) # The debounce time is kept on the backend's clock, so it works on a VirtualClock and in replays
+        self.isVirtualClock = hasattr(self.clock, 'addListener')
+        self.readHandles = self.session.acquirePins([(pin, self.gpio.IN) for pin in self.readPins]) # Raises a ValueError if any of them is already an output
+        self.pinBits = tuple((pin, 1 << i) for i, pin in enumerate(self.readPins))
+
+        # The line position for every possible bitmask, worked out once so getPosition is a list lookup (None where no sensor sees the line)
+        self.positions = [None] * (1 << count)
+        for mask in range(1, 1 << count):
+            seen = [self.weights[i] for i in range(count) if mask & (1 << i)]
+            self.positions[mask] = sum(seen) / len(seen)
+        self.lastPosition = None # Last position where a sensor saw the line, for finding it again after losing it
+
+        self.callbacks = []
+        self.condition = threading.Condition()
+        self.settleTime = None # When the pattern will have held still long enough to report (None if nothing's waiting)
+        self.reportedMask = None
+        self.isWatching = False
+        self.isListening = False
+        self.thread = None
+        Metricslib.register(self) # Timed while Metricslib is enabled
+
+    # Returns the bitmask of which sensors see the line
+    def read(self):
+        readPin = self.gpio.input
+        mask = 0
+        for pin, bit in self.pinBits:
+            if(readPin(pin)):
+                mask |= bit
+        return mask ^ self.invertMask
+
+    # Returns where the line is across the row (in the units of the weights, so -1 to 1 by default), or None if no sensor sees it
+    # maskParam is a bitmask that's already been read (like the one a change callback gets); the sensors are read if it's None
+    def getPosition(self, maskParam=None):
+        position = self.positions[self.read() if maskParam is None else maskParam]
+        if(position is not None):
+            self.lastPosition = position
+        return position
+
+    # Calls callbackParam(mask, changedBits) from a background thread whenever the pattern changes and holds still for the debounce time
+    # Edge detection starts with the first callback
+    def addChangeCallback(self, callbackParam):
+        with self.condition:
+            self.callbacks.append(callbackParam)
+        self.startWatching()
+
+    def removeChangeCallback(self, callbackParam):
+        with self.condition:
+            if(callbackParam in self.callbacks):
+                self.callbacks.remove(callbackParam)
+
+    # Turns on edge detection on every pin (addChangeCallback does this on its own)
+    def startWatching(self):
+        with self.condition:
+            if(self.isWatching):
+                return
+            self.isWatching = True
+            self.reportedMask = self.read()
+        for pin in self.readPins:
+            self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._onEdge)
+        if(self.debounce > 0):
+            if(self.isVirtualClock and not self.isListening):
+                self.clock.addListener(self._onClock) # A VirtualClock doesn't pass in real time, so the debounce thread gets woken whenever it moves instead
+                self.isListening = True
+            self.thread = threading.Thread(target=self._debounceWorker, daemon=True)
+            self.thread.start()
+
+    # Turns edge detection back off
+    def stopWatching(self):
+        with self.condition:
+            if(not self.isWatching):
+                return
+            self.isWatching = False
+            self.condition.notify()
+        for pin in self.readPins:
+            self.gpio.remove_event_detect(pin)
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    # Adds reading the line position rateParam times a second to a Schedulerlib.SensorScheduler
+    def register(self, schedulerParam, rateParam, nameParam='lineArray'):
+        return schedulerParam.addTask(nameParam, self.getPosition, rateParam)
+
+    # Stops edge detection and releases the pins. The array can't be used after this
+    def close(self):
+        self.stopWatching()
+        for readHandle in self.readHandles:
+            readHandle.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    # Called by the GPIO library on every edge, bounces included
+    def _onEdge(self, pin):
+        if(self.debounce <= 0):
+            self._report()
+            return
+        with self.condition:
+            # Every edge pushes the report back, so it only goes out once the pins stop bouncing
+            self.settleTime = self.clock.monotonic() + self.debounce
+            self.condition.notify()
+
+    # Called whenever a VirtualClock moves, to see if the pattern has settled yet
+    def _onClock(self, nanosecondsParam):
+        with self.condition:
+            if(self.settleTime is not None):
+                self.condition.notify()
+
+    def _debounceWorker(self):
+        with self.condition:
+            while(self.isWatching):
+                if(self.settleTime is None):
+                    self.condition.wait()
+                    continue
+                waitTime = self.settleTime - self.clock.monotonic()
+                if(waitTime > 0):
+                    self.condition.wait(None if self.isVirtualClock else waitTime)
+                    continue
+                self.settleTime = None
+                self.condition.release() # Don't hold up edges while the callbacks run
+                try:
+                    self._report()
+                finally:
+                    self.condition.acquire()
+
+    def _report(self):
+        mask = self.read()
+        with self.condition:
+            changedBits = mask ^ self.reportedMask
+            if(changedBits == 0):
+                return
+            self.reportedMask = mask
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback(mask, changedBits)
 
 if __name__ == "__main__":
+    useArray = False
+
+    if(useArray):
+        with LineSensorArray([5, 6, 13, 19, 26]) as array: # Five sensors across the front, left to right
+            array.addChangeCallback(lambda mask, changedBits: print('{0:05b} line at {1}'.format(mask, array.getPosition(mask))))
+            time.sleep(30)
+
     readPin = 22
     test = LineSensor(readPin) # Initialize the class with readPin as GPIO17
 
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Timing and error counts for every call into the hardware libraries, per device and operation, kept in HDR-style latency histograms.
+   The sensors, display and servos register themselves when they're made, and enable() wraps their operations with timers (disable() takes the wrappers off again, so it costs nothing while it's off).
+   Set the ROBOT_METRICS environment variable to 1 to have it on from the start. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import json
+import os
+import threading
+import time
+import weakref
+
+# Latencies below 2 * SUB_BUCKETS nanoseconds get a bucket each, and every power of two above that is split into SUB_BUCKETS buckets,
+# so a bucket is never more than 1/SUB_BUCKETS (about 3%) wide and any 64 bit latency fits in BUCKET_COUNT buckets
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+PERCENTILES = {'p50': 50.0, 'p90': 90.0, 'p99': 99.0, 'p999': 99.9}
+
+# Class name -> (operations that return None when they fail, other operations) that get timed for each kind of device
+# Operations in the first group also count how many of their calls came back None, since that's how these libraries say something didn't work
+OPERATIONS = {
+    'ColorSensor': (('sample', 'getRGB', 'getColorTemperature', 'getLux'), ('setIntegrationTime', 'setSensorGain', 'applyProfile')),
+    'AccelerometerSensor': (('getAcceleration', 'getOrientation'), ('readFifo', 'setAccelerationRange', 'setDataRate', 'applyProfile', 'startStreaming', 'stopStreaming')),
+    'DistanceSensor': (('distance', 'ping', 'getFilteredDistance', 'requestDistance'), ()),
+    'LineSensor': ((), ('readLine',)),
+    'LineSensorArray': ((), ('read', 'getPosition')),
+    'OLED': (('drawLine', 'loadFont'), ('clear', 'drawText', 'drawImage', 'showDisplay', 'submitFrame', 'submitDraw')),
+    'ServoController': ((), ('cw', 'ccw', 'stop')),
+    'DrivingController': ((), ('setWheelSpeeds', 'forward', 'backward', 'turnLeft', 'turnRight', 'stop')),
+}
+
+
+# Returns the bucket a latency (in nanoseconds) goes in. The timers do the same math inline, to save a function call
+def getBucket(latencyParam):
+    shift = latencyParam.bit_length() - SUB_BUCKET_BITS - 1
+    if(shift > 0):
+        return (shift << SUB_BUCKET_BITS) + (latencyParam >> shift)
+    return latencyParam
+
+# Returns the (lowest, highest) latency in nanoseconds that goes in a bucket
+def getBucketRange(bucketParam):
+    if(bucketParam < 2 * SUB_BUCKETS):
+        return bucketParam, bucketParam
+    shift = (bucketParam >> SUB_BUCKET_BITS) - 1
+    top = bucketParam - (shift << SUB_BUCKET_BITS)
+    return top << shift, ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Counts of latencies (in nanoseconds) in log-linear buckets, like HdrHistogram: recording one is a couple of integer operations and the memory
+    doesn't grow with the number of calls, while percentiles still come out within about 3%"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+
+    def record(self, latencyParam):
+        self.counts[getBucket(latencyParam)] += 1
+
+    # Adds another histogram's counts to this one
+    # The counts list is always changed in place, since the timers keep hold of it
+    def merge(self, histogramParam):
+        self.counts[:] = [a + b for a, b in zip(self.counts, histogramParam.counts)]
+
+    def reset(self):
+        self.counts[:] = [0] * BUCKET_COUNT
+
+    def getCount(self):
+        return sum(self.counts)
+
+    # Returns the latency percentileParam percent of the recorded ones are at or below (the middle of its bucket), or None if nothing's been recorded
+    def getPercentile(self, percentileParam):
+        return self.getPercentiles([percentileParam])[0]
+
+    # Returns getPercentile for each of a list of percentiles, in one pass over the buckets
+    def getPercentiles(self, percentilesParam):
+        count = self.getCount()
+        if(count == 0):
+            return [None] * len(percentilesParam)
+        targets = sorted((max(1, -(-count * percentile // 100)), i) for i, percentile in enumerate(percentilesParam))
+        results = [None] * len(targets)
+        seen = 0
+        target = 0
+        for bucket, bucketCount in enumerate(self.counts):
+            if(bucketCount == 0):
+                continue
+            seen += bucketCount
+            while(target < len(targets) and targets[target][0] <= seen):
+                low, high = getBucketRange(bucket)
+                results[targets[target][1]] = (low + high) // 2
+                target += 1
+            if(target == len(targets)):
+                break
+        return results
+
+    # Returns a dictionary of count, mean, min, the PERCENTILES, and max (in nanoseconds, to the middle of their buckets). Everything but count is None if nothing's been recorded
+    def getSummary(self):
+        counts = self.counts
+        used = [bucket for bucket in range(BUCKET_COUNT) if counts[bucket]]
+        count = sum(counts[bucket] for bucket in used)
+        summary = {'count': count, 'mean': None, 'min': None}
+        summary.update(zip(PERCENTILES, self.getPercentiles(list(PERCENTILES.values()))))
+        summary['max'] = None
+        if(count > 0):
+            summary['mean'] = sum(counts[bucket] * sum(getBucketRange(bucket)) / 2 for bucket in used) / count
+            summary['min'] = sum(getBucketRange(used[0])) // 2
+            summary['max'] = sum(getBucketRange(used[-1])) // 2
+        return summary
+
+
+class OperationMetrics:
+    """The latency histogram and error counts of one operation (like 'getRGB') on one device"""
+
+    def __init__(self, deviceParam, operationParam):
+        self.device = deviceParam
+        self.operation = operationParam
+        self.histogram = LatencyHistogram()
+        self.errors = 0 # Exceptions, whether they were raised to the caller or caught and hidden inside the library (see noteError)
+        self.noneResults = 0 # Calls that returned None, for operations that do that when they fail
+        self.lastError = None # repr of the last exception
+
+    def reset(self):
+        self.histogram.reset()
+        self.errors = 0
+        self.noneResults = 0
+        self.lastError = None
+
+    # Returns the histogram's summary (in nanoseconds) along with the error counts
+    def getSummary(self):
+        summary = self.histogram.getSummary()
+        summary['errors'] = self.errors
+        summary['noneResults'] = self.noneResults
+        summary['lastError'] = self.lastError
+        return summary
+
+
+isEnabled = False
+metricsLock = threading.RLock()
+devices = weakref.WeakKeyDictionary() # Registered object -> its device name
+wrappedOperations = weakref.WeakKeyDictionary() # Object -> names of the operations that currently have timers on them
+customOperations = weakref.WeakKeyDictionary() # Object -> the operationsParam it was registered with, if it was
+nameCounts = {} # Class name -> how many objects of that class have been registered, for naming the next one
+operationMetrics = {} # (device name, operation) -> OperationMetrics. Kept after the device is gone, so a snapshot still has it
+
+# Adds an object (a sensor, the display, a servo...) to the devices that get timed, and puts the timers on now if metrics are on
+# nameParam is what it's called in snapshots (its class name, with #2, #3... after it for the second and third ones, if it's None)
+# operationsParam is (operations that return None when they fail, other operations), if the object's class isn't in OPERATIONS or should be timed differently
+# Every library class in OPERATIONS calls this when it's made, so it only needs calling for other things (like the i2c bus). Returns the device name
+def register(objectParam, nameParam=None, operationsParam=None):
+    with metricsLock:
+        if(objectParam in devices):
+            return devices[objectParam]
+        if(nameParam is None):
+            className = type(objectParam).__name__
+            nameCounts[className] = nameCounts.get(className, 0) + 1
+            nameParam = className if nameCounts[className] == 1 else '{0}#{1}'.format(className, nameCounts[className])
+        devices[objectParam] = nameParam
+        if(operationsParam is not None):
+            customOperations[objectParam] = operationsParam
+        if(isEnabled):
+            _wrap(objectParam)
+        return nameParam
+
+# Puts timers on every registered device's operations. Calls through bound methods taken before this (like tasks already added to a SensorScheduler) stay untimed
+def enable():
+    global isEnabled
+    with metricsLock:
+        isEnabled = True
+        for device in list(devices.keys()):
+            _wrap(device)
+
+# Takes the timers off again, so the devices' operations are back to costing exactly what they did. What's been recorded is kept
+def disable():
+    global isEnabled
+    with metricsLock:
+        isEnabled = False
+        for device, operations in list(wrappedOperations.items()):
+            for operation in operations:
+                device.__dict__.pop(operation, None)
+        wrappedOperations.clear()
+
+# Returns the name a device is registered under (its class name if it isn't registered)
+def getDeviceName(objectParam):
+    return devices.get(objectParam, type(objectParam).__name__)
+
+# Returns the OperationMetrics for an operation on a device (by name), making it the first time
+def getOperationMetrics(deviceParam, operationParam):
+    with metricsLock:
+        metrics = operationMetrics.get((deviceParam, operationParam))
+        if(metrics is None):
+            metrics = OperationMetrics(deviceParam, operationParam)
+            operationMetrics[(deviceParam, operationParam)] = metrics
+        return metrics
+
+# For the places in the libraries that catch an exception and return None instead of raising it, so the error still gets counted
+# Does nothing while metrics are off
+def noteError(objectParam, operationParam, exceptionParam=None):
+    if(not isEnabled):
+        return
+    metrics = getOperationMetrics(getDeviceName(objectParam), operationParam)
+    metrics.errors += 1
+    if(exceptionParam is not None):
+        metrics.lastError = repr(exceptionParam)
+
+# Forgets everything that's been recorded (the timers stay on if they're on)
+def reset():
+    with metricsLock:
+        for metrics in operationMetrics.values():
+            metrics.reset()
+
+# Returns {device name: {operation: summary}} for every operation that's been called or had an error, with summaries like OperationMetrics.getSummary (times in nanoseconds)
+# resetParam forgets what's been recorded once it's been read, so each snapshot only has what happened since the last one
+def getSnapshot(resetParam=False):
+    snapshot = {}
+    with metricsLock:
+        for (device, operation), metrics in sorted(operationMetrics.items()):
+            summary = metrics.getSummary()
+            if(summary['count'] > 0 or summary['errors'] > 0):
+                snapshot.setdefault(device, {})[operation] = summary
+            if(resetParam):
+                metrics.reset()
+    return snapshot
+
+# Returns a snapshot as a table with one line per operation (times in microseconds)
+def formatText(snapshotParam=None):
+    if(snapshotParam is None):
+        snapshotParam = getSnapshot()
+    lines = ['{0:<36} {1:>8} {2:>6} {3:>6} {4:>9} {5:>9} {6:>9} {7:>9} {8:>9}'.format('device.operation', 'calls', 'errors', 'None', 'mean(us)', 'p50(us)', 'p99(us)', 'p999(us)', 'max(us)')]
+    for device, operations in snapshotParam.items():
+        for operation, summary in operations.items():
+            times = ['{0:>9.2f}'.format(summary[key] / 1000) if summary[key] is not None else '{0:>9}'.format('-') for key in ('mean', 'p50', 'p99', 'p999', 'max')]
+            lines.append('{0:<36} {1:>8} {2:>6} {3:>6} {4}'.format(device + '.' + operation, summary['count'], summary['errors'], summary['noneResults'], ' '.join(times)))
+    return '\n'.join(lines)
+
+def printMetrics(snapshotParam=None):
+    print(formatText(snapshotParam))
+
+# Returns a snapshot as JSON, or writes it to pathParam if that's given
+def dumpJSON(pathParam=None, snapshotParam=None):
+    if(snapshotParam is None):
+        snapshotParam = getSnapshot()
+    if(pathParam is None):
+        return json.dumps(snapshotParam, indent=2)
+    with open(pathParam, 'w') as jsonFile:
+        json.dump(snapshotParam, jsonFile, indent=2)
+    return None
+
+# Returns (operations that return None when they fail, other operations) for a registered object
+def _getOperations(objectParam):
+    operations = customOperations.get(objectParam)
+    if(operations is not None):
+        return operations
+    for cls in type(objectParam).__mro__:
+        if(cls.__name__ in OPERATIONS):
+            return OPERATIONS[cls.__name__]
+    return ((), ())
+
+# Puts a timer on each of an object's operations that doesn't have one yet, as an attribute of the object itself so other objects of its class aren't slowed down
+def _wrap(objectParam):
+    device = devices[objectParam]
+    wrapped = wrappedOperations.setdefault(objectParam, [])
+    noneFails, others = _getOperations(objectParam)
+    for operations, countNone in ((noneFails, True), (others, False)):
+        for operation in operations:
+            if(operation in wrapped or not callable(getattr(objectParam, operation, None))):
+                continue
+            setattr(objectParam, operation, _makeTimer(getattr(objectParam, operation), getOperationMetrics(device, operation), countNone))
+            wrapped.append(operation)
+
+# Returns a function that calls functionParam and records how long it took in metricsParam's histogram (and if it raised, or returned None when countNoneParam is True)
+# Everything's kept in local variables and the bucket math is inline, since this runs on every call. Two threads timing the same operation at the same moment
+# can now and then lose one of their counts, which doesn't matter for the statistics and is cheaper than a lock
+def _makeTimer(functionParam, metricsParam, countNoneParam):
+    clock = time.perf_counter_ns
+    counts = metricsParam.histogram.counts
+    linearBits = SUB_BUCKET_BITS + 1
+    subBucketBits = SUB_BUCKET_BITS
+
+    def timedCall(*args, **kwargs):
+        startTime = clock()
+        try:
+            result = functionParam(*args, **kwargs)
+        except BaseException as error:
+            metricsParam.errors += 1
+            metricsParam.lastError = repr(error)
+            raise
+        latency = clock() - startTime
+        shift = latency.bit_length() - linearBits
+        if(shift > 0):
+            counts[(shift << subBucketBits) + (latency >> shift)] += 1
+        else:
+            counts[latency] += 1
+        if(countNoneParam and result is None):
+            metricsParam.noneResults += 1
+        return result
+
+    timedCall.__wrapped__ = functionParam
+    timedCall.__name__ = getattr(functionParam, '__name__', 'timedCall')
+    return timedCall
+
+
+if(os.environ.get('ROBOT_METRICS', '0').lower() in ('1', 'true', 'yes', 'on')):
+    enable()
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    import Metricslib # The libraries register with the imported module, not this file run as a script
+    from ColorSensorlib import ColorSensor
+    from DistanceSensorlib import DistanceSensor
+    from OLEDlib import OLED
+
+    backend = Backendlib.setBackend(Backendlib.SimulatedBackend())
+    backend.gpio.scriptEcho(17, 27, lambda: (0.0005, 0.002))
+    Metricslib.enable()
+
+    colorSensor = ColorSensor()
+    distanceSensor = DistanceSensor(17, 27)
+    oled = OLED()
+    Metricslib.register(backend.getI2C(), 'i2c', ((), ('writeto', 'readfrom_into', 'writeto_then_readfrom')))
+    for i in range(20):
+        colorSensor.getRGB()
+        distanceSensor.distance()
+        oled.drawText('Reading {0}'.format(i))
+        oled.showDisplay()
+    oled.loadFont('missingFont.ttf') # Fails, and gets counted in errors even though loadFont only returns None
+
+    Metricslib.printMetrics()
+    print(Metricslib.dumpJSON())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Motion profiles for DrivingController: speed changes ramp up and down with an acceleration limit (trapezoidal profiles) from a fixed rate timer, so the wheels don't slip and moves can be queued without time.sleep. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class Move:
+    """One queued move: ramp both wheels to their target speeds, then hold them for a while"""
+
+    def __init__(self, speedParamCW, speedParamCCW, durationParam, accelerationParam):
+        self.targetCW = speedParamCW
+        self.targetCCW = speedParamCCW
+        self.duration = durationParam # Seconds to hold the target speeds once they're reached (None to move on right away)
+        self.acceleration = accelerationParam # Speed units per second
+        self.reachedTime = None # When both wheels got to their target speeds
+        self.future = Future() # Finishes with True when the move is done, or gets cancelled
+
+
+class MotionProfiler:
+    """Ramps a DrivingController's wheels through a queue of moves from a fixed rate timer thread.
+    Both wheels ramp together (the one with further to go sets the pace), so the robot keeps its heading while it speeds up and slows down"""
+
+    # rateParam is how many times a second the wheel speeds get updated
+    # accelerationParam is the default acceleration limit, in speed units (percent of full speed) per second
+    def __init__(self, drivingControllerParam, rateParam=100, accelerationParam=200):
+        self.controller = drivingControllerParam
+        self.clock = drivingControllerParam.clock # The ramps are timed on the backend's clock, so a VirtualClock runs them without really waiting
+        self.period = 1.0 / rateParam
+        self.acceleration = accelerationParam
+        self.speedCW = drivingControllerParam.speedCW
+        self.speedCCW = drivingControllerParam.speedCCW
+        self.moves = deque()
+        self.lock = threading.Lock()
+        self.lastUpdateTime = None
+        self.isRunning = False
+        self.isRegistered = False # True once a SensorScheduler does the updates (see register), so the timer thread is never started
+        self.thread = None
+
+    # Queues a move to the given wheel speeds (-100 to 100, positive is forwards, like DrivingController.setWheelSpeeds)
+    # durationParam is how many seconds to hold the speeds once they're reached (None to go on to the next move as soon as they are)
+    # accelerationParam overrides the default acceleration limit for this move
+    # Returns a Future that finishes when the move is done. Starts the timer thread if it isn't running (unless a SensorScheduler does the updates)
+    def queueMove(self, speedParamCW, speedParamCCW=None, durationParam=None, accelerationParam=None):
+        if(speedParamCCW is None):
+            speedParamCCW = speedParamCW
+        if(accelerationParam is None):
+            accelerationParam = self.acceleration
+        move = Move(speedParamCW, speedParamCCW, durationParam, accelerationParam)
+        with self.lock:
+            self.moves.append(move)
+        if(not self.isRegistered):
+            self.start()
+        return move.future
+
+    # Same directions as DrivingController's functions of the same names
+    def forward(self, speedParam, durationParam=None, accelerationParam=None):
+        return self.queueMove(speedParam, speedParam, durationParam, accelerationParam)
+
+    def backward(self, speedParam, durationParam=None, accelerationParam=None):
+        return self.queueMove(-speedParam, -speedParam, durationParam, accelerationParam)
+
+    def turnLeft(self, speedParam, durationParam=None, accelerationParam=None):
+        return self.queueMove(speedParam, -speedParam, durationParam, accelerationParam)
+
+    def turnRight(self, speedParam, durationParam=None, accelerationParam=None):
+        return self.queueMove(-speedParam, speedParam, durationParam, accelerationParam)
+
+    # Cancels every move that hasn't started yet. The current move keeps going
+    def cancel(self):
+        with self.lock:
+            while(len(self.moves) > 1):
+                self.moves.pop().future.cancel()
+
+    # Cancels every move (including the current one) and ramps down to a stop, without waiting for it
+    # If rampParam is False the wheels stop right away instead. Returns a Future that finishes once they've stopped
+    def stop(self, rampParam=True, accelerationParam=None):
+        with self.lock:
+            while(len(self.moves) > 0):
+                self.moves.pop().future.cancel()
+            if(not rampParam):
+                # Set the wheels straight from here instead of waiting for the next update
+                self.speedCW = 0
+                self.speedCCW = 0
+                self.controller.setWheelSpeeds(0, 0)
+                future = Future()
+                future.set_result(True)
+                return future
+        return self.queueMove(0, 0, None, accelerationParam)
+
+    # Returns True if there aren't any moves left to do
+    def isIdle(self):
+        return len(self.moves) == 0
+
+    # Advances the current move by however much time has gone by since the last update
+    # The timer thread calls this, but it can also be run from a SensorScheduler instead (see register)
+    def update(self):
+        with self.lock:
+            now = self.clock.monotonic()
+            elapsed = self.period if self.lastUpdateTime is None else min(now - self.lastUpdateTime, 5 * self.period) # Don't lurch after a long pause
+            self.lastUpdateTime = now
+            if(len(self.moves) == 0):
+                return
+            move = self.moves[0]
+            if(move.reachedTime is None):
+                # Step both wheels along a straight line towards the target, as far as the acceleration limit allows
+                changeCW = move.targetCW - self.speedCW
+                changeCCW = move.targetCCW - self.speedCCW
+                largestChange = max(abs(changeCW), abs(changeCCW))
+                maxChange = move.acceleration * elapsed
+                if(largestChange <= maxChange or move.acceleration == float('inf')): # An infinite acceleration gets there right away, even if no time has gone by
+                    self.speedCW = move.targetCW
+                    self.speedCCW = move.targetCCW
+                    move.reachedTime = now
+                else:
+                    fraction = maxChange / largestChange
+                    self.speedCW += changeCW * fraction
+                    self.speedCCW += changeCCW * fraction
+                if(self.speedCW != self.controller.speedCW or self.speedCCW != self.controller.speedCCW):
+                    self.controller.setWheelSpeeds(self.speedCW, self.speedCCW)
+
+            if(move.reachedTime is not None and (move.duration is None or now - move.reachedTime >= move.duration)):
+                self.moves.popleft()
+                move.future.set_result(True)
+
+    # Lets a SensorScheduler do the updates instead of the timer thread (don't call start() too; queueMove won't start it from then on)
+    def register(self, schedulerParam, nameParam='motion'):
+        self.isRegistered = True
+        return schedulerParam.addTask(nameParam, self.update, 1.0 / self.period)
+
+    # Starts the timer thread (queueMove does this on its own)
+    def start(self):
+        if(self.thread is not None):
+            return
+        self.isRunning = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Stops the timer thread right where it is. Use stop() first to bring the wheels to a stop
+    def close(self):
+        self.isRunning = False
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def _run(self):
+        clock = self.clock
+        nextTime = clock.monotonic()
+        with self.lock:
+            self.lastUpdateTime = None
+        while(self.isRunning):
+            self.update()
+            # Fixed rate: aim for the next tick, skipping any that have already gone by
+            nextTime += self.period
+            waitTime = nextTime - clock.monotonic()
+            if(waitTime > 0):
+                clock.sleep(waitTime)
+            else:
+                nextTime = clock.monotonic()
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import GPIOSessionlib
+    from Servolib import DrivingController
+
+    twoMotors = DrivingController(18, 13)
+    try:
+        if(twoMotors.getIsSetupCorrectly()):
+            twoMotors.waitUntilReady()
+            with MotionProfiler(twoMotors, 100, 100) as profiler: # Full speed takes a second to get to
+                # Queue up the whole routine; none of these wait
+                profiler.forward(50, 2)
+                profiler.forward(100, 2)
+                profiler.backward(50, 2)
+                profiler.turnLeft(50, 2)
+                done = profiler.turnRight(50, 2)
+
+                print("Doing something else while the robot moves...")
+                done.result() # Wait for the last move to finish
+
+                profiler.stop().result() # Ramp down to a stop
+        else:
+            print("Both motors not set up correctly")
+    finally:
+        GPIOSessionlib.getSession().close()
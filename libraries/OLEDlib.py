@@ -7,30 +7,150 @@
    @email wpl12014@mymail.pomona.edu
    @version 0.0.1
 """
-import board
-import busio
-import digitalio
-from PIL import Image, ImageDraw, ImageFont
-import adafruit_ssd1306
+import os
+import tempfile
+import threading
 import time
-import RPi.GPIO as GPIO
+from collections import deque
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from .Schedulerlib import getBusLock
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    from Schedulerlib import getBusLock
+# NumPy and PIL take a while to import, so they're only imported once an OLED is made
+np = Backendlib.lazyImport('numpy')
+Image = Backendlib.lazyImport('PIL.Image')
+ImageDraw = Backendlib.lazyImport('PIL.ImageDraw')
+ImageFont = Backendlib.lazyImport('PIL.ImageFont')
+BdfFontFile = Backendlib.lazyImport('PIL.BdfFontFile')
+
+# SSD1306 commands used for partial updates
+SSD1306_SET_COLUMN_ADDRESS = 0x21
+SSD1306_SET_PAGE_ADDRESS = 0x22
+SSD1306_COMMAND_STREAM = 0x00 # Control byte: everything after it is commands
+SSD1306_DATA_STREAM = 0x40 # Control byte: everything after it is display data
+
+
+# Turns rows of pixels (one row per pixel row, one column per pixel column, values 0 or 1) into SSD1306 pages:
+# one byte per column per 8 rows, with the top row in the lowest bit. Rows past the bottom are treated as blank
+def packPages(pixelsParam):
+    rows, columns = pixelsParam.shape
+    pages = (rows + 7) // 8
+    if(rows != pages * 8):
+        padded = np.zeros((pages * 8, columns), dtype=np.uint8)
+        padded[:rows] = pixelsParam
+        pixelsParam = padded
+    return np.packbits(pixelsParam.reshape(pages, 8, columns).transpose(0, 2, 1), axis=2, bitorder='little')[:, :, 0]
+
+
+class GlyphCache:
+    """Every character of a font rasterized once into packed SSD1306 page bytes, so drawing text is just ORing those bytes into the framebuffer.
+    Text can start on any row, so each glyph is kept for all 8 positions it can have inside a page"""
+
+    # Characters rasterized up front. Anything else gets rasterized the first time it's drawn
+    PRINTABLE = ''.join(chr(code) for code in range(32, 127))
+
+    def __init__(self, fontParam):
+        self.font = fontParam
+        self.glyphs = {} # character -> (advance, 8 lists of page rows (one list per starting row in the page), the same 8 inverted for erasing)
+
+        # Render everything at the same height so all the glyphs share a baseline, then only keep the rows any glyph actually uses
+        self.canvasHeight = max(self._measure(character)[3] for character in self.PRINTABLE) + 1
+        rendered = [self._render(character) for character in self.PRINTABLE]
+        inkRows = np.flatnonzero(np.any([pixels.any(axis=1) for advance, pixels in rendered], axis=0))
+        self.top = int(inkRows[0]) if len(inkRows) > 0 else 0
+        self.bottom = int(inkRows[-1]) + 1 if len(inkRows) > 0 else 1
+        for character, (advance, pixels) in zip(self.PRINTABLE, rendered):
+            self.glyphs[character] = self._pack(advance, pixels)
+
+    # Returns (advance, shifted page rows, inverted shifted page rows) for a character
+    def getGlyph(self, characterParam):
+        glyph = self.glyphs.get(characterParam)
+        if(glyph is None):
+            glyph = self._pack(*self._render(characterParam))
+            self.glyphs[characterParam] = glyph
+        return glyph
+
+    # Returns how wide some text is in pixels
+    def getWidth(self, textParam):
+        return sum(self.getGlyph(character)[0] for character in textParam)
+
+    def _pack(self, advanceParam, pixelsParam):
+        rows = pixelsParam[self.top:self.bottom]
+        shifted = []
+        for shift in range(8):
+            padded = np.zeros((shift + len(rows), pixelsParam.shape[1]), dtype=np.uint8)
+            padded[shift:] = rows
+            shifted.append(packPages(padded))
+        # Kept as lists of separate page rows, since NumPy makes temporary buffers for in-place math on 2D slices but not on rows
+        return (advanceParam, [list(pages) for pages in shifted], [list(~pages) for pages in shifted])
+
+    def _render(self, characterParam):
+        left, top, right, bottom = self._measure(characterParam)
+        advance = self._advance(characterParam)
+        canvas = Image.new('1', (max(1, advance, right), self.canvasHeight))
+        ImageDraw.Draw(canvas).text((0, 0), characterParam, font=self.font, fill=1)
+        return (advance, np.asarray(canvas, dtype=np.uint8))
+
+    def _measure(self, textParam):
+        try:
+            return self.font.getbbox(textParam)
+        except AttributeError: # Older versions of Pillow don't have getbbox
+            width, height = self.font.getsize(textParam)
+            return (0, 0, width, height)
+
+    def _advance(self, characterParam):
+        try:
+            return int(round(self.font.getlength(characterParam)))
+        except AttributeError: # Older versions of Pillow don't have getlength
+            return self.font.getsize(characterParam)[0]
 
 
 class OLED:
     """A class to control the OLED over i2c. Code lovingly stolen/adapted from https://tech.scargill.net/ssd1306-with-python/ and https://learn.adafruit.com/monochrome-oled-breakouts/python-setup"""
 
     # Initializes class with the i2c communication connection using the board's SDA line on board pin 3 (GPIO pin 2) and SCL line on board pin 5 (GPIO pin 3)
-    def __init__(self, i2c, addressParam=0x3c):
+    # (the backend's i2c connection if i2c is None)
+    # displayParam can be used to pass in an already made driver (like Simulatorlib's SimulatedSSD1306)
+    # backendParam is the Backendlib backend that makes the i2c connection and driver if they aren't given (Backendlib.getBackend() if it's None)
+    def __init__(self, i2c=None, addressParam=0x3c, displayParam=None, backendParam=None):
         # Define width and height of our specific OLED
         self.width = 128
         self.height= 64
+        self.pages = self.height // 8 # The SSD1306 stores 8 rows of pixels per byte, in "pages"
         self.image = Image.new('1', (self.width, self.height))
         self.draw = ImageDraw.Draw(self.image)
         self.font = ImageFont.load_default()
+        self.glyphs = GlyphCache(self.font)
+
+        # What gets sent to the display, already in its page layout: one byte per column per page. pixels is a NumPy view of the same memory
+        self.framebuffer = bytearray(self.width * self.pages)
+        self.pixels = np.frombuffer(self.framebuffer, dtype=np.uint8).reshape(self.pages, self.width)
 
         # Connect to the board
-        self.oled = adafruit_ssd1306.SSD1306_I2C(self.width, self.height, i2c, addr=addressParam)
-        GPIO.setmode(GPIO.BCM)
+        backend = Backendlib.getBackend(backendParam)
+        if(i2c is None):
+            i2c = backend.getI2C()
+        self.oled = backend.createDisplay(self.width, self.height, i2c, addressParam) if displayParam is None else displayParam
+        self.busLock = getBusLock(i2c)
+
+        # What the display is currently showing (None until the first update, since we don't know)
+        self.sentBuffer = None
+        self.imagePages = None # self.image packed into pages as of the last update (None while nothing's drawn on it)
+        # Part of the framebuffer that's been drawn on since the last update, as (left, top, right, bottom) pixels, or None if nothing has
+        self.dirtyBox = None
+        self.bytesSent = 0 # Display data bytes sent over i2c, to see how much partial updates save
+
+        # Background updates (see startBackgroundUpdates)
+        self.updateThread = None
+        self.updateCondition = threading.Condition()
+        self.pendingUpdates = deque() # ('frame', frame, submitTime) and ('draw', function, submitTime) waiting for the worker
+        self.isUpdating = False
+        self.minFrameInterval = 0
+        self.resetDisplayStats()
 
         # Define line and column numbers of our specific OLED
         self.line1 = 2
@@ -39,66 +159,347 @@ class OLED:
         self.line4 = 29
         self.line5 = 38
         self.line6 = 47
+        self.lines = [self.line1, self.line2, self.line3, self.line4, self.line5, self.line6]
+        self.lineHeight = self.line2 - self.line1
 
         self.col1 = 4
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
-    # Clean up pins when done with class. May throw unexpected behavior based on when garbage cleanup happens
-    def __del__(self):
-        GPIO.cleanup()
+    # The OLED only talks over i2c, so it doesn't own any GPIO pins to set up or clean up
 
     # Clear display and saved image
     def clear(self):
         self.clearSavedImage()
-        self.oled.fill(0)
-        self.oled.show()
+        self.showDisplay()
 
     # Clear saved image, so not overlaying new text over old text
     def clearSavedImage(self):
-        self.image = Image.new('1', (self.width, self.height))
-        self.draw = ImageDraw.Draw(self.image)
+        self.draw.rectangle((0, 0, self.width - 1, self.height - 1), fill=0)
+        self.pixels.fill(0)
+        self.markDirty()
+
+    # Clear part of the saved image, given as (left, top, right, bottom) pixels
+    def clearArea(self, boxParam):
+        left, top, right, bottom = max(0, boxParam[0]), max(0, boxParam[1]), min(self.width, boxParam[2]), min(self.height, boxParam[3])
+        if(left >= right or top >= bottom):
+            return
+        # Shapes are only on self.image if something drew on it with self.draw, so plain text never goes through PIL
+        if(self.image.getbbox() is not None):
+            self.draw.rectangle((left, top, right - 1, bottom - 1), fill=0)
+        pixels = self.pixels
+        for page in range(top // 8, (bottom - 1) // 8 + 1):
+            # Only clear the rows of this page that are inside the box, in place
+            rows = (0xFF << max(0, top - page * 8)) & (0xFF >> max(0, (page + 1) * 8 - bottom)) & 0xFF
+            if(rows == 0xFF):
+                pixels[page, left:right] = 0
+            else:
+                pixels[page, left:right] &= ~rows & 0xFF
+        self.markDirty((left, top, right, bottom))
+
+    # Let the OLED know part of the framebuffer changed, as (left, top, right, bottom) pixels (or the whole thing if boxParam is None)
+    def markDirty(self, boxParam=None):
+        if(boxParam is None):
+            boxParam = (0, 0, self.width, self.height)
+        left, top, right, bottom = max(0, boxParam[0]), max(0, boxParam[1]), min(self.width, boxParam[2]), min(self.height, boxParam[3])
+        if(left >= right or top >= bottom):
+            return
+        if(self.dirtyBox is None):
+            self.dirtyBox = (left, top, right, bottom)
+        else:
+            self.dirtyBox = (min(left, self.dirtyBox[0]), min(top, self.dirtyBox[1]), max(right, self.dirtyBox[2]), max(bottom, self.dirtyBox[3]))
 
     # Write some text to the screen
+    # The text is drawn from the font's glyph cache straight into the framebuffer (a fillParam of 0 erases it instead)
     def drawText(self, textParam="Hello World!", xPosParam=None, yPosParam=None, fillParam=255):
         if(xPosParam is None):
             xPosParam = self.col1
         if(yPosParam is None):
             yPosParam = self.line1
         try:
-            self.draw.text((xPosParam, yPosParam), textParam, font=self.font, fill = fillParam)
-            # self.oled.image(self.image)
-        except:
+            for lineNumber, line in enumerate(str(textParam).split('\n')):
+                self._blitText(line, xPosParam, yPosParam + lineNumber * self.lineHeight, fillParam)
+        except Exception as error:
+            Metricslib.noteError(self, 'drawText', error) # Still counted, even though the caller never hears about it
             return None
         return None
 
+    # Replace one of the six text lines (1-6) with new text, clearing whatever was there before
+    # Will return None if the line number isn't 1-6
+    def drawLine(self, lineNumberParam, textParam, xPosParam=None):
+        if(lineNumberParam < 1 or lineNumberParam > len(self.lines)):
+            return None
+        if(xPosParam is None):
+            xPosParam = self.col1
+        top = self.lines[lineNumberParam - 1]
+        self.clearArea((0, top, self.width, top + self.lineHeight))
+        self._blitText(str(textParam), xPosParam, top, 255)
+        return lineNumberParam
+
     # Draw an image, and if no image is selected, draw internal image
+    # An image replaces that part of the screen, while the internal image (self.image, for drawing shapes with self.draw) is drawn on top of the text
     def drawImage(self, imageParam=None):
         if(imageParam is None):
-            self.oled.image(self.image)
+            self.pixels |= packPages(np.asarray(self.image, dtype=np.uint8))
+            self.markDirty()
         else:
             try:
-                self.oled.image(imageParam)
-            except:
+                width, height = min(self.width, imageParam.width), min(self.height, imageParam.height)
+                pixels = np.asarray(imageParam.convert('1'), dtype=np.uint8)[:height, :width]
+                mask = packPages(np.ones((height, width), dtype=np.uint8)) # Which bits of the framebuffer the image covers
+                pages = len(mask)
+                self.pixels[:pages, :width] = (self.pixels[:pages, :width] & ~mask) | packPages(pixels)
+                self.markDirty((0, 0, width, height))
+            except Exception as error:
+                Metricslib.noteError(self, 'drawImage', error)
                 return None
         return None
 
     # Show the saved image (and text) on the OLED screen
-    def showDisplay(self):
-        self.oled.image(self.image)
-        self.oled.show()
+    # Only the parts that changed since the last update get sent, unless fullParam is True
+    # Shapes drawn on self.image with self.draw go on top of the text, like drawImage() puts them
+    def showDisplay(self, fullParam=False):
+        frame = self._composeFrame()
+        if(fullParam or self.sentBuffer is None):
+            self.markDirty()
+        if(self.dirtyBox is None):
+            return None
+        firstPage = self.dirtyBox[1] // 8
+        lastPage = (self.dirtyBox[3] - 1) // 8
+        self.dirtyBox = None
+
+        if(self.sentBuffer is None or fullParam):
+            self.sentBuffer = np.zeros((self.pages, self.width), dtype=np.uint8)
+            self._sendWindow(frame, 0, 0, self.width)
+            self.sentBuffer[:] = frame
+            return None
+
+        # Compare with what's on the display, and send each run of changed pages as one window covering the changed columns
+        pages = frame[firstPage:lastPage + 1]
+        changed = pages != self.sentBuffer[firstPage:lastPage + 1]
+        changedPages = np.flatnonzero(changed.any(axis=1))
+        runStart = 0
+        while(runStart < len(changedPages)):
+            runEnd = runStart
+            while(runEnd + 1 < len(changedPages) and changedPages[runEnd + 1] == changedPages[runEnd] + 1):
+                runEnd += 1
+            first, last = changedPages[runStart], changedPages[runEnd]
+            changedColumns = np.flatnonzero(changed[first:last + 1].any(axis=0))
+            startColumn, endColumn = changedColumns[0], changedColumns[-1] + 1
+            self._sendWindow(pages[first:last + 1, startColumn:endColumn], firstPage + first, startColumn, endColumn)
+            self.sentBuffer[firstPage + first:firstPage + last + 1, startColumn:endColumn] = pages[first:last + 1, startColumn:endColumn]
+            runStart = runEnd + 1
         return None
 
-    # Load in a font to use
-    def loadFont(self, fontParam = 'default'):
+    # Returns the framebuffer with self.image ORed over it, marking the screen dirty if the image changed since the last update
+    # An empty image (the usual case when only text is drawn) costs one getbbox() call
+    def _composeFrame(self):
+        if(self.image.getbbox() is None):
+            imagePages = None
+        else:
+            imagePages = packPages(np.asarray(self.image, dtype=np.uint8))
+        if(imagePages is None and self.imagePages is None):
+            return self.pixels
+        if(imagePages is None or self.imagePages is None or not np.array_equal(imagePages, self.imagePages)):
+            self.markDirty()
+        self.imagePages = imagePages
+        if(imagePages is None):
+            return self.pixels
+        return self.pixels | imagePages
+
+    # Start a background thread that draws and sends updates, so the caller never waits on the i2c transfer
+    # maxFpsParam limits how often the display gets sent an update (0 for no limit)
+    # While it's running, draw with submitFrame() and submitDraw() instead of calling the draw functions directly
+    def startBackgroundUpdates(self, maxFpsParam=20):
+        self.minFrameInterval = 1.0 / maxFpsParam if maxFpsParam > 0 else 0
+        if(self.updateThread is not None):
+            return
+        self.isUpdating = True
+        self.updateThread = threading.Thread(target=self._updateWorker, daemon=True)
+        self.updateThread.start()
+
+    # Stop the background thread, after it sends whatever was still waiting
+    def stopBackgroundUpdates(self):
+        if(self.updateThread is None):
+            return
+        with self.updateCondition:
+            self.isUpdating = False
+            self.updateCondition.notify()
+        self.updateThread.join()
+        self.updateThread = None
+
+    # Hand the background thread a whole new frame: a PIL image, or the display's page bytes (width * pages of them)
+    # Anything still waiting to be sent gets replaced, since the new frame covers the whole screen
+    def submitFrame(self, frameParam):
+        if(not isinstance(frameParam, Image.Image)):
+            frameParam = bytes(frameParam) # Copy it, in case the caller reuses their buffer
+        with self.updateCondition:
+            for kind, item, submitTime in self.pendingUpdates:
+                if(kind == 'frame'):
+                    self.stats['framesDropped'] += 1
+                else:
+                    self.stats['drawsCoalesced'] += 1
+            self.pendingUpdates.clear()
+            self.pendingUpdates.append(('frame', frameParam, time.monotonic()))
+            self.stats['framesSubmitted'] += 1
+            self.updateCondition.notify()
+
+    # Hand the background thread a draw command: a function it calls with this OLED, like lambda oled: oled.drawLine(3, text)
+    # Every draw command gets run, but all the ones waiting when the thread gets to them go out in one update
+    def submitDraw(self, functionParam):
+        with self.updateCondition:
+            self.pendingUpdates.append(('draw', functionParam, time.monotonic()))
+            self.stats['drawsSubmitted'] += 1
+            self.updateCondition.notify()
+
+    # Returns a dictionary of background update statistics (times are in milliseconds)
+    def getDisplayStats(self):
+        with self.updateCondition:
+            stats = dict(self.stats)
+        sent = max(1, stats['framesSent'])
+        stats['meanTransferTime'] = stats.pop('transferTimeTotal') / sent * 1000
+        stats['maxTransferTime'] *= 1000
+        stats['meanLatency'] = stats.pop('latencyTotal') / sent * 1000
+        stats['maxLatency'] *= 1000
+        return stats
+
+    def resetDisplayStats(self):
+        with self.updateCondition:
+            self.stats = {
+                'framesSubmitted': 0, # Whole frames handed to submitFrame
+                'framesDropped': 0, # Frames replaced by a newer one before they were sent
+                'drawsSubmitted': 0, # Draw commands handed to submitDraw
+                'drawsCoalesced': 0, # Draw commands skipped because a newer whole frame replaced them
+                'framesSent': 0, # Updates actually sent to the display
+                'transferTimeTotal': 0.0,
+                'maxTransferTime': 0.0,
+                'latencyTotal': 0.0, # From the oldest submit in an update to the end of its transfer
+                'maxLatency': 0.0,
+            }
+
+    def _updateWorker(self):
+        lastSendTime = 0.0
+        while(True):
+            with self.updateCondition:
+                while(self.isUpdating and len(self.pendingUpdates) == 0):
+                    self.updateCondition.wait()
+                if(len(self.pendingUpdates) == 0):
+                    return # Stopped, and nothing left to send
+
+            # Don't update faster than the frame rate limit; anything submitted in the meantime joins this update
+            waitTime = lastSendTime + self.minFrameInterval - time.monotonic()
+            if(waitTime > 0 and self.isUpdating):
+                time.sleep(waitTime)
+
+            with self.updateCondition:
+                updates = list(self.pendingUpdates)
+                self.pendingUpdates.clear()
+            # A draw command (or an update) that fails is counted and skipped, so one bad submitDraw doesn't stop every later update from being sent
+            for kind, item, submitTime in updates:
+                try:
+                    if(kind == 'frame'):
+                        self._drawFrame(item)
+                    else:
+                        item(self)
+                except Exception as error:
+                    Metricslib.noteError(self, 'submitFrame' if kind == 'frame' else 'submitDraw', error)
+
+            startTime = time.monotonic()
+            try:
+                self.showDisplay()
+            except Exception as error:
+                Metricslib.noteError(self, 'showDisplay', error)
+            lastSendTime = time.monotonic()
+            transferTime = lastSendTime - startTime
+            latency = lastSendTime - updates[0][2]
+            with self.updateCondition:
+                self.stats['framesSent'] += 1
+                self.stats['transferTimeTotal'] += transferTime
+                self.stats['maxTransferTime'] = max(self.stats['maxTransferTime'], transferTime)
+                self.stats['latencyTotal'] += latency
+                self.stats['maxLatency'] = max(self.stats['maxLatency'], latency)
+
+    # Replaces the framebuffer with a whole frame (a PIL image or page bytes)
+    def _drawFrame(self, frameParam):
+        if(isinstance(frameParam, Image.Image)):
+            self.pixels.fill(0)
+            self.drawImage(frameParam)
+        else:
+            self.framebuffer[:] = frameParam[:len(self.framebuffer)]
+        self.markDirty()
+
+    # Load in a font to use: 'default', or the path to a TrueType/OpenType (.ttf/.otf), BDF (.bdf), or PIL (.pil) font
+    # sizeParam is only used for TrueType/OpenType fonts
+    # Will return the font if it loaded, and None if it didn't
+    def loadFont(self, fontParam = 'default', sizeParam=8):
         # if no font is loaded, use default font
-        if (fontParam is 'default'):
-            self.font = ImageFont.load_default()
+        if (fontParam == 'default'):
+            font = ImageFont.load_default()
         else:
             # Try loading font from memory
             try:
-                return None
+                extension = os.path.splitext(fontParam)[1].lower()
+                if(extension == '.ttf' or extension == '.otf'):
+                    font = ImageFont.truetype(fontParam, sizeParam)
+                elif(extension == '.bdf'):
+                    # PIL can't load BDF fonts directly, so convert it to a PIL font first
+                    with open(fontParam, 'rb') as fontFile:
+                        converted = BdfFontFile.BdfFontFile(fontFile)
+                    # The converted font is read back in right away, so its files don't need to stick around
+                    with tempfile.TemporaryDirectory() as convertedFolder:
+                        convertedPath = os.path.join(convertedFolder, os.path.splitext(os.path.basename(fontParam))[0])
+                        converted.save(convertedPath)
+                        font = ImageFont.load(convertedPath + '.pil')
+                else:
+                    font = ImageFont.load(fontParam)
             # Font did not load correctly
-            except:
+            except Exception as error:
+                Metricslib.noteError(self, 'loadFont', error)
                 return None
+        # Rasterize every glyph once up front
+        self.font = font
+        self.glyphs = GlyphCache(font)
+        return font
+
+    # ORs (or clears, if fillParam is 0) each character's cached glyph into the framebuffer
+    def _blitText(self, textParam, xPosParam, yPosParam, fillParam):
+        glyphs = self.glyphs
+        pixels = self.pixels
+        top = yPosParam + glyphs.top
+        firstPage, shift = top // 8, top % 8
+        x = xPosParam
+        for character in textParam:
+            advance, shifted, inverted = glyphs.getGlyph(character)
+            glyphRows = shifted[shift] if fillParam else inverted[shift]
+            glyphWidth = len(glyphRows[0])
+            # Clip the glyph to the screen
+            columnStart, columnEnd = max(0, -x), min(glyphWidth, self.width - x)
+            if(columnStart < columnEnd):
+                isWhole = columnStart == 0 and columnEnd == glyphWidth
+                # One page row at a time, in place, and erasing ANDs in the glyph's inverted copy, so no temporary arrays get made
+                for index in range(max(0, -firstPage), min(len(glyphRows), self.pages - firstPage)):
+                    target = pixels[firstPage + index, x + columnStart:x + columnEnd]
+                    source = glyphRows[index] if isWhole else glyphRows[index][columnStart:columnEnd]
+                    if(fillParam):
+                        target |= source
+                    else:
+                        target &= source
+            x += advance
+            if(x >= self.width):
+                break
+        self.markDirty((xPosParam, top, x, yPosParam + glyphs.bottom))
+
+    # Sends a block of page data to the display, using column/page addressing so only that window gets written
+    def _sendWindow(self, pagesParam, firstPageParam, startColumnParam, endColumnParam):
+        lastPage = firstPageParam + len(pagesParam) - 1
+        command = bytes((SSD1306_COMMAND_STREAM, SSD1306_SET_COLUMN_ADDRESS, startColumnParam, endColumnParam - 1, SSD1306_SET_PAGE_ADDRESS, firstPageParam, lastPage))
+        data = bytes((SSD1306_DATA_STREAM,)) + pagesParam.tobytes()
+        device = self.oled.i2c_device
+        with self.busLock:
+            with device:
+                device.write(command)
+                device.write(data)
+        self.bytesSent += len(data) - 1
+
 
 
 
@@ -108,7 +509,7 @@ class OLED:
 
 if __name__ == "__main__":
 
-    i2c = busio.I2C(board.SCL, board.SDA) # Initializes the i2c connection on the Raspberry Pi
+    i2c = Backendlib.getBackend().getI2C() # Initializes the i2c connection on the Raspberry Pi
     oled = OLED(i2c) # Initializes the OLED with the i2c connection
 
     oled.drawText() # Try drawing some text to the internal saved image
@@ -121,6 +522,20 @@ if __name__ == "__main__":
     time.sleep(5)
     oled.clear() # Clear the internal saved image and the OLED display
     time.sleep(1)
+    for count in range(50): # Update one line at a time; only the changed part of the screen gets sent
+        oled.drawLine(1, "Status display")
+        oled.drawLine(3, "Count: {0}".format(count))
+        oled.showDisplay()
+        time.sleep(0.1)
+    oled.clear() # Clear the internal saved image and the OLED display
+    time.sleep(1)
+    oled.startBackgroundUpdates(20) # Same thing, but sending happens on its own thread so the loop never waits on it
+    for count in range(500):
+        oled.submitDraw(lambda display, count=count: display.drawLine(3, "Count: {0}".format(count)))
+        time.sleep(0.01) # Faster than the display can keep up with; the extra updates get combined
+    oled.stopBackgroundUpdates()
+    print(oled.getDisplayStats())
+    oled.clear() # Clear the internal saved image and the OLED display
 
 
 
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""PWM backends for the servos: RPi.GPIO's software PWM, the Raspberry Pi's hardware PWM through sysfs, and a simulated one that records every duty cycle change. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import os
+import threading
+import time
+from collections import deque
+try: # Imported as part of the libraries package
+    from . import GPIOSessionlib
+    from . import Metricslib
+except ImportError: # Run from inside the libraries folder
+    import GPIOSessionlib
+    import Metricslib
+
+
+class SoftwarePWMChannel:
+    """One pin of RPi.GPIO's software PWM. Easy to use on any pin, but the timing comes from a thread so it jitters when the CPU is busy"""
+
+    def __init__(self, backendParam, pinHandleParam, pwmParam):
+        self.backend = backendParam
+        self.pin = pinHandleParam.pin
+        self.pinHandle = pinHandleParam
+        self.pwm = pwmParam
+        self.dutyCycle = 0
+
+    def start(self, dutyCycleParam):
+        self.dutyCycle = dutyCycleParam
+        self.pwm.start(dutyCycleParam)
+
+    # Duty cycle is in percent
+    def setDutyCycle(self, dutyCycleParam):
+        with self.backend.lock:
+            self._write(dutyCycleParam)
+
+    def setFrequency(self, frequencyParam):
+        self.pwm.ChangeFrequency(frequencyParam)
+
+    # Stops the PWM and releases the pin
+    def stop(self):
+        self.pwm.stop()
+        self.pinHandle.release()
+
+    def _write(self, dutyCycleParam):
+        self.dutyCycle = dutyCycleParam
+        self.pwm.ChangeDutyCycle(dutyCycleParam)
+
+
+class SoftwarePWMBackend:
+    """Makes SoftwarePWMChannels with RPi.GPIO (or something that acts like it, see gpioParam)"""
+
+    # gpioParam can be used to swap RPi.GPIO out for another backend (like Simulatorlib's SimulatedGPIO)
+    def __init__(self, gpioParam=None):
+        self.session = GPIOSessionlib.getSession(gpioParam)
+        self.gpio = self.session.gpio
+        self.lock = threading.Lock()
+
+    # Sets up PWM on a pin. Will return None if the pin can't be used (it's already an input, or isn't a PWM pin)
+    def openChannel(self, pinParam, frequencyParam):
+        pinHandle = self.session.acquirePin(pinParam, self.gpio.OUT)
+        if(pinHandle is None):
+            return None
+        try:
+            pwm = self.gpio.PWM(pinParam, frequencyParam)
+        except Exception as error:
+            Metricslib.noteError(self, 'openChannel', error)
+            pinHandle.release()
+            return None
+        return SoftwarePWMChannel(self, pinHandle, pwm)
+
+    # Changes several channels' duty cycles at once, given a list of (channel, duty cycle) pairs
+    # Software PWM can't change them at exactly the same moment, but they're changed back to back without anything else getting in between
+    def setDutyCycles(self, updatesParam):
+        with self.lock:
+            for channel, dutyCycle in updatesParam:
+                channel._write(dutyCycle)
+
+
+class SysfsPWMChannel:
+    """One channel of the Raspberry Pi's hardware PWM, through /sys/class/pwm. The timing comes from the PWM peripheral, so the pulses don't jitter"""
+
+    def __init__(self, backendParam, pinParam, channelParam, frequencyParam):
+        self.backend = backendParam
+        self.pin = pinParam
+        self.channel = channelParam
+        self.path = os.path.join(backendParam.chipPath, 'pwm{0}'.format(channelParam))
+        self.dutyCycle = 0
+        self.period = 0 # In nanoseconds
+        self.dutyFile = None
+        self.setFrequency(frequencyParam)
+
+    def start(self, dutyCycleParam):
+        self.setDutyCycle(dutyCycleParam)
+        self.backend._writeFile(os.path.join(self.path, 'enable'), 1)
+
+    # Duty cycle is in percent
+    def setDutyCycle(self, dutyCycleParam):
+        with self.backend.lock:
+            self._write(dutyCycleParam)
+
+    def setFrequency(self, frequencyParam):
+        with self.backend.lock:
+            period = int(1e9 / frequencyParam)
+            dutyTime = int(period * self.dutyCycle / 100)
+            # The kernel won't take a duty cycle longer than the period, so shrink the duty cycle first if the period is getting shorter
+            if(period < self.period):
+                self.backend._writeFile(os.path.join(self.path, 'duty_cycle'), dutyTime)
+                self.backend._writeFile(os.path.join(self.path, 'period'), period)
+            else:
+                self.backend._writeFile(os.path.join(self.path, 'period'), period)
+                self.backend._writeFile(os.path.join(self.path, 'duty_cycle'), dutyTime)
+            self.period = period
+
+    # Turns the channel off and gives it back to the kernel
+    def stop(self):
+        with self.backend.lock:
+            if(self.dutyFile is not None):
+                os.close(self.dutyFile)
+                self.dutyFile = None
+            self.backend._writeFile(os.path.join(self.path, 'enable'), 0)
+            self.backend._writeFile(os.path.join(self.backend.chipPath, 'unexport'), self.channel)
+
+    def _write(self, dutyCycleParam):
+        # duty_cycle gets written on every update, so keep it open instead of opening the file every time
+        if(self.dutyFile is None):
+            self.dutyFile = os.open(os.path.join(self.path, 'duty_cycle'), os.O_WRONLY)
+        os.pwrite(self.dutyFile, str(int(self.period * dutyCycleParam / 100)).encode(), 0)
+        self.dutyCycle = dutyCycleParam
+
+
+class SysfsPWMBackend:
+    """Makes SysfsPWMChannels. Needs the pwm-2chan device tree overlay (dtoverlay=pwm-2chan in /boot/config.txt), which puts channel 0 on GPIO18 and channel 1 on GPIO19
+    (or GPIO12 and GPIO13 with dtoverlay=pwm-2chan,pin=12,func=4,pin2=13,func2=4)"""
+
+    # GPIO pin -> hardware PWM channel
+    PIN_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+
+    # rootParam is where the PWM chips show up (only worth changing to point at a fake sysfs tree)
+    def __init__(self, chipParam=0, rootParam='/sys/class/pwm'):
+        self.chipPath = os.path.join(rootParam, 'pwmchip{0}'.format(chipParam))
+        self.lock = threading.Lock()
+
+    # Sets up hardware PWM on a pin. Will return None if the pin doesn't have a hardware PWM channel or sysfs isn't available
+    def openChannel(self, pinParam, frequencyParam):
+        channel = self.PIN_CHANNELS.get(pinParam)
+        if(channel is None):
+            return None
+        try:
+            if(not os.path.isdir(os.path.join(self.chipPath, 'pwm{0}'.format(channel)))):
+                self._writeFile(os.path.join(self.chipPath, 'export'), channel)
+                time.sleep(0.1) # udev needs a moment to make the new files writable
+            return SysfsPWMChannel(self, pinParam, channel, frequencyParam)
+        except OSError:
+            return None
+
+    # Changes several channels' duty cycles at once, given a list of (channel, duty cycle) pairs
+    # The writes go out back to back, and the hardware only switches to a new duty cycle at the end of a period, so both wheels change on the same pulse
+    def setDutyCycles(self, updatesParam):
+        with self.lock:
+            for channel, dutyCycle in updatesParam:
+                channel._write(dutyCycle)
+
+    def _writeFile(self, pathParam, valueParam):
+        with open(pathParam, 'w') as file:
+            file.write(str(valueParam))
+
+
+class SimulatedPWMChannel:
+    """One channel of a SimulatedPWMBackend"""
+
+    def __init__(self, backendParam, pinParam, frequencyParam):
+        self.backend = backendParam
+        self.pin = pinParam
+        self.frequency = frequencyParam
+        self.dutyCycle = 0
+        self.isRunning = False
+
+    def start(self, dutyCycleParam):
+        self.isRunning = True
+        self.setDutyCycle(dutyCycleParam)
+
+    # Duty cycle is in percent
+    def setDutyCycle(self, dutyCycleParam):
+        with self.backend.lock:
+            self.backend._modelLatency()
+            self.backend._record([(self, dutyCycleParam)])
+
+    def setFrequency(self, frequencyParam):
+        self.frequency = frequencyParam
+
+    def stop(self):
+        self.isRunning = False
+        self.backend.channels.pop(self.pin, None)
+
+
+class SimulatedPWMBackend:
+    """PWM backend for running without a Raspberry Pi. The latest duty cycle changes are recorded in history as (time in nanoseconds, pin, duty cycle)"""
+
+    HISTORY_LENGTH = 4096 # Duty cycle changes kept by default. Older ones are dropped, so long simulations don't keep every write they ever made
+
+    # writeLatencyParam is how long (in seconds) each channel write should take, to model the cost of a real write
+    # historyLengthParam is how many duty cycle changes history keeps (HISTORY_LENGTH if it's None, and 0 to not record them at all)
+    def __init__(self, writeLatencyParam=0.0, historyLengthParam=None):
+        self.writeLatencyNs = int(writeLatencyParam * 1e9)
+        self.lock = threading.Lock()
+        self.channels = {} # pin -> SimulatedPWMChannel
+        self.historyLength = self.HISTORY_LENGTH if historyLengthParam is None else historyLengthParam
+        self.history = deque(maxlen=self.historyLength)
+
+    # Will return None if the pin is already in use
+    def openChannel(self, pinParam, frequencyParam):
+        with self.lock:
+            if(pinParam in self.channels):
+                return None
+            channel = SimulatedPWMChannel(self, pinParam, frequencyParam)
+            self.channels[pinParam] = channel
+        return channel
+
+    # Changes several channels' duty cycles at once, given a list of (channel, duty cycle) pairs
+    # Like a hardware latch, every channel gets the same timestamp
+    def setDutyCycles(self, updatesParam):
+        with self.lock:
+            for update in updatesParam:
+                self._modelLatency()
+            self._record(updatesParam)
+
+    # Returns the recorded history for one pin as a list of (time in nanoseconds, duty cycle), as far back as history goes
+    def getHistory(self, pinParam):
+        return [(timestamp, dutyCycle) for timestamp, pin, dutyCycle in self.history if pin == pinParam]
+
+    def clearHistory(self):
+        with self.lock:
+            self.history.clear()
+
+    def _record(self, updatesParam):
+        timestamp = time.perf_counter_ns()
+        for channel, dutyCycle in updatesParam:
+            channel.dutyCycle = dutyCycle
+            if(self.historyLength):
+                self.history.append((timestamp, channel.pin, dutyCycle))
+
+    def _modelLatency(self):
+        if(self.writeLatencyNs > 0):
+            endTime = time.perf_counter_ns() + self.writeLatencyNs
+            while(time.perf_counter_ns() < endTime):
+                pass
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    useHardwarePWM = True
+
+    if(useHardwarePWM):
+        backend = SysfsPWMBackend() # GPIO18 and GPIO19, see SysfsPWMBackend
+    else:
+        backend = SoftwarePWMBackend()
+
+    left = backend.openChannel(18, 50)
+    right = backend.openChannel(19, 50)
+    if(left is None or right is None):
+        print("PWM not set up correctly")
+    else:
+        left.start(7.5)
+        right.start(7.5)
+        time.sleep(2)
+        backend.setDutyCycles([(left, 10.0), (right, 5.0)]) # Both change on the same pulse
+        time.sleep(2)
+        backend.setDutyCycles([(left, 7.5), (right, 7.5)])
+        time.sleep(1)
+        left.stop()
+        right.stop()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Plays a folder of SampleLogger logs back through the simulated hardware, so ColorSensor, AccelerometerSensor, DistanceSensor and LineSensor read what the robot read when it was recorded.
+   Backendlib's ReplayBackend uses this to run whole control programs again on recorded data, either at the speed it was recorded or as fast as they go on a VirtualClock. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import heapq
+import math
+import os
+import threading
+import time
+try: # Imported as part of the libraries package
+    from . import SampleLoggerlib
+except ImportError: # Run from inside the libraries folder
+    import SampleLoggerlib
+
+# Where each kind of log gets played back to: GPIO pins for the line sensor and the distance sensor's (trigger, echo), like the examples at the bottom of their files
+DEFAULT_PINS = {'line': 22, 'distance': (17, 27)}
+COLOR_ADDRESS = 0x29
+ACCELEROMETER_ADDRESS = 0x1d
+
+ECHO_DELAY = 0.0005 # Seconds between a ping going out and its echo starting, about what an HC-SR04 takes to send its burst
+NO_ECHO_WIDTH = 0.038 # An HC-SR04 holds the echo pin high this long when nothing is in range
+CM_PER_SECOND = 1 / 0.000058 # Same conversion DistanceSensor uses
+
+
+class LogReplayer:
+    """Merges every log in a folder into one timeline and plays it onto a SimulatedBackend's devices as the backend's clock moves: color records set the
+    TCS34725's counts, acceleration records the MMA8451's, line records the line sensor's pin, and distance records what the next echo on the distance sensor's pins looks like.
+    Logs of outputs (like wheels and linePosition) aren't played back, but getRecords gives them for comparing a rerun against"""
+
+    # backendParam is the SimulatedBackend (or ReplayBackend) to play onto, and directoryParam the folder of .rlog files
+    # pinsParam is log name -> pin (or (trigger, echo) pins for distance logs), on top of DEFAULT_PINS. Logs that aren't in it use their kind's pins
+    def __init__(self, backendParam, directoryParam, pinsParam=None):
+        self.backend = backendParam
+        self.clock = backendParam.clock
+        self.pins = dict(DEFAULT_PINS)
+        if(pinsParam is not None):
+            self.pins.update(pinsParam)
+        self.records = {} # name -> records (a NumPy structured array)
+        self.kinds = {} # name -> kind of sample
+        self.echoes = {} # distance log name -> (delay, width) of the next echo
+        self.lock = threading.Lock()
+        self.isRunning = False
+        self.thread = None
+
+        streams = []
+        for fileName in sorted(os.listdir(directoryParam)):
+            if(not fileName.endswith('.rlog')):
+                continue
+            name = fileName[:-len('.rlog')]
+            with SampleLoggerlib.openLog(os.path.join(directoryParam, fileName)) as log:
+                records = log.getRecords().copy() # Copied so the file can be closed
+            kind = SampleLoggerlib.getKind(records.dtype.descr[1:])
+            self.records[name] = records
+            self.kinds[name] = kind
+            handler = self._makeHandler(name, kind)
+            if(handler is not None and len(records) > 0):
+                timestamps = records['timestamp'].tolist()
+                values = records[list(records.dtype.names[1:])].tolist()
+                streams.append([(timestamps[i], len(streams), i, handler, values[i]) for i in range(len(records))])
+        # One timeline of (timestamp, log number, record number, handler, values), in time order. Records at the same time play in log order, so every run is the same
+        self.events = list(heapq.merge(*streams))
+        self.position = 0 # Next event to play
+        self.startTime = self.events[0][0] if self.events else 0 # Recorded time (ns) of the first event
+        self.clockStart = None # Clock time (ns) the replay started at
+
+    # Returns how long (in seconds) the recording is
+    def getDuration(self):
+        if(len(self.events) == 0):
+            return 0.0
+        return (self.events[-1][0] - self.startTime) / 1e9
+
+    # Returns the records of a log (like 'wheels', to compare a rerun's commands against the recorded ones), or None if there's no log with that name
+    def getRecords(self, nameParam):
+        return self.records.get(nameParam)
+
+    # True once every record has been played
+    def isFinished(self):
+        return self.position >= len(self.events)
+
+    # Plays every record up to elapsedParam nanoseconds into the recording
+    def advanceTo(self, elapsedParam):
+        endTime = self.startTime + elapsedParam
+        events = self.events
+        with self.lock:
+            position = self.position
+            while(position < len(events) and events[position][0] <= endTime):
+                handler, values = events[position][3:]
+                handler(values)
+                position += 1
+            self.position = position
+
+    # Starts playing from the first record. On a VirtualClock the records play as the clock is moved along, so the replay goes exactly as fast as whatever's reading it;
+    # on the time module a background thread plays them at the times they were recorded
+    def start(self):
+        if(self.clockStart is not None):
+            return
+        self.clockStart = self.clock.monotonic_ns()
+        self.advanceTo(0)
+        if(hasattr(self.clock, 'addListener')):
+            self.clock.addListener(self._onClock)
+        else:
+            self.isRunning = True
+            self.thread = threading.Thread(target=self._playWorker, daemon=True)
+            self.thread.start()
+
+    # Stops the real time playback thread (the devices keep whatever was played last)
+    def close(self):
+        self.isRunning = False
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def _onClock(self, nanosecondsParam):
+        if(self.position < len(self.events)):
+            self.advanceTo(nanosecondsParam - self.clockStart)
+
+    def _playWorker(self):
+        while(self.isRunning and self.position < len(self.events)):
+            waitTime = (self.events[self.position][0] - self.startTime) - (self.clock.monotonic_ns() - self.clockStart)
+            if(waitTime > 0):
+                time.sleep(min(waitTime / 1e9, 0.1)) # Wake up now and then to see if close() was called
+                continue
+            self.advanceTo(self.clock.monotonic_ns() - self.clockStart)
+
+    # Returns the function that plays one of a log's records onto the hardware (None for logs that don't get played back)
+    def _makeHandler(self, nameParam, kindParam):
+        pins = self.pins.get(nameParam, self.pins.get(kindParam))
+        if(kindParam == 'color'):
+            device = self.backend.createColorSensor(self.backend.getI2C(), COLOR_ADDRESS)
+            return lambda values: device.setRGB(*values)
+        if(kindParam == 'acceleration'):
+            device = self.backend.createAccelerometer(self.backend.getI2C(), ACCELEROMETER_ADDRESS)
+            return lambda values: device.setAcceleration(*values)
+        if(kindParam == 'line' and pins is not None):
+            setInput = self.backend.gpio.setInput
+            return lambda values: setInput(pins, values[0])
+        if(kindParam == 'distance' and pins is not None):
+            trigPin, echoPin = pins
+            self.echoes[nameParam] = None # No echo until the first record, like a sensor that isn't answering yet
+            self.backend.gpio.scriptEcho(trigPin, echoPin, lambda: self.echoes[nameParam])
+            return lambda values: self._setEcho(nameParam, values)
+        return None
+
+    # Every ping from here on gets an echo that DistanceSensor reads back as this record
+    def _setEcho(self, nameParam, valuesParam):
+        distance, status = valuesParam
+        status = SampleLoggerlib.DISTANCE_STATUSES[status]
+        if(status == 'noResponse'):
+            self.echoes[nameParam] = None
+        elif(status == 'noEcho' or math.isnan(distance)):
+            self.echoes[nameParam] = (ECHO_DELAY, NO_ECHO_WIDTH)
+        else:
+            self.echoes[nameParam] = (ECHO_DELAY, distance / CM_PER_SECOND)
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    from ColorSensorlib import ColorSensor
+    from DistanceSensorlib import DistanceSensor
+    from LineSensorlib import LineSensor
+
+    # Plays back what SampleLoggerlib's example recorded, as fast as the loop below reads it
+    backend = Backendlib.setBackend(Backendlib.ReplayBackend('robotLogs'))
+    print('Replaying {0:0.1f}s of logs'.format(backend.replayer.getDuration()))
+
+    colorSensor = ColorSensor()
+    distanceSensor = DistanceSensor(17, 27)
+    lineSensor = LineSensor(22)
+    while(not backend.replayer.isFinished()):
+        print(backend.clock.monotonic(), colorSensor.getRGB(), distanceSensor.distance(), lineSensor.readLine()) # Each ping moves the clock along
+    backend.close()
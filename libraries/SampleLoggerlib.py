@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Logs sensor samples and servo commands as fixed size binary records in memory mapped ring files, and reads them back as NumPy structured arrays. Intended function/example can be seen at bottom of file
+   Writing a record is a copy into memory, and a background thread flushes the files to disk, so logging never waits on the SD card
+   @version 0.0.1
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+try: # Imported as part of the libraries package
+    from . import Backendlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+
+np = Backendlib.lazyImport('numpy')
+
+# Every record starts with a time.monotonic_ns() timestamp, followed by these fields for each kind of sample
+RECORD_FIELDS = {
+    'acceleration': [('x', '<f4'), ('y', '<f4'), ('z', '<f4')], # m/s^2
+    'color': [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')],
+    'distance': [('distance', '<f4'), ('status', 'u1')], # status is an index into DISTANCE_STATUSES
+    'line': [('value', 'u1')],
+    'linePosition': [('position', '<f4')],
+    'wheels': [('speedCW', '<f4'), ('speedCCW', '<f4')],
+}
+DISTANCE_STATUSES = ['ok', 'outlier', 'noEcho', 'noResponse'] # Same as DistanceSensorlib's STATUS_ values
+
+MAGIC = b'RLOG'
+VERSION = 1
+HEADER_SIZE = 4096 # One page, so the records start page aligned
+HEADER = struct.Struct('<4sHxxIQ') # magic, version, record size, capacity
+WRITTEN = struct.Struct('<Q') # Total records ever written, right after HEADER
+WRITTEN_OFFSET = HEADER.size
+FIELDS_OFFSET = WRITTEN_OFFSET + WRITTEN.size # Then the fields as JSON, with its length first
+
+# struct codes for NumPy types, by (kind, size)
+STRUCT_CODES = {('i', 1): 'b', ('i', 2): 'h', ('i', 4): 'i', ('i', 8): 'q', ('u', 1): 'B', ('u', 2): 'H', ('u', 4): 'I', ('u', 8): 'Q', ('f', 4): 'f', ('f', 8): 'd'}
+
+
+class SampleLog:
+    """One ring file of records. The file is made full size up front and memory mapped, so appending a record is just packing it into memory.
+    Once capacityParam records have been written, new ones write over the oldest"""
+
+    # fieldsParam is a list of (name, NumPy type) for everything in a record after the timestamp
+    def __init__(self, pathParam, fieldsParam, capacityParam=65536):
+        self.path = pathParam
+        self.fields = [(name, np.dtype(fieldType).str) for name, fieldType in fieldsParam]
+        self.dtype = np.dtype([('timestamp', '<i8')] + self.fields)
+        self.recordSize = self.dtype.itemsize
+        self.capacity = capacityParam
+        self.packer = struct.Struct('<q' + ''.join(STRUCT_CODES[(np.dtype(fieldType).kind, np.dtype(fieldType).itemsize)] for name, fieldType in self.fields))
+        self.written = 0
+        self.lock = threading.Lock()
+
+        size = HEADER_SIZE + self.recordSize * capacityParam
+        self.file = open(pathParam, 'w+b')
+        if(hasattr(os, 'posix_fallocate')):
+            os.posix_fallocate(self.file.fileno(), 0, size) # Really allocate the blocks now, instead of on the SD card in the middle of a run
+        else:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        fieldsJSON = json.dumps(self.fields).encode()
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.recordSize, capacityParam)
+        WRITTEN.pack_into(self.map, WRITTEN_OFFSET, 0)
+        struct.pack_into('<I', self.map, FIELDS_OFFSET, len(fieldsJSON))
+        self.map[FIELDS_OFFSET + 4:FIELDS_OFFSET + 4 + len(fieldsJSON)] = fieldsJSON
+        # The whole ring as a structured array over the map, for appendBatch
+        self.records = np.frombuffer(self.map, dtype=self.dtype, count=capacityParam, offset=HEADER_SIZE)
+
+    # Appends one record. valuesParam has the fields in order, and timestampParam defaults to now
+    def append(self, valuesParam, timestampParam=None):
+        if(timestampParam is None):
+            timestampParam = time.monotonic_ns()
+        with self.lock:
+            self.packer.pack_into(self.map, HEADER_SIZE + (self.written % self.capacity) * self.recordSize, timestampParam, *valuesParam)
+            self.written += 1
+            WRITTEN.pack_into(self.map, WRITTEN_OFFSET, self.written)
+
+    # Appends a batch of records from NumPy arrays: timestampsParam has one timestamp per record, and valuesParam one row (or one value, for one field) per record
+    def appendBatch(self, timestampsParam, valuesParam):
+        count = len(timestampsParam)
+        if(count > self.capacity): # Only the newest ones would survive anyway
+            timestampsParam = timestampsParam[-self.capacity:]
+            valuesParam = valuesParam[-self.capacity:]
+            count = self.capacity
+        columns = valuesParam.reshape(count, -1)
+        with self.lock:
+            start = self.written % self.capacity
+            firstPart = min(count, self.capacity - start)
+            for destination, source in [(slice(start, start + firstPart), slice(0, firstPart)), (slice(0, count - firstPart), slice(firstPart, count))]:
+                if(source.stop > source.start):
+                    self.records['timestamp'][destination] = timestampsParam[source]
+                    for index, (name, fieldType) in enumerate(self.fields):
+                        self.records[name][destination] = columns[source, index]
+            self.written += count
+            WRITTEN.pack_into(self.map, WRITTEN_OFFSET, self.written)
+
+    # Writes the changed pages out to the file. SampleLogger's flusher thread calls this, so the control loop doesn't have to
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        with self.lock:
+            if(self.map is None):
+                return
+            self.records = None
+            self.map.flush()
+            try:
+                self.map.close()
+            except BufferError: # Someone still has a view of the records; the map closes once it's gone
+                pass
+            self.map = None
+            self.file.close()
+
+
+class SampleLogger:
+    """A folder of SampleLogs, one per kind of sample (see RECORD_FIELDS), plus the background thread that flushes them.
+    Sensors get logged by subscribing to their SensorScheduler tasks (logTask), and the wheels through DrivingController.setLog"""
+
+    # flushIntervalParam is how often (in seconds) the logs get flushed to disk
+    def __init__(self, directoryParam, capacityParam=65536, flushIntervalParam=1.0):
+        self.directory = directoryParam
+        self.capacity = capacityParam
+        self.flushInterval = flushIntervalParam
+        self.logs = {} # name -> SampleLog
+        self.lock = threading.Lock()
+        self.flushTimeMax = 0.0 # Longest flush so far, in seconds
+        self.stopEvent = threading.Event()
+        self.thread = None
+        os.makedirs(directoryParam, exist_ok=True)
+
+    # Returns the log with that name, making it (as name.rlog in the folder) if it doesn't exist yet
+    # fieldsParam is the record's fields (RECORD_FIELDS[kindParam] if it's None, where kindParam defaults to the name)
+    def getLog(self, nameParam, fieldsParam=None, kindParam=None):
+        with self.lock:
+            log = self.logs.get(nameParam)
+            if(log is None):
+                if(fieldsParam is None):
+                    fieldsParam = RECORD_FIELDS[nameParam if kindParam is None else kindParam]
+                log = SampleLog(os.path.join(self.directory, nameParam + '.rlog'), fieldsParam, self.capacity)
+                self.logs[nameParam] = log
+        self.start()
+        return log
+
+    # Logs every sample of a SensorScheduler task, using the scheduler's timestamps
+    # kindParam is what kind of sample it is (the task's name if it's None), which picks the fields and how samples become records
+    def logTask(self, schedulerParam, taskNameParam, kindParam=None):
+        kind = taskNameParam if kindParam is None else kindParam
+        log = self.getLog(taskNameParam, kindParam=kind)
+        toValues = SAMPLE_CONVERTERS[kind]
+        return schedulerParam.subscribe(taskNameParam, lambda name, sample, timestamp: log.append(toValues(sample), timestamp))
+
+    # Starts the flusher thread (getLog does this on its own)
+    def start(self):
+        if(self.thread is not None):
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self._flushWorker, daemon=True)
+        self.thread.start()
+
+    # Stops the flusher and closes every log (flushing them one last time)
+    def close(self):
+        self.stopEvent.set()
+        if(self.thread is not None):
+            self.thread.join()
+        self.thread = None
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+            self.logs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def _flushWorker(self):
+        while(not self.stopEvent.wait(self.flushInterval)):
+            with self.lock:
+                logs = list(self.logs.values())
+            for log in logs:
+                startTime = time.perf_counter()
+                try:
+                    log.flush()
+                except (ValueError, AttributeError): # Closed while we were getting to it
+                    continue
+                self.flushTimeMax = max(self.flushTimeMax, time.perf_counter() - startTime)
+
+
+class SampleLogReader:
+    """Maps a log file (read only) and gives its records as NumPy structured arrays straight over the map, without copying them.
+    Works on a log that's still being written, but the oldest records can get written over while they're being looked at"""
+
+    def __init__(self, pathParam):
+        self.path = pathParam
+        self.file = open(pathParam, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.recordSize, self.capacity = HEADER.unpack_from(self.map, 0)
+        if(magic != MAGIC):
+            raise ValueError('{0} is not a sample log'.format(pathParam))
+        length = struct.unpack_from('<I', self.map, FIELDS_OFFSET)[0]
+        self.fields = [tuple(field) for field in json.loads(bytes(self.map[FIELDS_OFFSET + 4:FIELDS_OFFSET + 4 + length]).decode())]
+        self.dtype = np.dtype([('timestamp', '<i8')] + self.fields)
+        self.records = np.frombuffer(self.map, dtype=self.dtype, count=self.capacity, offset=HEADER_SIZE) # The whole ring, in file order
+
+    # Total records ever written to the log
+    def getWritten(self):
+        return WRITTEN.unpack_from(self.map, WRITTEN_OFFSET)[0]
+
+    # Returns the records still in the ring, oldest first, as a list of one or two arrays that are views of the map (two if the ring has wrapped around)
+    def getChunks(self):
+        written = self.getWritten()
+        if(written <= self.capacity):
+            return [self.records[:written]]
+        start = written % self.capacity
+        return [self.records[start:], self.records[:start]]
+
+    # Returns the records still in the ring, oldest first, as one array. Only copies if the ring has wrapped around
+    def getRecords(self):
+        chunks = self.getChunks()
+        if(len(chunks) == 1):
+            return chunks[0]
+        return np.concatenate(chunks)
+
+    # Unmaps the log. If arrays from getRecords or getChunks are still around, the map stays open until they're gone
+    def close(self):
+        self.records = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+# Opens a log file for reading
+def openLog(pathParam):
+    return SampleLogReader(pathParam)
+
+# Returns which kind of sample (a key of RECORD_FIELDS) records with these fields hold, or None if they don't match any
+def getKind(fieldsParam):
+    dtype = np.dtype(list(fieldsParam))
+    for kind, fields in RECORD_FIELDS.items():
+        if(np.dtype(fields) == dtype):
+            return kind
+    return None
+
+def _distanceValues(sampleParam):
+    if(hasattr(sampleParam, 'status')): # A DistanceSensorlib.RangeReading
+        return (float('nan') if sampleParam.distance is None else sampleParam.distance, DISTANCE_STATUSES.index(sampleParam.status))
+    return (sampleParam, 0)
+
+# How a SensorScheduler sample of each kind becomes a record's values
+SAMPLE_CONVERTERS = {
+    'acceleration': lambda sample: sample,
+    'color': lambda sample: sample,
+    'distance': _distanceValues,
+    'line': lambda sample: (sample,),
+    'linePosition': lambda sample: (sample,),
+    'wheels': lambda sample: sample,
+}
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    from Schedulerlib import SensorScheduler
+    from AccelerometerSensorlib import AccelerometerSensor
+    from LineSensorlib import LineSensor
+    from Servolib import DrivingController
+
+    backend = Backendlib.setBackend(Backendlib.SimulatedBackend())
+
+    with SampleLogger('robotLogs') as logger:
+        scheduler = SensorScheduler()
+        LineSensor(22).register(scheduler, 500)
+        logger.logTask(scheduler, 'line') # Every line reading goes in robotLogs/line.rlog
+
+        wheels = DrivingController(18, 13)
+        wheels.setLog(logger.getLog('wheels')) # And every wheel speed change in robotLogs/wheels.rlog
+
+        accelerometer = AccelerometerSensor()
+        accelerometer.setDataRate(800)
+        accelerationLog = logger.getLog('acceleration')
+        scheduler.addTask('drive', lambda: wheels.forward(50 if wheels.speedCW == 0 else 0), 2)
+        streamThread = threading.Thread(target=lambda: [accelerationLog.appendBatch(timestamps, samples) for timestamps, samples in accelerometer.stream()], daemon=True)
+        streamThread.start() # All 800 samples a second, in batches
+
+        scheduler.run(2.0)
+        accelerometer.stopStreaming()
+
+    for name in ['line', 'wheels', 'acceleration']:
+        with openLog(os.path.join('robotLogs', name + '.rlog')) as log:
+            records = log.getRecords()
+            print(name, len(records), records[-3:])
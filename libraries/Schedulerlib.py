@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Scheduler to help poll several sensors at different rates from one loop, without two of them using the same i2c bus at once. Intended function/example can be seen at bottom of file (and in combinedTest.py)
+   @version 0.0.1
+"""
+import heapq
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+
+busLocks = weakref.WeakKeyDictionary() # i2c bus -> lock for that bus, dropped along with the bus
+busLocksLock = threading.Lock()
+
+# Returns the lock shared by everything using the same i2c bus. Hold it for the whole transaction
+def getBusLock(busParam):
+    with busLocksLock:
+        lock = busLocks.get(busParam)
+        if(lock is None):
+            lock = threading.RLock()
+            busLocks[busParam] = lock
+        return lock
+
+
+class ScheduledTask:
+    """One sensor read the scheduler runs at a fixed rate, plus the timing statistics for it"""
+
+    def __init__(self, nameParam, readFunctionParam, rateParam, busLockParam=None):
+        self.name = nameParam
+        self.readFunction = readFunctionParam
+        self.rate = rateParam
+        self.period = int(1e9 / rateParam) # In nanoseconds
+        self.busLock = busLockParam
+        self.subscribers = []
+        self.nextDeadline = 0
+
+        # Statistics (times are in nanoseconds)
+        self.runs = 0
+        self.samples = 0
+        self.missedDeadlines = 0
+        self.errors = 0
+        self.jitterTotal = 0
+        self.jitterMax = 0
+        self.readTimeTotal = 0
+        self.readTimeMax = 0
+
+    # Sends a sample to everyone subscribed to this task
+    def publish(self, sampleParam, timestampParam):
+        self.samples += 1
+        for subscriber in self.subscribers:
+            subscriber(self.name, sampleParam, timestampParam)
+
+    # Returns the statistics as a dictionary (times are in microseconds)
+    def getStats(self):
+        runs = max(1, self.runs)
+        return {
+            'rate': self.rate,
+            'runs': self.runs,
+            'samples': self.samples,
+            'missedDeadlines': self.missedDeadlines,
+            'errors': self.errors,
+            'meanJitter': self.jitterTotal / runs / 1000,
+            'maxJitter': self.jitterMax / 1000,
+            'meanReadTime': self.readTimeTotal / runs / 1000,
+            'maxReadTime': self.readTimeMax / 1000,
+        }
+
+
+class SensorScheduler:
+    """Runs sensor reads in order of their deadlines on the monotonic clock. Reads that use an i2c bus hold that bus's lock, and every sample gets sent to the task's subscribers"""
+
+    def __init__(self):
+        self.tasks = {} # name -> ScheduledTask
+        self.queue = [] # heap of (deadline, sequence, task)
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.isRunning = False
+        self.thread = None
+
+    # Adds a read to the schedule. readFunctionParam is called with no arguments rateParam times a second
+    # If it returns a Future (like DistanceSensor.requestDistance does) the sample is published when the Future finishes
+    # If it returns None there's no sample, and if it raises an exception it's counted as an error
+    # busParam is the i2c bus the read uses, if any
+    # Will return None if there's already a task with that name
+    def addTask(self, nameParam, readFunctionParam, rateParam, busParam=None):
+        busLock = None if busParam is None else getBusLock(busParam)
+        task = ScheduledTask(nameParam, readFunctionParam, rateParam, busLock)
+        with self.lock:
+            if(nameParam in self.tasks):
+                return None
+            self.tasks[nameParam] = task
+            task.nextDeadline = time.monotonic_ns()
+            self._push(task)
+        return task
+
+    # Takes a task off the schedule
+    def removeTask(self, nameParam):
+        with self.lock:
+            task = self.tasks.pop(nameParam, None)
+            if(task is not None):
+                self.queue = [entry for entry in self.queue if entry[2] is not task]
+                heapq.heapify(self.queue)
+
+    # callbackParam gets called with (name, sample, timestamp) for every sample of the named task
+    # Will return None if there's no task with that name
+    def subscribe(self, nameParam, callbackParam):
+        task = self.tasks.get(nameParam)
+        if(task is None):
+            return None
+        task.subscribers.append(callbackParam)
+        return callbackParam
+
+    # Waits for the next deadline and runs that task. Returns the task that ran (or None if there aren't any tasks)
+    def runOnce(self):
+        with self.lock:
+            if(len(self.queue) == 0):
+                return None
+            deadline, sequence, task = heapq.heappop(self.queue)
+
+        waitTime = deadline - time.monotonic_ns()
+        if(waitTime > 0):
+            time.sleep(waitTime / 1e9)
+
+        startTime = time.monotonic_ns()
+        jitter = startTime - deadline
+        task.runs += 1
+        task.jitterTotal += jitter
+        if(jitter > task.jitterMax):
+            task.jitterMax = jitter
+
+        try:
+            if(task.busLock is None):
+                sample = task.readFunction()
+            else:
+                with task.busLock:
+                    sample = task.readFunction()
+        except Exception:
+            sample = None
+            task.errors += 1
+        else:
+            if(isinstance(sample, Future)):
+                sample.add_done_callback(lambda future: self._publishFuture(task, future))
+            elif(sample is not None):
+                task.publish(sample, startTime)
+
+        readTime = time.monotonic_ns() - startTime
+        task.readTimeTotal += readTime
+        if(readTime > task.readTimeMax):
+            task.readTimeMax = readTime
+
+        # Schedule the next read. If we're so late that later deadlines have already gone by, count them as missed and skip them
+        # instead of running the task several times in a row to catch up
+        nextDeadline = deadline + task.period
+        now = time.monotonic_ns()
+        if(nextDeadline < now):
+            missed = (now - nextDeadline) // task.period + 1
+            task.missedDeadlines += missed
+            nextDeadline += missed * task.period
+        task.nextDeadline = nextDeadline
+        with self.lock:
+            if(self.tasks.get(task.name) is task):
+                self._push(task)
+        return task
+
+    # Runs the schedule on the calling thread for durationParam seconds (or until stop() if it's None)
+    def run(self, durationParam=None):
+        self.isRunning = True
+        endTime = None if durationParam is None else time.monotonic_ns() + int(durationParam * 1e9)
+        while(self.isRunning and (endTime is None or time.monotonic_ns() < endTime)):
+            if(self.runOnce() is None):
+                time.sleep(0.001) # Nothing scheduled yet
+        self.isRunning = False
+
+    # Runs the schedule on a background thread
+    def start(self):
+        if(self.thread is not None):
+            return
+        self.isRunning = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Stops run() (or the background thread) after the current read
+    def stop(self):
+        self.isRunning = False
+        if(self.thread is not None and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+
+    # Returns a dictionary of name -> statistics for every task
+    def getStats(self):
+        return {name: task.getStats() for name, task in self.tasks.items()}
+
+    # Prints a table of the statistics for every task
+    def printStats(self):
+        print('{0:<14} {1:>8} {2:>9} {3:>7} {4:>7} {5:>13} {6:>12}'.format('task', 'rate', 'samples', 'missed', 'errors', 'jitter(us)', 'read(us)'))
+        for name, stats in self.getStats().items():
+            print('{0:<14} {1:>8.1f} {2:>9} {3:>7} {4:>7} {5:>6.0f}/{6:<6.0f} {7:>5.0f}/{8:<6.0f}'.format(name, stats['rate'], stats['samples'], stats['missedDeadlines'], stats['errors'], stats['meanJitter'], stats['maxJitter'], stats['meanReadTime'], stats['maxReadTime']))
+
+    def _publishFuture(self, taskParam, futureParam):
+        if(futureParam.exception() is None and futureParam.result() is not None):
+            taskParam.publish(futureParam.result(), time.monotonic_ns())
+        else:
+            taskParam.errors += 1
+
+    def _push(self, taskParam):
+        heapq.heappush(self.queue, (taskParam.nextDeadline, self.sequence, taskParam))
+        self.sequence += 1
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    scheduler = SensorScheduler()
+    scheduler.addTask('clock', time.time, 2) # Read anything with a function; here, the time twice a second
+    scheduler.subscribe('clock', lambda name, sample, timestamp: print(name, sample))
+
+    scheduler.run(5.0) # Run for 5 seconds
+    scheduler.printStats()
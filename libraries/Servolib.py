@@ -1,36 +1,47 @@
 # Servo Control
-import RPi.GPIO as gpio
 import time
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import Metricslib
+    from . import GPIOSessionlib
+    from . import PWMlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import Metricslib
+    import GPIOSessionlib
+    import PWMlib
 
 
 class ServoController:
 
-    def __init__(self, controlPinParam, HzParam=50, neutralDutyCyclePercentParam=7.5, maxCWDutyCyclePercentParam=10.0, maxCCWDutyCyclePercentParam=5.0):
+    DUTY_TABLE_RESOLUTION = 10 # Duty cycle table entries per unit of speed
+
+    # gpioParam can be used to swap RPi.GPIO out for another backend (like Simulatorlib's SimulatedGPIO)
+    # pwmParam is the PWM backend from PWMlib to use (if it's None: RPi.GPIO's software PWM on gpioParam if that's given, otherwise the PWM of Backendlib's backend)
+    # backendParam is the Backendlib backend to use (Backendlib.getBackend() if it's None)
+    def __init__(self, controlPinParam, HzParam=50, neutralDutyCyclePercentParam=7.5, maxCWDutyCyclePercentParam=10.0, maxCCWDutyCyclePercentParam=5.0, gpioParam=None, pwmParam=None, backendParam=None):
+        if(pwmParam is None):
+            pwmParam = Backendlib.getBackend(backendParam).getPWM() if gpioParam is None else PWMlib.SoftwarePWMBackend(gpioParam)
+        self.pwmBackend = pwmParam
         # Pin number XX (like GPIOXX)
-        gpio.setmode(gpio.BCM) # Sets up the board to use the GPIOXX pin numbering scheme
         # Needs to be a PWM pin
         self.controlPin = controlPinParam
-        # Setup pin for output
-        gpio.setup(self.controlPin, gpio.OUT)
-        # Set up PWM (throw error if not PWM pin)
-        self.isSetupCorrectly = False
-        self.pwm = None
-        try:
-            self.pwm = gpio.PWM(self.controlPin, HzParam)
-            self.isSetupCorrectly = True
-        except:
-            # Setup didn't work, something's wrong
-            self.isSetupCorrectly = False
+        # Set up PWM (None if the pin is already in use or can't do PWM)
+        self.pwm = self.pwmBackend.openChannel(self.controlPin, HzParam)
+        self.isSetupCorrectly = self.pwm is not None
 
         # Save duty cycle variables for stopping, moving clockwise, and moving counterclockwise
         self.neutralDutyCycle = neutralDutyCyclePercentParam
         self.maxCWDutyCycle = maxCWDutyCyclePercentParam
         self.maxCCWDutyCycle = maxCCWDutyCyclePercentParam
         self.currentDutyCycle = self.neutralDutyCycle
+        # Duty cycle for every speed from -100 to 100 in steps of 1/DUTY_TABLE_RESOLUTION, so ramping doesn't redo the math on every step
+        self.dutyTable = [self._computeDutyCycle(index / self.DUTY_TABLE_RESOLUTION - 100) for index in range(200 * self.DUTY_TABLE_RESOLUTION + 1)]
         # Start your engines!
         if(self.isSetupCorrectly):
             # Start PWM pin with no servo movement
             self.pwm.start(self.neutralDutyCycle)
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
 
     def getIsSetupCorrectly(self):
@@ -38,76 +49,145 @@ class ServoController:
 
     def ccw(self, speedParam):
         if(self.isSetupCorrectly):
-            self.currentDutyCycle = self.neutralDutyCycle + (self.maxCCWDutyCycle - self.neutralDutyCycle)*speedParam/100
-            self.pwm.ChangeDutyCycle(self.currentDutyCycle)
+            self.currentDutyCycle = self.getDutyCycle(-speedParam)
+            self.pwm.setDutyCycle(self.currentDutyCycle)
 
     def cw(self, speedParam):
         if(self.isSetupCorrectly):
-            self.currentDutyCycle = self.neutralDutyCycle + (self.maxCWDutyCycle - self.neutralDutyCycle)*speedParam/100
-            self.pwm.ChangeDutyCycle(self.currentDutyCycle)
+            self.currentDutyCycle = self.getDutyCycle(speedParam)
+            self.pwm.setDutyCycle(self.currentDutyCycle)
 
     def stop(self):
         if(self.isSetupCorrectly):
             self.currentDutyCycle = self.neutralDutyCycle
-            self.pwm.ChangeDutyCycle(self.currentDutyCycle)
+            self.pwm.setDutyCycle(self.currentDutyCycle)
+
+    # Returns the duty cycle for a speed from -100 to 100 (positive is clockwise, negative is counterclockwise) without changing anything
+    # Looked up in the duty cycle table, so the speed gets rounded to the nearest 1/DUTY_TABLE_RESOLUTION (and limited to -100 to 100)
+    def getDutyCycle(self, speedParam):
+        index = int((speedParam + 100) * self.DUTY_TABLE_RESOLUTION + 0.5)
+        if(index < 0):
+            index = 0
+        elif(index >= len(self.dutyTable)):
+            index = len(self.dutyTable) - 1
+        return self.dutyTable[index]
+
+    def _computeDutyCycle(self, speedParam):
+        if(speedParam >= 0):
+            return self.neutralDutyCycle + (self.maxCWDutyCycle - self.neutralDutyCycle)*speedParam/100
+        return self.neutralDutyCycle + (self.maxCCWDutyCycle - self.neutralDutyCycle)*-speedParam/100
+
+    # Stops the PWM and releases the pin. The servo can't be used after this
+    def close(self):
+        if(self.isSetupCorrectly):
+            self.pwm.stop()
+            self.isSetupCorrectly = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
 
 class DrivingController:
 
     # Ignore all the parameters besides the servoCWPinParam and servoCCWPinParam. The others are just to be able to use this code with servos that use different cycle times and duty cycle percents for neutral, clockwise, and counterclockwise
-    def __init__(self, servoCWPinParam, servoCCWPinParam, HzCWParam=50, neutralDutyCyclePercentCWParam=7.5, maxCWDutyCyclePercentCWParam=10.0, maxCCWDutyCyclePercentCWParam=5.0, HzCCWParam=50, neutralDutyCyclePercentCCWParam=7.5, maxCWDutyCyclePercentCCWParam=10.0, maxCCWDutyCyclePercentCCWParam=5.0):
+    # pwmParam is the PWM backend from PWMlib both servos share (picked the same way as ServoController's). Use PWMlib.SysfsPWMBackend() for hardware PWM
+    # settleTimeParam is how long (in seconds) the servos should sit at neutral after starting before they're ready (see waitUntilReady)
+    def __init__(self, servoCWPinParam, servoCCWPinParam, HzCWParam=50, neutralDutyCyclePercentCWParam=7.5, maxCWDutyCyclePercentCWParam=10.0, maxCCWDutyCyclePercentCWParam=5.0, HzCCWParam=50, neutralDutyCyclePercentCCWParam=7.5, maxCWDutyCyclePercentCCWParam=10.0, maxCCWDutyCyclePercentCCWParam=5.0, gpioParam=None, pwmParam=None, backendParam=None, settleTimeParam=2.0):
+        if(pwmParam is None):
+            pwmParam = Backendlib.getBackend(backendParam).getPWM() if gpioParam is None else PWMlib.SoftwarePWMBackend(gpioParam)
+        self.pwmBackend = pwmParam
+        self.clock = getattr(gpioParam, 'clock', time) if gpioParam is not None else Backendlib.getBackend(backendParam).clock # The settle time runs on the backend's clock, so a VirtualClock doesn't really wait it out
         # Pin number XX (like GPIOXX)
-        gpio.setmode(gpio.BCM) # Sets up the board to use the GPIOXX pin numbering scheme
         # Needs to be a PWM pin
-        self.cwServo = ServoController(servoCWPinParam, HzCWParam, neutralDutyCyclePercentCWParam, maxCWDutyCyclePercentCWParam, maxCCWDutyCyclePercentCWParam)
-        self.ccwServo = ServoController(servoCCWPinParam, HzCCWParam, neutralDutyCyclePercentCCWParam, maxCWDutyCyclePercentCCWParam, maxCCWDutyCyclePercentCCWParam)
-        time.sleep(2)
+        self.cwServo = ServoController(servoCWPinParam, HzCWParam, neutralDutyCyclePercentCWParam, maxCWDutyCyclePercentCWParam, maxCCWDutyCyclePercentCWParam, gpioParam, pwmParam)
+        self.ccwServo = ServoController(servoCCWPinParam, HzCCWParam, neutralDutyCyclePercentCCWParam, maxCWDutyCyclePercentCCWParam, maxCCWDutyCyclePercentCCWParam, gpioParam, pwmParam)
+        # The servos can't report when they're ready, so instead of sleeping here, remember when they will be and let the caller do other setup in the meantime
+        self.readyTime = self.clock.monotonic() + settleTimeParam
         self.isSetupCorrectly = self.cwServo.getIsSetupCorrectly() and self.ccwServo.getIsSetupCorrectly()
+        # Last speeds given to setWheelSpeeds (-100 to 100, positive is forwards)
+        self.speedCW = 0
+        self.speedCCW = 0
+        self.log = None # SampleLoggerlib.SampleLog that every setWheelSpeeds goes in (see setLog)
+        Metricslib.register(self) # Timed while Metricslib is enabled
 
     def getIsSetupCorrectly(self):
         return self.isSetupCorrectly
 
-    def forward(self, speedParamCW, speedParamCCW=None):
+    # Returns True once the servos have had their settle time at neutral
+    def isReady(self):
+        return self.clock.monotonic() >= self.readyTime
+
+    # Waits out whatever is left of the settle time (nothing if it's already gone by)
+    def waitUntilReady(self):
+        waitTime = self.readyTime - self.clock.monotonic()
+        if(waitTime > 0):
+            self.clock.sleep(waitTime)
+
+    # Sets both wheels in one update, so they never get commanded inconsistently (one already changed and the other not yet)
+    # Speeds go from -100 to 100, positive for driving forwards and negative for backwards
+    def setWheelSpeeds(self, speedParamCW, speedParamCCW):
         if(self.isSetupCorrectly):
-            # Only need to set one speed for forwards and backwards
-            if(speedParamCCW is None):
-                speedParamCCW = speedParamCW
-            self.cwServo.cw(speedParamCW)
-            self.ccwServo.ccw(speedParamCCW)
+            self.speedCW = speedParamCW
+            self.speedCCW = speedParamCCW
+            self.cwServo.currentDutyCycle = self.cwServo.getDutyCycle(speedParamCW)
+            self.ccwServo.currentDutyCycle = self.ccwServo.getDutyCycle(-speedParamCCW) # This one's mounted the other way around
+            self.pwmBackend.setDutyCycles([(self.cwServo.pwm, self.cwServo.currentDutyCycle), (self.ccwServo.pwm, self.ccwServo.currentDutyCycle)])
+            if(self.log is not None):
+                self.log.append((speedParamCW, speedParamCCW), self.clock.monotonic_ns()) # On the backend's clock, like the sensors' samples
+
+    # Records every wheel speed change in a SampleLoggerlib.SampleLog with 'wheels' fields (None to stop), timestamped with the backend's clock
+    def setLog(self, logParam):
+        self.log = logParam
+
+    def forward(self, speedParamCW, speedParamCCW=None):
+        # Only need to set one speed for forwards and backwards
+        if(speedParamCCW is None):
+            speedParamCCW = speedParamCW
+        self.setWheelSpeeds(speedParamCW, speedParamCCW)
 
     def backward(self, speedParamCW, speedParamCCW=None):
-        if(self.isSetupCorrectly):
-            # Only need to set one speed for forwards and backwards
-            if(speedParamCCW is None):
-                speedParamCCW = speedParamCW
-            self.cwServo.ccw(speedParamCW)
-            self.ccwServo.cw(speedParamCCW)
+        # Only need to set one speed for forwards and backwards
+        if(speedParamCCW is None):
+            speedParamCCW = speedParamCW
+        self.setWheelSpeeds(-speedParamCW, -speedParamCCW)
 
     def turnLeft(self, speedParamCW, speedParamCCW=None):
-        if(self.isSetupCorrectly):
-            # Only need to set one speed for forwards and backwards
-            if(speedParamCCW is None):
-                speedParamCCW = speedParamCW
-            self.cwServo.cw(speedParamCW)
-            self.ccwServo.cw(speedParamCCW)
+        # Only need to set one speed for forwards and backwards
+        if(speedParamCCW is None):
+            speedParamCCW = speedParamCW
+        self.setWheelSpeeds(speedParamCW, -speedParamCCW)
 
     def turnRight(self, speedParamCW, speedParamCCW=None):
-        if(self.isSetupCorrectly):
-            # Only need to set one speed for forwards and backwards
-            if(speedParamCCW is None):
-                speedParamCCW = speedParamCW
-            self.cwServo.ccw(speedParamCW)
-            self.ccwServo.ccw(speedParamCCW)
+        # Only need to set one speed for forwards and backwards
+        if(speedParamCCW is None):
+            speedParamCCW = speedParamCW
+        self.setWheelSpeeds(-speedParamCW, speedParamCCW)
 
     def stop(self):
-        if(self.isSetupCorrectly):
-            self.cwServo.stop()
-            self.ccwServo.stop()
+        self.setWheelSpeeds(0, 0)
+
+    # Stops both servos' PWM and releases their pins
+    def close(self):
+        self.cwServo.close()
+        self.ccwServo.close()
+        self.isSetupCorrectly = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
 
 
 
 if __name__ == "__main__":
 
     testIndividualServos = True
+    useHardwarePWM = False # Hardware PWM needs the pwm-2chan overlay and GPIO18/GPIO19 (see PWMlib.SysfsPWMBackend)
 
     servo1PWMPin = 18
     servo2PWMPin = 13
@@ -168,9 +248,13 @@ if __name__ == "__main__":
                 print("Servo 2 not set up correctly")
 
         else:
-            twoMotors = DrivingController(servo1PWMPin,servo2PWMPin)
+            if(useHardwarePWM):
+                twoMotors = DrivingController(18, 19, pwmParam=PWMlib.SysfsPWMBackend())
+            else:
+                twoMotors = DrivingController(servo1PWMPin,servo2PWMPin)
 
             if(twoMotors.getIsSetupCorrectly()):
+                twoMotors.waitUntilReady()
                 twoMotors.stop()
                 time.sleep(2)
                 # Test CW motion
@@ -200,4 +284,4 @@ if __name__ == "__main__":
             else:
                 print("Both motors not set up correctly")
     finally:
-        gpio.cleanup()
+        GPIOSessionlib.getSession().close()
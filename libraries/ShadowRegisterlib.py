@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shadow copies of i2c devices' configuration registers, so settings that haven't changed don't get written again and read-modify-writes don't need the read.
+   AccelerometerSensor and ColorSensor keep their settings in these. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import threading
+import weakref
+
+
+class ShadowRegisters:
+    """The last value written to (or read from) each configuration register of one device. Writes that wouldn't change a register are skipped,
+    and a register is only read from the device the first time it's needed (or after invalidate()).
+    Only works if everything that writes those registers goes through here, which is why there's one per device (see getShadowRegisters).
+    The functions that talk to the device are passed in on each call, so every driver sharing the device uses its own"""
+
+    def __init__(self):
+        self.values = {} # register -> value the device has
+        self.lock = threading.RLock() # Hold it (along with the bus lock) across a whole read-modify-write
+        self.reads = 0
+        self.writes = 0
+        self.skippedWrites = 0
+
+    # Returns what's in a register, reading the device with readFunctionParam(register) only if it hasn't been seen yet
+    def read(self, registerParam, readFunctionParam):
+        with self.lock:
+            value = self.values.get(registerParam)
+            if(value is None):
+                value = readFunctionParam(registerParam)
+                self.values[registerParam] = value
+                self.reads += 1
+            return value
+
+    # Writes a register with writeFunctionParam(register, value) unless it already has that value. Returns True if it was written
+    def write(self, registerParam, valueParam, writeFunctionParam):
+        valueParam &= 0xFF
+        with self.lock:
+            if(self.values.get(registerParam) == valueParam):
+                self.skippedWrites += 1
+                return False
+            writeFunctionParam(registerParam, valueParam)
+            self.values[registerParam] = valueParam
+            self.writes += 1
+            return True
+
+    # Sets the bits of a register that are in maskParam to valueParam's, leaving the others alone, without reading it back first
+    # Returns True if it was written
+    def update(self, registerParam, maskParam, valueParam, readFunctionParam, writeFunctionParam):
+        with self.lock:
+            return self.write(registerParam, (self.read(registerParam, readFunctionParam) & ~maskParam) | (valueParam & maskParam), writeFunctionParam)
+
+    # Returns what a register would hold with the bits in maskParam set to valueParam's (without writing anything)
+    def modified(self, registerParam, maskParam, valueParam, readFunctionParam):
+        return (self.read(registerParam, readFunctionParam) & ~maskParam) | (valueParam & maskParam)
+
+    # Forgets a register (or all of them if it's None), so the next read comes from the device. For after something else has changed it, like a reset
+    def invalidate(self, registerParam=None):
+        with self.lock:
+            if(registerParam is None):
+                self.values.clear()
+            else:
+                self.values.pop(registerParam, None)
+
+    # Returns how many reads and writes went to the device and how many writes were skipped
+    def getStats(self):
+        return {'reads': self.reads, 'writes': self.writes, 'skippedWrites': self.skippedWrites}
+
+
+shadows = weakref.WeakKeyDictionary() # i2c bus -> {address -> ShadowRegisters for that device}, dropped along with the bus
+shadowsLock = threading.Lock()
+
+# Returns the ShadowRegisters shared by everything using the device at addressParam on busParam, making it the first time
+def getShadowRegisters(busParam, addressParam):
+    with shadowsLock:
+        devices = shadows.setdefault(busParam, {})
+        shadow = devices.get(addressParam)
+        if(shadow is None):
+            shadow = ShadowRegisters()
+            devices[addressParam] = shadow
+        return shadow
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    import Backendlib
+    from AccelerometerSensorlib import AccelerometerSensor
+
+    backend = Backendlib.setBackend(Backendlib.SimulatedBackend())
+    accelerometer = AccelerometerSensor()
+    for i in range(100): # Adaptive code asking for the same settings over and over, and now and then for different ones
+        accelerometer.applyProfile('lowPower' if i % 50 == 49 else 'highRate')
+    print(accelerometer.shadow.getStats(), '{0} i2c transactions'.format(backend.i2c.transactions))
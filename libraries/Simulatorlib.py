@@ -0,0 +1,871 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Simulated hardware to help run and benchmark the other libraries without a Raspberry Pi. Intended function/example can be seen at bottom of file
+   @version 0.0.1
+"""
+import heapq
+import math
+import threading
+import time
+
+
+class VirtualClock:
+    """A clock that only moves forward when it's told to (with advance() or sleep()), so simulations come out the same on every run and never really wait.
+    Has the same functions as the time module that the simulated devices use, so either one can be passed in as a clock"""
+
+    def __init__(self, startParam=0.0):
+        self.nanoseconds = int(startParam * 1e9)
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def advance(self, secondsParam):
+        with self.lock:
+            self.nanoseconds += int(round(secondsParam * 1e9))
+            nanoseconds = self.nanoseconds
+        for listener in self.listeners:
+            listener(nanoseconds)
+
+    # listenerParam gets called with the new time in nanoseconds every time the clock moves (like Replaylib's LogReplayer, to play back what happened up to then)
+    def addListener(self, listenerParam):
+        self.listeners.append(listenerParam)
+
+    def sleep(self, secondsParam):
+        if(secondsParam > 0):
+            self.advance(secondsParam)
+
+    def monotonic(self):
+        return self.nanoseconds / 1e9
+
+    def monotonic_ns(self):
+        return self.nanoseconds
+
+    def perf_counter(self):
+        return self.nanoseconds / 1e9
+
+    def perf_counter_ns(self):
+        return self.nanoseconds
+
+
+class SimulatedPWM:
+    """A stand-in for RPi.GPIO's PWM objects that remembers its frequency and duty cycle"""
+
+    def __init__(self, gpioParam, channelParam, frequencyParam):
+        self.gpio = gpioParam
+        self.channel = channelParam
+        self.frequency = frequencyParam
+        self.dutyCycle = 0
+        self.isRunning = False
+
+    def start(self, dutyCycle):
+        self.dutyCycle = dutyCycle
+        self.isRunning = True
+
+    def ChangeDutyCycle(self, dutyCycle):
+        self.dutyCycle = dutyCycle
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.isRunning = False
+
+
+class SimulatedGPIO:
+    """A stand-in for the RPi.GPIO module. Pins can be driven from outside with setInput(), and an HC-SR04 can be faked by scripting the echo pulses it should return with scriptEcho()"""
+
+    # Same constants RPi.GPIO uses, so code can't tell the difference
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    # How long before an edge is due the player thread stops sleeping and starts spinning, so edges land within a few microseconds of their scripted time
+    SPIN_WINDOW_NS = 500000
+
+    # setupLatencyParam is how long (in seconds) setup() and cleanup() should take, to model the cost of (re)configuring pins on the real board
+    # clockParam is the clock sensors time the pins with. On a VirtualClock, scripted echoes play out right away inside the trigger pulse, moving the clock along as they go,
+    # so a ping takes no real time and comes out the same every run
+    def __init__(self, setupLatencyParam=0.0, clockParam=None):
+        self.setupLatencyNs = int(setupLatencyParam * 1e9)
+        self.clock = time if clockParam is None else clockParam
+        self.isVirtualClock = hasattr(self.clock, 'advance')
+        self.mode = None
+        self.directions = {} # pin -> IN or OUT
+        self.levels = {} # pin -> LOW or HIGH
+        self.eventDetects = {} # pin -> [edge, callbacks]
+        self.echoScripts = {} # trigPin -> [echoPin, list of (delay, width) pulses still to play]
+        self.lock = threading.RLock()
+
+        # Scheduled edges are kept in a heap of (dueTimeNs, sequence, pin, level) and played back by one thread
+        self.scheduledEdges = []
+        self.edgeSequence = 0
+        self.edgeCondition = threading.Condition(self.lock)
+        self.edgeThread = None
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=PUD_OFF, initial=None):
+        self._modelLatency()
+        with self.lock:
+            for pin in self._asList(channel):
+                self.directions[pin] = direction
+                if(initial is not None):
+                    self.levels[pin] = initial
+                elif(pin not in self.levels):
+                    self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def input(self, channel):
+        return self.levels.get(channel, self.LOW)
+
+    def output(self, channel, value):
+        with self.lock:
+            for pin in self._asList(channel):
+                oldLevel = self.levels.get(pin, self.LOW)
+                self.levels[pin] = self.HIGH if value else self.LOW
+                # The falling edge of a trigger pulse is when an HC-SR04 sends out its ping
+                if(oldLevel and not value and pin in self.echoScripts):
+                    self._playEcho(pin)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        with self.lock:
+            self.eventDetects[channel] = [edge, []]
+        if(callback is not None):
+            self.add_event_callback(channel, callback)
+
+    def add_event_callback(self, channel, callback):
+        with self.lock:
+            self.eventDetects[channel][1].append(callback)
+
+    def remove_event_detect(self, channel):
+        with self.lock:
+            self.eventDetects.pop(channel, None)
+
+    def cleanup(self, channel=None):
+        self._modelLatency()
+        with self.lock:
+            if(channel is None):
+                pins = list(self.directions)
+            else:
+                pins = self._asList(channel)
+            for pin in pins:
+                self.directions.pop(pin, None)
+                self.eventDetects.pop(pin, None)
+            if(channel is None):
+                self.mode = None
+
+    def PWM(self, channel, frequency):
+        return SimulatedPWM(self, channel, frequency)
+
+    # Drive an input pin to a level from outside (like a sensor would), firing any edge callbacks
+    def setInput(self, pin, level):
+        level = self.HIGH if level else self.LOW
+        with self.lock:
+            oldLevel = self.levels.get(pin, self.LOW)
+            self.levels[pin] = level
+            detect = self.eventDetects.get(pin)
+            if(detect is None or oldLevel == level):
+                return
+            edge, callbacks = detect
+            if(edge == self.BOTH or (edge == self.RISING and level) or (edge == self.FALLING and not level)):
+                callbacks = list(callbacks)
+            else:
+                callbacks = []
+        for callback in callbacks:
+            callback(pin)
+
+    # Schedule an input pin to change level delaySeconds from now
+    def scheduleInput(self, pin, level, delaySeconds):
+        with self.lock:
+            dueTime = time.perf_counter_ns() + int(delaySeconds * 1e9)
+            heapq.heappush(self.scheduledEdges, (dueTime, self.edgeSequence, pin, level))
+            self.edgeSequence += 1
+            if(self.edgeThread is None):
+                self.edgeThread = threading.Thread(target=self._edgePlayer, daemon=True)
+                self.edgeThread.start()
+            self.edgeCondition.notify()
+
+    # Script the echo pulses an HC-SR04 on trigPin/echoPin returns, one per trigger pulse
+    # Each pulse is a (delay, width) pair in seconds, or None for an echo that never comes back
+    # pulses can also be a function that gets called for each trigger pulse and returns the pulse
+    def scriptEcho(self, trigPin, echoPin, pulses):
+        with self.lock:
+            if(callable(pulses)):
+                self.echoScripts[trigPin] = [echoPin, pulses]
+            elif(trigPin in self.echoScripts and not callable(self.echoScripts[trigPin][1])):
+                self.echoScripts[trigPin][1].extend(pulses)
+            else:
+                self.echoScripts[trigPin] = [echoPin, list(pulses)]
+
+    def _playEcho(self, trigPin):
+        echoPin, pulses = self.echoScripts[trigPin]
+        if(callable(pulses)):
+            pulse = pulses()
+        elif(len(pulses) == 0):
+            return
+        else:
+            pulse = pulses.pop(0)
+        if(pulse is None):
+            return
+        delay, width = pulse
+        if(self.isVirtualClock):
+            self.clock.advance(delay)
+            self.setInput(echoPin, self.HIGH)
+            self.clock.advance(width)
+            self.setInput(echoPin, self.LOW)
+            return
+        self.scheduleInput(echoPin, self.HIGH, delay)
+        self.scheduleInput(echoPin, self.LOW, delay + width)
+
+    def _edgePlayer(self):
+        while(True):
+            with self.lock:
+                while(len(self.scheduledEdges) == 0):
+                    self.edgeCondition.wait()
+                dueTime = self.scheduledEdges[0][0]
+                waitTime = dueTime - time.perf_counter_ns() - self.SPIN_WINDOW_NS
+                if(waitTime > 0):
+                    # Sleep until close to the next edge (or until an earlier one is scheduled)
+                    self.edgeCondition.wait(waitTime / 1e9)
+                    continue
+            while(time.perf_counter_ns() < dueTime):
+                pass
+            with self.lock:
+                dueTime, sequence, pin, level = heapq.heappop(self.scheduledEdges)
+            self.setInput(pin, level)
+
+    def _modelLatency(self):
+        if(self.setupLatencyNs > 0):
+            endTime = time.perf_counter_ns() + self.setupLatencyNs
+            while(time.perf_counter_ns() < endTime):
+                pass
+
+    def _asList(self, channel):
+        if(isinstance(channel, (list, tuple))):
+            return list(channel)
+        return [channel]
+
+
+class SimulatedI2C:
+    """A stand-in for busio.I2C. Passes register reads and writes on to the simulated devices attached to it, and counts transactions and bytes.
+    Can also model how long each transaction takes on the real bus"""
+
+    # frequencyParam is the bus clock in Hz to model transaction times with (None to not model them; the Raspberry Pi defaults to 100000)
+    # clockParam keeps time for the bus and the devices on it: the time module, or a VirtualClock so the modeled time passes without really waiting
+    def __init__(self, frequencyParam=None, clockParam=time):
+        self.devices = {} # address -> simulated device
+        self.lock = threading.Lock()
+        self.clock = clockParam
+        self.bitTime = 0.0 if frequencyParam is None else 1.0 / frequencyParam # Seconds per clock pulse
+        self.transactions = 0
+        self.bytesWritten = 0
+        self.bytesRead = 0
+        self.busTime = 0.0 # Total modeled time spent on transactions, in seconds
+
+    def try_lock(self):
+        return self.lock.acquire(False)
+
+    def unlock(self):
+        self.lock.release()
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def deinit(self):
+        pass
+
+    def attach(self, addressParam, deviceParam):
+        self.devices[addressParam] = deviceParam
+
+    # A write is a register address followed by the bytes to write there
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        self.bytesWritten += len(data)
+        self.countTransaction(len(data))
+        self._getDevice(address).writeRegisters(data[0], data[1:])
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        self.bytesRead += end - start
+        self.countTransaction(end - start)
+        buffer[start:end] = self._getDevice(address).readRegisters(None, end - start)
+
+    # Writes the register address and reads back from it in one transaction (a repeated start)
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        registerBytes = bytes(buffer_out[out_start:out_end])
+        in_end = len(buffer_in) if in_end is None else in_end
+        self.bytesWritten += len(registerBytes)
+        self.bytesRead += in_end - in_start
+        self.countTransaction(len(registerBytes) + in_end - in_start, True)
+        buffer_in[in_start:in_end] = self._getDevice(address).readRegisters(registerBytes[0], in_end - in_start)
+
+    # Counts one transaction of byteCountParam data bytes, taking as long as it would on the real bus
+    def countTransaction(self, byteCountParam, repeatedStartParam=False):
+        self.transactions += 1
+        if(self.bitTime > 0):
+            # 9 clock pulses (8 bits and the ack) for the address and every data byte, plus about one each for the start and stop (and a second address after a repeated start)
+            addressBytes = 2 if repeatedStartParam else 1
+            duration = (9 * (addressBytes + byteCountParam) + 2 + addressBytes - 1) * self.bitTime
+            self.busTime += duration
+            if(isinstance(self.clock, VirtualClock)):
+                self.clock.advance(duration)
+            else:
+                endTime = time.perf_counter() + duration
+                while(time.perf_counter() < endTime):
+                    pass
+
+    def _getDevice(self, addressParam):
+        device = self.devices.get(addressParam)
+        if(device is None or self.clock.monotonic() < device.readyTime):
+            raise OSError(121, 'No i2c device at address 0x{0:02x}'.format(addressParam)) # Same error Linux gives (Remote I/O error)
+        return device
+
+
+class SimulatedI2CDevice:
+    """Base for the simulated i2c devices: a bank of 256 registers that auto-increments on multi-byte reads and writes"""
+
+    # startupDelayParam is how long (in seconds) the device ignores the bus after it's made, like a real one does while it powers up
+    def __init__(self, i2cParam, addressParam, startupDelayParam=0.0):
+        self.i2c = i2cParam
+        self.registers = bytearray(256)
+        self.registerPointer = 0
+        self.readyTime = startupDelayParam if i2cParam is None else i2cParam.clock.monotonic() + startupDelayParam
+        if(i2cParam is not None):
+            i2cParam.attach(addressParam, self)
+
+    # Reads countParam bytes starting at registerParam (or wherever the last access left off if it's None)
+    def readRegisters(self, registerParam, countParam):
+        if(registerParam is not None):
+            self.registerPointer = registerParam
+        data = bytearray(countParam)
+        for i in range(countParam):
+            data[i] = self.readRegister(self.registerPointer)
+            self.registerPointer = self.nextRegister(self.registerPointer)
+        return data
+
+    def writeRegisters(self, registerParam, dataParam):
+        self.registerPointer = registerParam
+        for value in dataParam:
+            self.writeRegister(self.registerPointer, value)
+            self.registerPointer = self.nextRegister(self.registerPointer)
+
+    # Override these for registers that do more than hold a value
+    def readRegister(self, registerParam):
+        return self.registers[registerParam]
+
+    def writeRegister(self, registerParam, valueParam):
+        self.registers[registerParam] = valueParam
+
+    def nextRegister(self, registerParam):
+        return (registerParam + 1) & 0xFF
+
+    # For the driver-level properties that don't go through the bus functions: counts countParam register reads of byteCountParam bytes each
+    def _countTransaction(self, countParam=1, byteCountParam=1):
+        if(self.i2c is not None):
+            for i in range(countParam):
+                self.i2c.countTransaction(1 + byteCountParam, True)
+
+    # Same, for countParam single register writes
+    def _countWrites(self, countParam=1):
+        if(self.i2c is not None):
+            for i in range(countParam):
+                self.i2c.countTransaction(2)
+
+
+# For each RGB byte, the channel level (0 to 255, before the 2.5 gamma) that comes out closest to it
+RGB_GAMMA = [min(255, int(pow(level / 255, 2.5) * 255)) for level in range(256)]
+RGB_LEVELS = [min(range(256), key=lambda level: abs(RGB_GAMMA[level] - value)) for value in range(256)]
+
+class SimulatedTCS34725(SimulatedI2CDevice):
+    """A stand-in for adafruit_tcs34725.TCS34725. The raw channel counts can be set with setRaw().
+    Like the real sensor, the data registers read as zeros over the bus until ENABLE has both PON and AEN set (the driver properties turn it on for themselves)"""
+
+    GAINS = [1, 4, 16, 60] # Gain for each CONTROL register value
+
+    def __init__(self, i2cParam=None, address=0x29, startupDelayParam=0.0):
+        SimulatedI2CDevice.__init__(self, i2cParam, address, startupDelayParam)
+        self.registers[0x12] = 0x44 # ID
+        self.registers[0x01] = 0xFF # ATIME: one 2.4ms cycle
+        self.glass_attenuation = 1.0
+        self.setRaw(300, 200, 100, 700)
+
+    # Set the raw counts the sensor should read
+    def setRaw(self, redParam, greenParam, blueParam, clearParam):
+        self.red, self.green, self.blue, self.clear = redParam, greenParam, blueParam, clearParam
+        # Also in the data registers, clear first, 16 bits each, low byte first
+        for i, value in enumerate((clearParam, redParam, greenParam, blueParam)):
+            self.registers[0x14 + 2 * i] = value & 0xFF
+            self.registers[0x15 + 2 * i] = (value >> 8) & 0xFF
+
+    # Sets raw counts that ColorSensor.getRGB (and color_rgb_bytes) read back as these RGB bytes, as near as the gamma curve allows
+    def setRGB(self, redParam, greenParam, blueParam):
+        self.setRaw(*[10 * RGB_LEVELS[value] for value in (redParam, greenParam, blueParam)], 2560) # A clear count of 2560 makes each 10 counts one step of the normalized channel
+
+    # Register addresses come in a command byte (0x80, plus 0x20 for auto-increment), so take those bits off
+    def readRegisters(self, registerParam, countParam):
+        return SimulatedI2CDevice.readRegisters(self, None if registerParam is None else registerParam & 0x1F, countParam)
+
+    def writeRegisters(self, registerParam, dataParam):
+        SimulatedI2CDevice.writeRegisters(self, registerParam & 0x1F, dataParam)
+
+    def readRegister(self, registerParam):
+        if(0x14 <= registerParam <= 0x1B and self.registers[0x00] & 0x03 != 0x03):
+            return 0
+        return self.registers[registerParam]
+
+    # Integration time (ms) and gain are kept in their registers (ATIME and CONTROL), so setting them through the bus or these properties comes to the same thing
+    # Setting them through the properties costs a register write, like it does with the Adafruit library
+    @property
+    def integration_time(self):
+        return 2.4 * (256 - self.registers[0x01])
+
+    @integration_time.setter
+    def integration_time(self, value):
+        self._countWrites()
+        self.registers[0x01] = int(256 - value / 2.4) & 0xFF
+
+    @property
+    def gain(self):
+        return self.GAINS[self.registers[0x0F] & 0x03]
+
+    @gain.setter
+    def gain(self, value):
+        self._countWrites()
+        self.registers[0x0F] = self.GAINS.index(value)
+
+    @property
+    def color_raw(self):
+        self._countTransaction(4, 2)
+        return (self.red, self.green, self.blue, self.clear)
+
+    @property
+    def color_rgb_bytes(self):
+        r, g, b, clear = self.color_raw
+        if(clear == 0):
+            return (0, 0, 0)
+        return tuple(min(255, int(pow(int(channel / clear * 256) / 255, 2.5) * 255)) for channel in (r, g, b))
+
+    @property
+    def color_temperature(self):
+        return self._temperatureAndLux()[1]
+
+    @property
+    def lux(self):
+        return self._temperatureAndLux()[0]
+
+    # Same DN40 math the Adafruit library uses
+    def _temperatureAndLux(self):
+        r, g, b, clear = self.color_raw
+        ir = (r + g + b - clear) / 2 if r + g + b > clear else 0.0
+        r2, g2, b2 = r - ir, g - ir, b - ir
+        countsPerLux = (self.integration_time * self.gain) / (self.glass_attenuation * 310.0)
+        lux = (0.136 * r2 + 1.0 * g2 - 0.444 * b2) / countsPerLux
+        temperature = 3810 * b2 / r2 + 1391 if r2 != 0 else None
+        return lux, temperature
+
+
+class SimulatedMMA8451(SimulatedI2CDevice):
+    """A stand-in for adafruit_mma8451.MMA8451, down to the registers and the 32 sample FIFO. The acceleration it reads can be set with setAcceleration(),
+    or with setAccelerationFunction() to have every sample computed from its time (for vibrations and the like)"""
+
+    # Same constants the Adafruit library uses
+    RANGE_2G = 0
+    RANGE_4G = 1
+    RANGE_8G = 2
+    PL_PUF = 0
+    PL_PUB = 1
+    PL_PDF = 2
+    PL_PDB = 3
+    PL_LRF = 4
+    PL_LRB = 5
+    PL_LLF = 6
+    PL_LLB = 7
+
+    DATA_RATES = [800, 400, 200, 100, 50, 12.5, 6.25, 1.56] # Hz for each data rate code
+    COUNTS_PER_G = [4096, 2048, 1024] # 14 bit counts per g for each range code
+    FIFO_SIZE = 32
+
+    # The samples are timed with the i2c bus's clock (or the time module if there isn't a bus)
+    def __init__(self, i2cParam=None, address=0x1d, startupDelayParam=0.0):
+        SimulatedI2CDevice.__init__(self, i2cParam, address, startupDelayParam)
+        self.clock = time if i2cParam is None else i2cParam.clock
+        self.registers[0x0D] = 0x1A # WHO_AM_I
+        self.registers[0x0E] = self.RANGE_4G # XYZ_DATA_CFG, same setup the Adafruit library does
+        self.registers[0x2A] = 0x01 | 0x04 # CTRL_REG1: active, 800Hz, low noise
+        self.x, self.y, self.z = 0.0, 0.0, 9.80665
+        self.accelerationFunction = None
+        self.fifo = []
+        self.fifoOverflowed = False
+        self.currentSample = bytearray(6)
+        self.lastSampleTime = self.clock.monotonic()
+
+    # Set the acceleration the sensor should read in m/s^2
+    def setAcceleration(self, xParam, yParam, zParam):
+        self.x, self.y, self.z = xParam, yParam, zParam
+
+    # functionParam is called with the time of each sample (the clock's monotonic() seconds) and returns (x, y, z) in m/s^2
+    def setAccelerationFunction(self, functionParam):
+        self.accelerationFunction = functionParam
+
+    @property
+    def range(self):
+        return self.registers[0x0E] & 0x03
+
+    # Like the Adafruit library, changing the range or data rate reads CTRL_REG1, puts the sensor in standby, writes the setting, and makes it active again
+    @range.setter
+    def range(self, value):
+        self._countTransaction()
+        self._countWrites(3)
+        self.registers[0x0E] = (self.registers[0x0E] & ~0x03) | value
+
+    @property
+    def data_rate(self):
+        return (self.registers[0x2A] >> 3) & 0x07
+
+    @data_rate.setter
+    def data_rate(self, value):
+        self._countTransaction()
+        self._countWrites(2)
+        self.registers[0x2A] = (self.registers[0x2A] & ~0x38) | (value << 3)
+
+    @property
+    def acceleration(self):
+        self._countTransaction(1, 6)
+        return self._accelerationAt(self.clock.monotonic())
+
+    # Rough version of the sensor's portrait/landscape detection
+    @property
+    def orientation(self):
+        self._countTransaction()
+        x, y, z = self._accelerationAt(self.clock.monotonic())
+        back = 1 if z < 0 else 0
+        if(abs(y) >= abs(x)):
+            return (self.PL_PUF if y >= 0 else self.PL_PDF) + back
+        return (self.PL_LRF if x < 0 else self.PL_LLF) + back
+
+    def readRegister(self, registerParam):
+        fifoMode = self.registers[0x09] >> 6
+        if(registerParam == 0x00):
+            self._takeSamples()
+            if(fifoMode != 0): # F_STATUS: overflow flag and sample count
+                return (0x80 if self.fifoOverflowed else 0) | len(self.fifo)
+            return 0x0F if len(self.fifo) > 0 else 0 # STATUS: new x/y/z data ready
+        if(0x01 <= registerParam <= 0x06):
+            if(registerParam == 0x01): # Reading OUT_X_MSB latches the next sample
+                self._takeSamples()
+                if(fifoMode != 0):
+                    if(len(self.fifo) > 0):
+                        self.currentSample = self.fifo.pop(0)
+                        self.fifoOverflowed = False
+                else:
+                    self.currentSample = self.fifo[-1] if len(self.fifo) > 0 else self._encode(self._accelerationAt(self.clock.monotonic()))
+                    self.fifo = []
+            return self.currentSample[registerParam - 1]
+        return self.registers[registerParam]
+
+    # With the FIFO on, the register pointer wraps from OUT_Z_LSB back to OUT_X_MSB so the whole FIFO can be read in one burst
+    def nextRegister(self, registerParam):
+        if(registerParam == 0x06 and self.registers[0x09] >> 6 != 0):
+            return 0x01
+        return (registerParam + 1) & 0xFF
+
+    # Adds the samples the sensor would have taken since the last read to the FIFO
+    def _takeSamples(self):
+        now = self.clock.monotonic()
+        if(not self.registers[0x2A] & 0x01): # In standby, not sampling
+            self.lastSampleTime = now
+            return
+        period = 1.0 / self.DATA_RATES[self.data_rate]
+        newSamples = int((now - self.lastSampleTime) / period)
+        if(newSamples == 0):
+            return
+        # Only the last FIFO_SIZE samples could still be in the FIFO, so don't bother computing older ones
+        firstSample = max(0, newSamples - self.FIFO_SIZE)
+        for i in range(firstSample, newSamples):
+            self.fifo.append(self._encode(self._accelerationAt(self.lastSampleTime + (i + 1) * period)))
+        if(len(self.fifo) > self.FIFO_SIZE or firstSample > 0):
+            self.fifoOverflowed = True
+            self.fifo = self.fifo[-self.FIFO_SIZE:]
+        self.lastSampleTime += newSamples * period
+
+    def _accelerationAt(self, timeParam):
+        if(self.accelerationFunction is not None):
+            return self.accelerationFunction(timeParam)
+        return (self.x, self.y, self.z)
+
+    # Turns an (x, y, z) in m/s^2 into the 6 output register bytes (14 bit, left justified, big endian)
+    def _encode(self, accelerationParam):
+        countsPerMS2 = self.COUNTS_PER_G[self.range] / 9.80665
+        data = bytearray(6)
+        for i in range(3):
+            counts = max(-8192, min(8191, int(round(accelerationParam[i] * countsPerMS2))))
+            value = (counts << 2) & 0xFFFF
+            data[2 * i] = value >> 8
+            data[2 * i + 1] = value & 0xFF
+        return data
+
+
+
+class SimulatedI2CDeviceHandle:
+    """A stand-in for adafruit_bus_device's I2CDevice: locks the bus in a with block and writes to one address"""
+
+    def __init__(self, i2cParam, addressParam):
+        self.i2c = i2cParam
+        self.address = addressParam
+
+    def write(self, buf, *, start=0, end=None):
+        self.i2c.writeto(self.address, buf, start=start, end=end)
+
+    def __enter__(self):
+        while(not self.i2c.try_lock()):
+            pass
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.i2c.unlock()
+        return False
+
+
+class SimulatedSSD1306(SimulatedI2CDevice):
+    """A stand-in for adafruit_ssd1306.SSD1306_I2C. Keeps the display's memory (ram, one byte per column per page) and understands the
+    column/page addressing commands, so what ends up on the "screen" can be checked. The SimulatedI2C it's attached to counts the bytes sent"""
+
+    def __init__(self, width, height, i2c, addr=0x3c, startupDelayParam=0.0):
+        SimulatedI2CDevice.__init__(self, i2c, addr, startupDelayParam)
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.i2c_device = SimulatedI2CDeviceHandle(i2c, addr)
+        self.buffer = bytearray(1 + width * self.pages) # Like the Adafruit driver, the first byte is the data control byte
+        self.buffer[0] = 0x40
+        self.columnWindow = [0, width - 1]
+        self.pageWindow = [0, self.pages - 1]
+        self.column = 0
+        self.page = 0
+        self.pendingCommand = [] # Command bytes waiting for their arguments
+
+    # Writes are a control byte (0x00 or 0x80 for commands, 0x40 for display data) followed by bytes
+    def writeRegisters(self, registerParam, dataParam):
+        if(registerParam & 0x40):
+            for value in dataParam:
+                self._writeData(value)
+        else:
+            for value in dataParam:
+                self._writeCommand(value)
+
+    def write_cmd(self, cmd):
+        self.i2c_device.write(bytes((0x80, cmd)))
+
+    def fill(self, color):
+        value = 0xFF if color else 0x00
+        for i in range(1, len(self.buffer)):
+            self.buffer[i] = value
+
+    def show(self):
+        self.write_cmd(0x21)
+        self.write_cmd(0)
+        self.write_cmd(self.width - 1)
+        self.write_cmd(0x22)
+        self.write_cmd(0)
+        self.write_cmd(self.pages - 1)
+        with self.i2c_device:
+            self.i2c_device.write(self.buffer)
+
+    # Returns the display's memory as a PIL image, to check what it's showing
+    def getImage(self):
+        from PIL import Image
+        image = Image.new('1', (self.width, self.height))
+        pixels = image.load()
+        for page in range(self.pages):
+            for column in range(self.width):
+                value = self.ram[page * self.width + column]
+                for bit in range(8):
+                    if(value & (1 << bit)):
+                        pixels[column, page * 8 + bit] = 1
+        return image
+
+    def _writeCommand(self, valueParam):
+        self.pendingCommand.append(valueParam)
+        command = self.pendingCommand[0]
+        if(command == 0x21 or command == 0x22): # Column or page address: two arguments
+            if(len(self.pendingCommand) < 3):
+                return
+            if(command == 0x21):
+                self.columnWindow = self.pendingCommand[1:3]
+                self.column = self.columnWindow[0]
+            else:
+                self.pageWindow = self.pendingCommand[1:3]
+                self.page = self.pageWindow[0]
+        elif(command in (0x20, 0x81, 0xA8, 0xD3, 0xD5, 0xD9, 0xDA, 0xDB, 0x8D)): # One argument commands
+            if(len(self.pendingCommand) < 2):
+                return
+        self.pendingCommand = []
+
+    # Horizontal addressing mode: fill the column window, then move to the next page in the page window
+    def _writeData(self, valueParam):
+        self.ram[self.page * self.width + self.column] = valueParam
+        self.column += 1
+        if(self.column > self.columnWindow[1]):
+            self.column = self.columnWindow[0]
+            self.page += 1
+            if(self.page > self.pageWindow[1]):
+                self.page = self.pageWindow[0]
+
+
+class SimulatedRobot:
+    """A simple kinematic model of the two-wheeled robot driving over a line on the floor, to test line following end to end without a robot.
+    The wheel speeds come from the duty cycles on the servo pins of a PWMlib.SimulatedPWMBackend, and the line sensor pins of a SimulatedGPIO are driven from where each sensor is over the line.
+    Distances are in meters and the line is y = pathParam(x), so it should run mostly along the x axis"""
+
+    NEUTRAL_DUTY_CYCLE = 7.5 # Same as ServoController's defaults
+    FULL_SPEED_DUTY_CHANGE = 2.5
+
+    # servoPinCW is the right wheel's servo (DrivingController's CW servo) and servoPinCCW the left one's, which is mounted the other way around
+    # sensorPins are the line sensors' pins from left to right, sensorSpacingParam apart in a row sensorForwardParam in front of the wheels
+    # maxWheelSpeedParam is how fast (in meters per second) a wheel goes at full speed
+    # clockParam is the clock the robot moves in time with (the GPIO's clock if it's None, so it matches the backend's)
+    def __init__(self, gpioParam, pwmParam, servoPinCW, servoPinCCW, sensorPins, sensorSpacingParam=0.012, sensorForwardParam=0.06, trackWidthParam=0.12,
+                 maxWheelSpeedParam=0.2, lineWidthParam=0.019, pathParam=None, clockParam=None):
+        self.gpio = gpioParam
+        self.clock = getattr(gpioParam, 'clock', time) if clockParam is None else clockParam
+        self.pwm = pwmParam
+        self.servoPinCW = servoPinCW
+        self.servoPinCCW = servoPinCCW
+        self.sensorPins = list(sensorPins)
+        middle = (len(self.sensorPins) - 1) / 2
+        self.sensorOffsets = [(i - middle) * sensorSpacingParam for i in range(len(self.sensorPins))] # To the right of the middle of the row
+        self.sensorForward = sensorForwardParam
+        self.trackWidth = trackWidthParam
+        self.maxWheelSpeed = maxWheelSpeedParam
+        self.lineWidth = lineWidthParam
+        self.path = pathParam if pathParam is not None else (lambda x: 0.15 * math.sin(2.0 * x)) # A gentle S curve
+        self.x = 0.0
+        self.y = self.path(0.0)
+        self.heading = math.atan2(self.path(1e-6) - self.y, 1e-6) # Lined up with the line, in radians counterclockwise from the x axis
+        self.distance = 0.0 # How far the robot has driven
+        self.lock = threading.Lock()
+        self.isRunning = False
+        self.thread = None
+        self.period = None # Longest step the model takes, set by start()
+        self.lastTime = None # Clock time (in nanoseconds) the model was last moved to
+        self.isListening = False
+        self.updateSensors()
+
+    # Moves the robot along for dtParam seconds at the wheel speeds the servos are set to, then updates the line sensor pins
+    def update(self, dtParam):
+        with self.lock:
+            speedRight = self._wheelSpeed(self.servoPinCW, 1)
+            speedLeft = self._wheelSpeed(self.servoPinCCW, -1)
+            speed = (speedLeft + speedRight) / 2
+            turnRate = (speedRight - speedLeft) / self.trackWidth
+            # Move along the arc at the average heading, which is close enough at these time steps
+            heading = self.heading + turnRate * dtParam / 2
+            self.x += speed * math.cos(heading) * dtParam
+            self.y += speed * math.sin(heading) * dtParam
+            self.heading += turnRate * dtParam
+            self.distance += abs(speed) * dtParam
+        self.updateSensors()
+
+    # Sets each line sensor's pin HIGH if it's over the line
+    def updateSensors(self):
+        cosine = math.cos(self.heading)
+        sine = math.sin(self.heading)
+        centerX = self.x + self.sensorForward * cosine
+        centerY = self.y + self.sensorForward * sine
+        for pin, offset in zip(self.sensorPins, self.sensorOffsets):
+            sensorX = centerX + offset * sine
+            sensorY = centerY - offset * cosine
+            self.gpio.setInput(pin, abs(sensorY - self.path(sensorX)) < self.lineWidth / 2)
+
+    # Returns how far (in meters) the middle of the sensor row is to the left of the line (negative if it's to the right)
+    def getLineError(self):
+        centerX = self.x + self.sensorForward * math.cos(self.heading)
+        return self.y + self.sensorForward * math.sin(self.heading) - self.path(centerX)
+
+    # Updates the robot rateParam times a second on a background thread, so it moves in real time on its own
+    # On a VirtualClock there's no thread: the robot moves whenever the clock does, in steps of at most 1 / rateParam seconds
+    def start(self, rateParam=1000):
+        if(self.isRunning):
+            return
+        self.period = 1.0 / rateParam
+        self.lastTime = self.clock.monotonic_ns()
+        self.isRunning = True
+        if(hasattr(self.clock, 'addListener')):
+            if(not self.isListening):
+                self.clock.addListener(self._onClock)
+                self.isListening = True
+        else:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.isRunning = False
+        if(self.thread is not None):
+            self.thread.join()
+        self.thread = None
+
+    def _wheelSpeed(self, pinParam, directionParam):
+        channel = self.pwm.channels.get(pinParam)
+        if(channel is None or not channel.isRunning):
+            return 0.0
+        fraction = (channel.dutyCycle - self.NEUTRAL_DUTY_CYCLE) / self.FULL_SPEED_DUTY_CHANGE
+        return directionParam * max(-1.0, min(1.0, fraction)) * self.maxWheelSpeed
+
+    # Moves the robot up to the clock's new time (VirtualClock listener)
+    def _onClock(self, nanosecondsParam):
+        if(not self.isRunning):
+            return
+        elapsed = (nanosecondsParam - self.lastTime) / 1e9
+        self.lastTime = nanosecondsParam
+        while(elapsed > 0):
+            step = min(elapsed, self.period)
+            self.update(step)
+            elapsed -= step
+
+    def _run(self):
+        while(self.isRunning):
+            self.clock.sleep(self.period)
+            now = self.clock.monotonic_ns()
+            self.update((now - self.lastTime) / 1e9)
+            self.lastTime = now
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    gpio = SimulatedGPIO() # Use like you would use RPi.GPIO
+    gpio.setmode(gpio.BCM)
+    gpio.setup(22, gpio.IN)
+    gpio.add_event_detect(22, gpio.BOTH, callback=lambda pin: print('GPIO{0} is now {1}'.format(pin, gpio.input(pin))))
+
+    gpio.setInput(22, gpio.HIGH) # Pretend something pulled the pin high
+    gpio.scheduleInput(22, gpio.LOW, 0.5) # ...and let it go again in half a second
+    time.sleep(1.0)
+    gpio.cleanup()
+
+    i2c = SimulatedI2C() # Use like you would use busio.I2C
+    accelerometer = SimulatedMMA8451(i2c) # Use like you would use adafruit_mma8451.MMA8451
+    accelerometer.setAcceleration(0.0, 9.80665 * math.sin(0.3), 9.80665 * math.cos(0.3)) # Tilted 0.3 radians
+    print(accelerometer.acceleration, accelerometer.orientation)
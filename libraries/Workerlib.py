@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Runs a sensor in its own process, so reading it never waits on the GIL behind the control loop or the display (and the other way around). Intended function/example can be seen at bottom of file
+   The worker writes its samples into a ring in shared memory with one writer and one reader and no locks, and the main process reads the newest sample or every new one straight out of it,
+   without pickling or copying anything through a pipe
+   @version 0.0.1
+"""
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+try: # Imported as part of the libraries package
+    from . import Backendlib
+    from . import SampleLoggerlib
+except ImportError: # Run from inside the libraries folder
+    import Backendlib
+    import SampleLoggerlib
+
+np = Backendlib.lazyImport('numpy')
+
+# The ring starts with a header of counters, the writer's and the reader's on different cache lines so they don't slow each other down, then the records
+# Records are the same as SampleLoggerlib's: a time.monotonic_ns() timestamp and then the kind's RECORD_FIELDS (monotonic time is the same in every process)
+HEADER_SIZE = 128
+WRITTEN = 0 # Total records ever written (the writer's)
+DROPPED = 1 # Records the writer wrote over before they were read (the writer's)
+ERRORS = 2 # Reads that raised an exception in the worker (the writer's)
+READ = 8 # Total records ever read (the reader's)
+LOST = 9 # Records that were written over before the reader got to them (the reader's)
+
+# Which kind of record each sensor class makes, and the function the worker reads it with
+WORKER_KINDS = {
+    'AccelerometerSensor': ('acceleration', 'getAcceleration'),
+    'ColorSensor': ('color', 'getRGB'),
+    'DistanceSensor': ('distance', 'ping'),
+    'LineSensor': ('line', 'readLine'),
+}
+
+
+class SharedRing:
+    """A ring of fixed size records in multiprocessing.shared_memory for exactly one writer and one reader, which can be in different processes.
+    The writer fills in a record and then moves the written count on, so the reader never sees a record before it's finished; when the ring is full the writer
+    writes over the oldest records instead of waiting, and both sides count what that cost"""
+
+    # fieldsParam is a list of (name, NumPy type) for everything in a record after the timestamp
+    # nameParam is the name of a ring to attach to (one made in another process), or None to make a new one of capacityParam records
+    def __init__(self, fieldsParam, capacityParam=4096, nameParam=None):
+        self.dtype = np.dtype([('timestamp', '<i8')] + [(name, np.dtype(fieldType).str) for name, fieldType in fieldsParam])
+        self.isOwner = nameParam is None
+        if(self.isOwner):
+            self.memory = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + self.dtype.itemsize * capacityParam)
+        else:
+            self.memory = shared_memory.SharedMemory(name=nameParam)
+            capacityParam = (self.memory.size - HEADER_SIZE) // self.dtype.itemsize
+        self.name = self.memory.name
+        self.capacity = capacityParam
+        self.counters = np.ndarray(HEADER_SIZE // 8, dtype=np.uint64, buffer=self.memory.buf)
+        self.records = np.ndarray(capacityParam, dtype=self.dtype, buffer=self.memory.buf, offset=HEADER_SIZE)
+        if(self.isOwner):
+            self.counters[:] = 0
+        self.fieldNames = list(self.dtype.names[1:])
+
+    # Writer: adds one record. timestampParam is time.monotonic_ns() (now if it's None)
+    def append(self, valuesParam, timestampParam=None):
+        written = int(self.counters[WRITTEN])
+        if(written - int(self.counters[READ]) >= self.capacity):
+            self.counters[DROPPED] += 1
+        record = self.records[written % self.capacity]
+        record['timestamp'] = time.monotonic_ns() if timestampParam is None else timestampParam
+        for name, value in zip(self.fieldNames, valuesParam):
+            record[name] = value
+        self.counters[WRITTEN] = written + 1 # Only now can the reader see it
+
+    # Writer: adds a batch of records, given as an array of timestamps and an array with one row of values per record
+    def appendBatch(self, timestampsParam, valuesParam):
+        count = len(timestampsParam)
+        if(count == 0):
+            return
+        if(count > self.capacity): # Only the newest ones would fit anyway
+            timestampsParam, valuesParam = timestampsParam[-self.capacity:], valuesParam[-self.capacity:]
+            self.counters[DROPPED] += count - self.capacity
+            count = self.capacity
+        written = int(self.counters[WRITTEN])
+        overwritten = written + count - int(self.counters[READ]) - self.capacity
+        if(overwritten > 0):
+            self.counters[DROPPED] += min(overwritten, count)
+        start = written % self.capacity
+        firstPart = min(count, self.capacity - start)
+        for destination, source in ((slice(start, start + firstPart), slice(0, firstPart)), (slice(0, count - firstPart), slice(firstPart, count))):
+            self.records['timestamp'][destination] = timestampsParam[source]
+            for index, name in enumerate(self.fieldNames):
+                self.records[name][destination] = valuesParam[source, index]
+        self.counters[WRITTEN] = written + count
+
+    # Writer: counts a read that failed
+    def addError(self):
+        self.counters[ERRORS] += 1
+
+    # Reader: returns a copy of the newest record (None if nothing's been written yet). Doesn't change what readNew gives
+    def getLatest(self):
+        written = int(self.counters[WRITTEN])
+        if(written == 0):
+            return None
+        return self.records[(written - 1) % self.capacity].copy()
+
+    # Reader: returns everything written since the last readNew as a list of one or two arrays (two if it wraps around the end of the ring)
+    # The arrays are views of the shared memory, so they only hold still until the writer comes back around the ring; copyParam copies them and drops
+    # any records the writer got to while they were being copied. Records written over before they were read are counted as lost
+    def readNew(self, copyParam=False):
+        written = int(self.counters[WRITTEN])
+        read = int(self.counters[READ])
+        if(written - read > self.capacity):
+            self.counters[LOST] += written - read - self.capacity
+            read = written - self.capacity
+        chunks = []
+        start = read % self.capacity
+        count = written - read
+        firstPart = min(count, self.capacity - start)
+        if(firstPart > 0):
+            chunks.append(self.records[start:start + firstPart])
+        if(count > firstPart):
+            chunks.append(self.records[:count - firstPart])
+        if(copyParam):
+            chunks = [chunk.copy() for chunk in chunks]
+            # Anything older than one ring behind the writer now may have been written over while it was copied
+            torn = int(self.counters[WRITTEN]) - self.capacity - read
+            if(torn > 0):
+                self.counters[LOST] += torn
+                records = np.concatenate(chunks)[torn:]
+                chunks = [records] if len(records) > 0 else []
+        self.counters[READ] = written
+        return chunks
+
+    # Returns the counters as a dictionary
+    def getStats(self):
+        return {
+            'written': int(self.counters[WRITTEN]),
+            'read': int(self.counters[READ]),
+            'dropped': int(self.counters[DROPPED]),
+            'lost': int(self.counters[LOST]),
+            'errors': int(self.counters[ERRORS]),
+        }
+
+    # Lets go of the shared memory (and frees it, from the process that made it)
+    # Arrays from readNew must be gone first, or the memory can't be let go of
+    def close(self):
+        self.counters = None
+        self.records = None
+        self.memory.close()
+        if(self.isOwner):
+            self.memory.unlink()
+
+
+class SensorWorker:
+    """Makes a sensor (AccelerometerSensor, ColorSensor, DistanceSensor or LineSensor) in a process of its own and reads it there rateParam times a second,
+    with the samples coming back through a SharedRing. Everything about the hardware (pins, i2c, the backend) is set up in the worker, so nothing gets shared but the ring"""
+
+    # classParam is the sensor's class, made in the worker with argsParam and kwargsParam
+    # rateParam is how many times a second to read it (as fast as it goes if it's None). An AccelerometerSensor with batchSizeParam streams its FIFO instead,
+    # writing every sample at the sensor's own data rate in batches of batchSizeParam
+    # setupParam is a function (that can be pickled, like useSimulator) the worker calls before making the sensor, to pick its backend; otherwise it uses the ROBOT_BACKEND one
+    def __init__(self, classParam, argsParam=(), kwargsParam=None, rateParam=100, capacityParam=4096, batchSizeParam=None, setupParam=None):
+        self.kind = WORKER_KINDS[classParam.__name__][0]
+        self.ring = SharedRing(SampleLoggerlib.RECORD_FIELDS[self.kind], capacityParam)
+        context = multiprocessing.get_context('spawn') # A fresh interpreter, without the threads and locks this one has going
+        self.stopEvent = context.Event()
+        self.process = context.Process(target=_workerMain, args=(classParam, tuple(argsParam), kwargsParam or {}, self.ring.name, self.kind, rateParam, batchSizeParam,
+                                                                 setupParam, self.stopEvent), daemon=True)
+        self.process.start()
+
+    # Returns a copy of the newest record (None if there isn't one yet). Fields are the kind's RECORD_FIELDS, like record['x']
+    def getLatest(self):
+        return self.ring.getLatest()
+
+    # Returns every record since the last readNew (see SharedRing.readNew)
+    def readNew(self, copyParam=False):
+        return self.ring.readNew(copyParam)
+
+    # Waits until the worker has written at least countParam records in all. Returns False if it didn't within timeoutParam seconds (or the worker died)
+    def waitForSamples(self, countParam=1, timeoutParam=10.0):
+        endTime = time.monotonic() + timeoutParam
+        while(int(self.ring.counters[WRITTEN]) < countParam):
+            if(time.monotonic() >= endTime or not self.process.is_alive()):
+                return False
+            time.sleep(0.001)
+        return True
+
+    def isAlive(self):
+        return self.process.is_alive()
+
+    # Returns the ring's counters as a dictionary
+    def getStats(self):
+        return self.ring.getStats()
+
+    # Stops the worker (it closes its sensor) and frees the ring
+    def close(self, timeoutParam=5.0):
+        self.stopEvent.set()
+        self.process.join(timeoutParam)
+        if(self.process.is_alive()):
+            self.process.terminate()
+            self.process.join()
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+# A setupParam for SensorWorker that puts the worker on a SimulatedBackend
+def useSimulator():
+    Backendlib.setBackend(Backendlib.SimulatedBackend())
+
+# What runs in the worker process
+def _workerMain(classParam, argsParam, kwargsParam, ringNameParam, kindParam, rateParam, batchSizeParam, setupParam, stopEventParam):
+    if(setupParam is not None):
+        setupParam()
+    ring = SharedRing(SampleLoggerlib.RECORD_FIELDS[kindParam], nameParam=ringNameParam)
+    sensor = classParam(*argsParam, **kwargsParam)
+    try:
+        if(kindParam == 'acceleration' and batchSizeParam is not None):
+            for timestamps, samples in sensor.stream(batchSizeParam):
+                ring.appendBatch(timestamps, samples)
+                if(stopEventParam.is_set()):
+                    sensor.stopStreaming()
+            return
+
+        read = getattr(sensor, WORKER_KINDS[classParam.__name__][1])
+        toValues = SampleLoggerlib.SAMPLE_CONVERTERS[kindParam]
+        period = 0 if rateParam is None else int(1e9 / rateParam)
+        deadline = time.monotonic_ns()
+        while(not stopEventParam.is_set()):
+            now = time.monotonic_ns()
+            try:
+                sample = read()
+            except Exception:
+                ring.addError()
+            else:
+                if(sample is not None):
+                    ring.append(toValues(sample), now)
+            if(period > 0):
+                # Fixed rate, skipping deadlines that have already gone by
+                deadline += period
+                now = time.monotonic_ns()
+                if(deadline < now):
+                    deadline += ((now - deadline) // period + 1) * period
+                time.sleep((deadline - now) / 1e9)
+    finally:
+        if(hasattr(sensor, 'close')):
+            sensor.close()
+        ring.close()
+
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+
+    from AccelerometerSensorlib import AccelerometerSensor
+    from LineSensorlib import LineSensor
+
+    with SensorWorker(AccelerometerSensor, batchSizeParam=16, setupParam=useSimulator) as accelerometer, SensorWorker(LineSensor, (22,), rateParam=500, setupParam=useSimulator) as line:
+        accelerometer.waitForSamples()
+        for i in range(10):
+            time.sleep(0.1)
+            samples = sum(len(chunk) for chunk in accelerometer.readNew()) # Every sample since last time, straight out of shared memory
+            latest = accelerometer.getLatest()
+            print('{0} new samples, latest ({1:0.2f}, {2:0.2f}, {3:0.2f}) from {4:0.1f}ms ago, line {5}'.format(samples, latest['x'], latest['y'], latest['z'],
+                  (time.monotonic_ns() - latest['timestamp']) / 1e6, line.getLatest()['value'] if line.getLatest() is not None else None))
+        print(accelerometer.getStats(), line.getStats())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The robot libraries as a package, like: from libraries import OLED, DistanceSensor
+   Nothing gets imported until it's used, so importing the package (or one class from it) only costs as much as the modules that class needs
+   @version 0.0.1
+"""
+import importlib
+
+# Name -> module it's in
+LAZY_NAMES = {
+    'ColorSensor': 'ColorSensorlib',
+    'ColorClassifier': 'ColorClassifierlib',
+    'AccelerometerSensor': 'AccelerometerSensorlib',
+    'AccelerometerProcessor': 'AccelerometerProcessinglib',
+    'DistanceSensor': 'DistanceSensorlib',
+    'DistanceArray': 'DistanceArraylib',
+    'HampelFilter': 'DistanceSensorlib',
+    'RangeReading': 'DistanceSensorlib',
+    'LineSensor': 'LineSensorlib',
+    'LineSensorArray': 'LineSensorlib',
+    'LineFollower': 'LineFollowerlib',
+    'PIDController': 'LineFollowerlib',
+    'OLED': 'OLEDlib',
+    'ServoController': 'Servolib',
+    'DrivingController': 'Servolib',
+    'MotionProfiler': 'MotionProfilelib',
+    'SensorScheduler': 'Schedulerlib',
+    'SampleLogger': 'SampleLoggerlib',
+    'openLog': 'SampleLoggerlib',
+    'AsyncSensor': 'Asynclib',
+    'AsyncColorSensor': 'Asynclib',
+    'AsyncAccelerometer': 'Asynclib',
+    'AsyncDistanceSensor': 'Asynclib',
+    'AsyncLineSensor': 'Asynclib',
+    'AsyncOLED': 'Asynclib',
+    'AsyncDrivingController': 'Asynclib',
+    'SensorWorker': 'Workerlib',
+    'SharedRing': 'Workerlib',
+    'ShadowRegisters': 'ShadowRegisterlib',
+    'LatencyHistogram': 'Metricslib',
+    'GPIOSession': 'GPIOSessionlib',
+    'getSession': 'GPIOSessionlib',
+    'SoftwarePWMBackend': 'PWMlib',
+    'SysfsPWMBackend': 'PWMlib',
+    'SimulatedPWMBackend': 'PWMlib',
+    'HardwareBackend': 'Backendlib',
+    'SimulatedBackend': 'Backendlib',
+    'ReplayBackend': 'Backendlib',
+    'LogReplayer': 'Replaylib',
+    'getBackend': 'Backendlib',
+    'setBackend': 'Backendlib',
+}
+MODULES = ['AccelerometerProcessinglib', 'AccelerometerSensorlib', 'Asynclib', 'Backendlib', 'Benchmarklib', 'ColorClassifierlib', 'ColorSensorlib', 'DistanceArraylib', 'DistanceSensorlib', 'GPIOSessionlib', 'LineFollowerlib', 'LineSensorlib',
+           'Metricslib', 'MotionProfilelib', 'OLEDlib', 'PWMlib', 'Replaylib', 'SampleLoggerlib', 'Schedulerlib', 'Servolib', 'ShadowRegisterlib', 'Simulatorlib', 'Workerlib']
+
+__all__ = list(LAZY_NAMES)
+
+# Called for anything that isn't here yet: imports it, then keeps it so the next use doesn't come back here
+def __getattr__(name):
+    if(name in LAZY_NAMES):
+        value = getattr(importlib.import_module('.' + LAZY_NAMES[name], __name__), name)
+    elif(name in MODULES):
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError("module '{0}' has no attribute '{1}'".format(__name__, name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_NAMES) | set(MODULES))
@@ -1 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
 
+"""Runs the color, accelerometer, distance, and line sensors together at different rates with Schedulerlib, on simulated hardware so it works on any computer
+   @version 0.0.1
+"""
+import math
+import random
+import time
+from Backendlib import SimulatedBackend, setBackend
+from Schedulerlib import SensorScheduler
+from ColorSensorlib import ColorSensor
+from AccelerometerSensorlib import AccelerometerSensor
+from DistanceSensorlib import DistanceSensor
+from LineSensorlib import LineSensor
+
+
+if __name__ == "__main__":
+
+    # Simulated hardware standing in for the Raspberry Pi, with i2c transactions taking as long as they would on the Pi's 100kHz bus
+    backend = setBackend(SimulatedBackend(i2cFrequencyParam=100000))
+    gpio = backend.gpio
+    i2c = backend.getI2C()
+
+    # The sensors, made the same way as on the robot
+    colorSensor = ColorSensor()
+    accelerometer = AccelerometerSensor()
+    distanceSensor = DistanceSensor(17, 27)
+    lineSensor = LineSensor(22)
+    colorDriver = backend.getDevice(0x29)
+    accelerometerDriver = backend.getDevice(0x1d)
+
+    # Pretend there's something 30-60cm in front of the distance sensor
+    gpio.scriptEcho(17, 27, lambda: (0.0005, random.uniform(30, 60) * 0.000058))
+
+    # Move the simulated world along: wobble the robot, change the color under it, and cross a line every so often
+    startTime = time.monotonic()
+    def updateWorld():
+        t = time.monotonic() - startTime
+        accelerometerDriver.setAcceleration(0.5 * math.sin(7 * t), 0.5 * math.cos(5 * t), 9.80665)
+        colorDriver.setRaw(int(300 + 200 * math.sin(t)), 200, int(150 + 100 * math.cos(t)), 800)
+        gpio.setInput(22, int(t * 3) % 2)
+        return t
+
+    # Line readings fast, acceleration a bit slower, and color/distance slow
+    scheduler = SensorScheduler()
+    scheduler.addTask('world', updateWorld, 100)
+    lineSensor.register(scheduler, 500)
+    accelerometer.register(scheduler, 100)
+    colorSensor.register(scheduler, 10)
+    distanceSensor.register(scheduler, 15)
+
+    # Keep the latest sample of each sensor, and print them twice a second
+    latest = {}
+    def saveSample(name, sample, timestamp):
+        latest[name] = sample
+    for name in ['line', 'acceleration', 'color', 'distance']:
+        scheduler.subscribe(name, saveSample)
+    scheduler.addTask('print', lambda: print(latest), 2)
+
+    scheduler.run(5.0) # Run for 5 seconds
+    scheduler.printStats()